@@ -0,0 +1,278 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from recsys_model import HashConfig, RecsysBatch
+
+logger = logging.getLogger(__name__)
+
+
+class RaggedRecsysBatch(NamedTuple):
+    """Variable-length (CSR-style) features for a batch of users.
+
+    History and candidate features are stored as flat value arrays for the whole
+    batch. Rows ``offsets[b]:offsets[b + 1]`` of each flat array belong to user ``b``.
+    """
+
+    user_hashes: np.ndarray  # [B, num_user_hashes]
+    history_offsets: np.ndarray  # [B + 1]
+    history_post_hashes: np.ndarray  # [nnz_history, num_item_hashes]
+    history_author_hashes: np.ndarray  # [nnz_history, num_author_hashes]
+    history_actions: np.ndarray  # [nnz_history, num_actions]
+    history_product_surface: np.ndarray  # [nnz_history]
+    candidate_offsets: np.ndarray  # [B + 1]
+    candidate_post_hashes: np.ndarray  # [nnz_candidates, num_item_hashes]
+    candidate_author_hashes: np.ndarray  # [nnz_candidates, num_author_hashes]
+    candidate_product_surface: np.ndarray  # [nnz_candidates]
+
+
+def _bucket_for(size: int, buckets: Sequence[int]) -> int:
+    """Return the smallest bucket that can hold `size`, or the largest bucket."""
+    for bucket in buckets:
+        if size <= bucket:
+            return bucket
+    return buckets[-1]
+
+
+def _scatter_indices(
+    offsets: np.ndarray, seq_len: int, keep_last: bool = False
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute flat destination rows for CSR values scattered into a [B, seq_len] buffer.
+
+    Users with more than `seq_len` values keep their first `seq_len` values, or
+    their last `seq_len` values if `keep_last`. Offsets may start past 0 (a
+    slice of a larger CSR array); they index the flat value arrays directly.
+
+    Returns:
+        src: indices into the flat value arrays that are kept
+        dst: matching row indices into the buffer reshaped to [B * seq_len, ...]
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    if offsets.shape[0] == 0 or offsets[0] < 0 or np.any(lengths < 0):
+        raise ValueError("CSR offsets must be non-negative and non-decreasing")
+    base = int(offsets[0])
+    starts = offsets[:-1] - base
+    nnz = int(offsets[-1]) - base
+    row = np.repeat(np.arange(lengths.shape[0], dtype=np.int64), lengths)
+    pos = np.arange(nnz, dtype=np.int64) - np.repeat(starts, lengths)
+    if int(lengths.max(initial=0)) <= seq_len:
+        return np.arange(base, base + nnz, dtype=np.int64), row * seq_len + pos
+    if keep_last:
+        pos = pos - np.repeat(np.maximum(lengths - seq_len, 0), lengths)
+        keep = pos >= 0
+    else:
+        keep = pos < seq_len
+    return np.flatnonzero(keep) + base, row[keep] * seq_len + pos[keep]
+
+
+@dataclass
+class _BucketBuffers:
+    """Preallocated padded buffers for one (batch, history, candidate) shape bucket."""
+
+    batch: RecsysBatch
+    used_rows: int = 0
+
+
+@dataclass
+class RaggedBatchCollator:
+    """Collates ragged per-user features into padded, preallocated RecsysBatch buffers.
+
+    Buffers are allocated once per shape bucket and reused across calls. The
+    returned RecsysBatch holds the buffers themselves rather than copies, so a
+    batch is only valid until the same bucket slot is collated into again. With
+    `num_slots` > 1, consecutive calls rotate through independent buffer sets,
+    which lets the previous batch be transferred to device while the next one
+    is being assembled.
+
+    Histories longer than the largest history bucket keep their most recent
+    (trailing) events with `history_truncation="latest"`, or their oldest
+    (leading) events with "earliest". Candidate lists keep their leading entries.
+    """
+
+    hash_config: HashConfig
+    num_actions: int
+    history_buckets: Sequence[int] = (128,)
+    candidate_buckets: Sequence[int] = (32,)
+    batch_buckets: Sequence[int] = (1,)
+    num_slots: int = 2
+    history_truncation: str = "latest"
+
+    _buffers: Dict[Tuple[int, int, int, int], _BucketBuffers] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _next_slot: Dict[Tuple[int, int, int], int] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        self.history_buckets = sorted(self.history_buckets)
+        self.candidate_buckets = sorted(self.candidate_buckets)
+        self.batch_buckets = sorted(self.batch_buckets)
+        if self.history_truncation not in ("latest", "earliest"):
+            raise ValueError(
+                f"history_truncation must be 'latest' or 'earliest', "
+                f"got {self.history_truncation!r}"
+            )
+
+    def _allocate(self, batch_size: int, history_len: int, num_candidates: int) -> RecsysBatch:
+        hash_config = self.hash_config
+        logger.info(
+            f"Allocating collator buffers for bucket "
+            f"(B={batch_size}, S={history_len}, C={num_candidates})"
+        )
+        return RecsysBatch(
+            user_hashes=np.zeros((batch_size, hash_config.num_user_hashes), dtype=np.int32),
+            history_post_hashes=np.zeros(
+                (batch_size, history_len, hash_config.num_item_hashes), dtype=np.int32
+            ),
+            history_author_hashes=np.zeros(
+                (batch_size, history_len, hash_config.num_author_hashes), dtype=np.int32
+            ),
+            history_actions=np.zeros(
+                (batch_size, history_len, self.num_actions), dtype=np.float32
+            ),
+            history_product_surface=np.zeros((batch_size, history_len), dtype=np.int32),
+            candidate_post_hashes=np.zeros(
+                (batch_size, num_candidates, hash_config.num_item_hashes), dtype=np.int32
+            ),
+            candidate_author_hashes=np.zeros(
+                (batch_size, num_candidates, hash_config.num_author_hashes), dtype=np.int32
+            ),
+            candidate_product_surface=np.zeros((batch_size, num_candidates), dtype=np.int32),
+        )
+
+    def _get_buffers(self, batch_size: int, history_len: int, num_candidates: int):
+        shape = (batch_size, history_len, num_candidates)
+        slot = self._next_slot.get(shape, 0)
+        self._next_slot[shape] = (slot + 1) % self.num_slots
+        key = (*shape, slot)
+        if key not in self._buffers:
+            self._buffers[key] = _BucketBuffers(
+                batch=self._allocate(batch_size, history_len, num_candidates)
+            )
+        return self._buffers[key]
+
+    def bucket_shape(self, ragged: RaggedRecsysBatch) -> Tuple[int, int, int]:
+        """Return the padded (B, S, C) shape that `ragged` will be collated into."""
+        batch_size = ragged.user_hashes.shape[0]
+        max_history = int(np.diff(ragged.history_offsets).max(initial=0))
+        max_candidates = int(np.diff(ragged.candidate_offsets).max(initial=0))
+        return (
+            _bucket_for(batch_size, self.batch_buckets),
+            _bucket_for(max_history, self.history_buckets),
+            _bucket_for(max_candidates, self.candidate_buckets),
+        )
+
+    def collate(self, ragged: RaggedRecsysBatch) -> RecsysBatch:
+        """Scatter ragged features into the padded buffers of the matching bucket.
+
+        Users beyond the batch bucket size raise a ValueError. Histories longer
+        than the largest bucket are truncated per `history_truncation` (by
+        default keeping the most recent events); candidate lists keep their
+        leading entries. Padding positions are left at zero, so hash 0
+        marks them as invalid exactly as in `create_dummy_batch_from_config`.
+
+        Args:
+            ragged: RaggedRecsysBatch with CSR-style history and candidate features
+
+        Returns:
+            RecsysBatch whose arrays are views of the reused bucket buffers
+        """
+        batch_size = ragged.user_hashes.shape[0]
+        B, S, C = self.bucket_shape(ragged)
+        if batch_size > B:
+            raise ValueError(
+                f"Batch of {batch_size} users exceeds the largest batch bucket {B}"
+            )
+
+        buffers = self._get_buffers(B, S, C)
+        out = buffers.batch
+
+        # Only rows written by the previous use of these buffers can be dirty.
+        dirty = max(buffers.used_rows, batch_size)
+        for array in out:
+            array[:dirty] = 0
+        buffers.used_rows = batch_size
+
+        out.user_hashes[:batch_size] = ragged.user_hashes
+
+        src, dst = _scatter_indices(
+            ragged.history_offsets, S, keep_last=self.history_truncation == "latest"
+        )
+        _scatter(out.history_post_hashes, ragged.history_post_hashes, src, dst)
+        _scatter(out.history_author_hashes, ragged.history_author_hashes, src, dst)
+        _scatter(out.history_actions, ragged.history_actions, src, dst)
+        _scatter(out.history_product_surface, ragged.history_product_surface, src, dst)
+
+        src, dst = _scatter_indices(ragged.candidate_offsets, C)
+        _scatter(out.candidate_post_hashes, ragged.candidate_post_hashes, src, dst)
+        _scatter(out.candidate_author_hashes, ragged.candidate_author_hashes, src, dst)
+        _scatter(out.candidate_product_surface, ragged.candidate_product_surface, src, dst)
+
+        return out
+
+
+def _scatter(buffer: np.ndarray, values: np.ndarray, src: np.ndarray, dst: np.ndarray):
+    """Write `values[src]` into rows `dst` of `buffer` flattened over its first two axes."""
+    flat = buffer.reshape((-1, *buffer.shape[2:]))
+    if src.shape[0] == values.shape[0]:
+        flat[dst] = values
+    else:
+        flat[dst] = values[src]
+
+
+def ragged_from_lists(
+    user_hashes: np.ndarray,
+    history: List[Dict[str, np.ndarray]],
+    candidates: List[Dict[str, np.ndarray]],
+) -> RaggedRecsysBatch:
+    """Build a RaggedRecsysBatch from per-user feature dicts.
+
+    This is a convenience for tests and offline tools; serving code should
+    produce the flat arrays and offsets directly.
+
+    Args:
+        user_hashes: [B, num_user_hashes]
+        history: per-user dicts with post_hashes, author_hashes, actions, product_surface
+        candidates: per-user dicts with post_hashes, author_hashes, product_surface
+
+    Returns:
+        RaggedRecsysBatch
+    """
+
+    def offsets(items: List[Dict[str, np.ndarray]]) -> np.ndarray:
+        lengths = [len(item["post_hashes"]) for item in items]
+        return np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    def concat(items: List[Dict[str, np.ndarray]], key: str) -> np.ndarray:
+        return np.concatenate([np.asarray(item[key]) for item in items], axis=0)
+
+    return RaggedRecsysBatch(
+        user_hashes=np.asarray(user_hashes, dtype=np.int32),
+        history_offsets=offsets(history),
+        history_post_hashes=concat(history, "post_hashes"),
+        history_author_hashes=concat(history, "author_hashes"),
+        history_actions=concat(history, "actions"),
+        history_product_surface=concat(history, "product_surface"),
+        candidate_offsets=offsets(candidates),
+        candidate_post_hashes=concat(candidates, "post_hashes"),
+        candidate_author_hashes=concat(candidates, "author_hashes"),
+        candidate_product_surface=concat(candidates, "product_surface"),
+    )
@@ -0,0 +1,1167 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+from embedding_store import BFLOAT16, INT8, quantize_rows
+
+logger = logging.getLogger(__name__)
+
+# Score of padding results when fewer than top_k corpus entries are scored.
+INVALID_SCORE = -1e12
+
+# Rows per block when assigning points to centroids, bounding the [rows, k]
+# distance matrix.
+_ASSIGN_BLOCK_SIZE = 65536
+
+# Bound on the [queries, probed entries] scores of one IVF-PQ search block.
+_ADC_BLOCK_ENTRIES = 1 << 22
+
+# Bound on the [queries, posts, D] embeddings gathered per author-clustered
+# search block.
+_AUTHOR_BLOCK_FLOATS = 1 << 22
+
+
+class CorpusIndex(ABC):
+    """Maximum inner product index over a corpus of candidate embeddings [N, D].
+
+    Results index into the corpus rows as passed to the index, like the
+    brute-force top-k of PhoenixRetrievalModel.
+    """
+
+    @property
+    @abstractmethod
+    def size(self) -> int:
+        """Number of indexed corpus entries N."""
+        pass
+
+    @property
+    @abstractmethod
+    def dim(self) -> int:
+        """Embedding dimension D."""
+        pass
+
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        """Bytes of index storage."""
+        pass
+
+    @abstractmethod
+    def search(self, queries: np.ndarray, top_k: int, **params) -> Tuple[np.ndarray, np.ndarray]:
+        """Find the top_k corpus entries by inner product for each query.
+
+        Args:
+            queries: [B, D] query (user) embeddings
+            top_k: number of results per query
+            **params: index-specific search parameters (e.g. nprobe)
+
+        Returns:
+            top_k_indices: [B, top_k] int64 corpus rows, -1 where fewer than
+                top_k entries were scored
+            top_k_scores: [B, top_k] float32 scores, descending, INVALID_SCORE
+                for padding results
+        """
+        pass
+
+
+def top_k_by_score(scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k positions and values of each row of `scores` [B, n], descending.
+
+    Rows are padded with -1 / INVALID_SCORE when n < top_k.
+    """
+    B, n = scores.shape
+    k = min(top_k, n)
+    indices = np.full((B, top_k), -1, dtype=np.int64)
+    values = np.full((B, top_k), INVALID_SCORE, dtype=np.float32)
+    if k == 0:
+        return indices, values
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(n), (B, 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    indices[:, :k] = np.take_along_axis(part, order, axis=1)
+    values[:, :k] = np.take_along_axis(part_scores, order, axis=1)
+    return indices, values
+
+
+class ExactIndex(CorpusIndex):
+    """Brute-force inner product search, the reference for approximate indexes."""
+
+    def __init__(self, embeddings: np.ndarray):
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    @property
+    def size(self) -> int:
+        return self.embeddings.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.embeddings.nbytes
+
+    def search(self, queries: np.ndarray, top_k: int, **params) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.asarray(queries, dtype=np.float32)
+        return top_k_by_score(queries @ self.embeddings.T, top_k)
+
+
+@functools.partial(jax.jit, static_argnames=("k",))
+def _low_precision_top_k(
+    queries: jax.Array, codes: jax.Array, scales: Optional[jax.Array], k: int
+) -> jax.Array:
+    """Top-k corpus rows [B, k] by approximate scores against bfloat16 or int8 codes."""
+    # int8 codes are exact in bfloat16; products accumulate in float32.
+    scores = jax.lax.dot_general(
+        queries.astype(jnp.bfloat16),
+        codes.astype(jnp.bfloat16),
+        (((1,), (1,)), ((), ())),
+        preferred_element_type=jnp.float32,
+    )
+    if scales is not None:
+        scores = scores * scales[None, :]
+    _, indices = jax.lax.top_k(scores, k)
+    return indices
+
+
+class QuantizedCorpusIndex(CorpusIndex):
+    """Exact brute-force search that scans a low-precision copy of the corpus.
+
+    The corpus is held on device as int8 (symmetric, one scale per vector) or
+    bfloat16, a quarter or half of the float32 bytes read per query batch. The
+    low-precision scores select the top ceil(top_k * oversample) rows, which are
+    rescored exactly against a float32 copy on the host; the final top_k and
+    scores are exact unless a true top_k entry falls outside the oversampled
+    shortlist.
+
+    Args:
+        embeddings: [N, D] float32 corpus embeddings
+        dtype: "int8" or "bfloat16" storage of the scanned copy
+        oversample: default shortlist size as a multiple of top_k
+    """
+
+    def __init__(self, embeddings: np.ndarray, dtype: str = INT8, oversample: float = 4.0):
+        if dtype not in (BFLOAT16, INT8):
+            raise ValueError(f"Unsupported corpus dtype {dtype!r}")
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.dtype = dtype
+        self.oversample = oversample
+
+        stored, scales = quantize_rows(self.embeddings, dtype)
+        if dtype == BFLOAT16:
+            stored = stored.view(jnp.bfloat16)
+        self.codes = jnp.asarray(stored)
+        self.scales = None if scales is None else jnp.asarray(scales, dtype=jnp.float32)
+
+    @property
+    def size(self) -> int:
+        return self.embeddings.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    @property
+    def scan_nbytes(self) -> int:
+        """Bytes of the low-precision copy read by each scan."""
+        return self.codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.scan_nbytes + self.embeddings.nbytes
+
+    def search(
+        self, queries: np.ndarray, top_k: int, oversample: Optional[float] = None, **params
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top_k search rescoring a shortlist of top_k * oversample (default self.oversample)."""
+        queries = np.asarray(queries, dtype=np.float32)
+        shortlist_size = min(
+            self.size, max(top_k, math.ceil(top_k * (oversample or self.oversample)))
+        )
+        if shortlist_size == 0:
+            return top_k_by_score(np.zeros((queries.shape[0], 0), dtype=np.float32), top_k)
+
+        shortlist = np.asarray(
+            _low_precision_top_k(jnp.asarray(queries), self.codes, self.scales, shortlist_size)
+        )
+        return _rescore_shortlist(queries, self.embeddings, shortlist, top_k)
+
+
+def _rescore_shortlist(
+    queries: np.ndarray, embeddings: np.ndarray, shortlist: np.ndarray, top_k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top_k of the shortlisted corpus rows [B, n] of each query [B, D]."""
+    exact_scores = np.einsum("bd,bkd->bk", queries, embeddings[shortlist])
+    top, scores = top_k_by_score(exact_scores, top_k)
+    indices = np.where(top >= 0, np.take_along_axis(shortlist, np.maximum(top, 0), axis=1), -1)
+    return indices, scores
+
+
+def truncate_and_normalize(embeddings: np.ndarray, prefix_dim: int) -> np.ndarray:
+    """The first prefix_dim dimensions of embeddings [..., D], L2-normalized."""
+    prefix = np.asarray(embeddings, dtype=np.float32)[..., :prefix_dim]
+    norms = np.linalg.norm(prefix, axis=-1, keepdims=True)
+    return prefix / np.maximum(norms, 1e-12)
+
+
+@functools.partial(jax.jit, static_argnames=("k",))
+def _prefix_top_k(queries: jax.Array, prefixes: jax.Array, k: int) -> jax.Array:
+    """Top-k corpus rows [B, k] by inner product of truncated queries and corpus."""
+    _, indices = jax.lax.top_k(jnp.matmul(queries, prefixes.T), k)
+    return indices
+
+
+class TruncatedCorpusIndex(CorpusIndex):
+    """Coarse-to-fine search whose first pass scores only a prefix of the dimensions.
+
+    Matryoshka-style embeddings concentrate their information in the leading
+    dimensions. The first pass scores the renormalized first prefix_dim
+    dimensions of queries and corpus on device, reading D / prefix_dim fewer
+    bytes than a full scan, and keeps the top ceil(top_k * oversample) rows;
+    these are rescored at full D against a float32 copy on the host. How much
+    recall a given prefix_dim costs depends on the CandidateTower weights; see
+    run_truncated_dim_eval.py.
+
+    Args:
+        embeddings: [N, D] float32 corpus embeddings
+        prefix_dim: number of leading dimensions scored by the first pass
+        oversample: default shortlist size as a multiple of top_k
+    """
+
+    def __init__(self, embeddings: np.ndarray, prefix_dim: int, oversample: float = 4.0):
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if not 0 < prefix_dim <= self.embeddings.shape[1]:
+            raise ValueError(
+                f"prefix_dim ({prefix_dim}) must be in [1, {self.embeddings.shape[1]}]"
+            )
+        self.prefix_dim = prefix_dim
+        self.oversample = oversample
+        self.prefixes = jnp.asarray(truncate_and_normalize(self.embeddings, prefix_dim))
+
+    @property
+    def size(self) -> int:
+        return self.embeddings.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    @property
+    def scan_nbytes(self) -> int:
+        """Bytes of the truncated copy read by each first pass."""
+        return self.prefixes.nbytes
+
+    @property
+    def nbytes(self) -> int:
+        return self.scan_nbytes + self.embeddings.nbytes
+
+    def search(
+        self, queries: np.ndarray, top_k: int, oversample: Optional[float] = None, **params
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top_k search rescoring a shortlist of top_k * oversample (default self.oversample)."""
+        queries = np.asarray(queries, dtype=np.float32)
+        shortlist_size = min(
+            self.size, max(top_k, math.ceil(top_k * (oversample or self.oversample)))
+        )
+        if shortlist_size == 0:
+            return top_k_by_score(np.zeros((queries.shape[0], 0), dtype=np.float32), top_k)
+
+        shortlist = np.asarray(
+            _prefix_top_k(
+                jnp.asarray(truncate_and_normalize(queries, self.prefix_dim)),
+                self.prefixes,
+                shortlist_size,
+            )
+        )
+        return _rescore_shortlist(queries, self.embeddings, shortlist, top_k)
+
+
+@functools.partial(jax.jit, static_argnames=("top_k",))
+def _merge_chunk_top_k(
+    best_scores: jax.Array,
+    best_indices: jax.Array,
+    queries: jax.Array,
+    chunk: jax.Array,
+    offset: jax.Array,
+    top_k: int,
+) -> Tuple[jax.Array, jax.Array]:
+    """Merge the top-k of one corpus chunk [n, D] into the running [B, top_k] top-k."""
+    scores = jnp.matmul(queries, chunk.astype(jnp.float32).T)
+    chunk_scores, chunk_indices = jax.lax.top_k(scores, min(top_k, chunk.shape[0]))
+    merged_scores = jnp.concatenate([best_scores, chunk_scores], axis=1)
+    merged_indices = jnp.concatenate([best_indices, chunk_indices + offset], axis=1)
+    best_scores, order = jax.lax.top_k(merged_scores, top_k)
+    return best_scores, jnp.take_along_axis(merged_indices, order, axis=1)
+
+
+@dataclass
+class ScanStats:
+    """Disk throughput of one streaming corpus scan."""
+
+    bytes_read: int
+    seconds: float  # wall time of the scan
+    read_seconds: float  # time the read-ahead thread spent reading
+    peak_bandwidth: Optional[float] = None  # bytes/s the storage device can deliver
+
+    @property
+    def bandwidth(self) -> float:
+        """Achieved read bytes/s: bytes_read over the time spent reading."""
+        return self.bytes_read / max(self.read_seconds, 1e-9)
+
+    @property
+    def scan_throughput(self) -> float:
+        """End-to-end bytes/s over the wall time of the scan, scoring included."""
+        return self.bytes_read / max(self.seconds, 1e-9)
+
+    @property
+    def peak_fraction(self) -> Optional[float]:
+        """Achieved read bandwidth as a fraction of peak_bandwidth, if known."""
+        if self.peak_bandwidth is None:
+            return None
+        return self.bandwidth / self.peak_bandwidth
+
+
+class MemmapCorpusIndex(CorpusIndex):
+    """Exact search streaming a memory-mapped corpus file larger than RAM.
+
+    The corpus is an [N, D] .npy file opened with mmap_mode="r" (write one
+    incrementally with np.lib.format.open_memmap). Each search reads it in large
+    sequential chunks; a background thread reads chunk i + 1 while chunk i is
+    scored on device and merged into a running top-k, so at most two chunks are
+    resident at a time. The throughput of the last scan is logged and kept in
+    last_scan_stats.
+
+    Args:
+        path: path of the [N, D] .npy embedding file
+        chunk_bytes: bytes of corpus rows read per chunk
+        peak_bandwidth: optional peak read bandwidth of the storage device in
+            bytes/s; the achieved bandwidth is reported relative to it
+    """
+
+    def __init__(
+        self,
+        path: str,
+        chunk_bytes: int = 64 * 2**20,
+        peak_bandwidth: Optional[float] = None,
+    ):
+        self.path = path
+        self.embeddings = np.load(path, mmap_mode="r")
+        if self.embeddings.ndim != 2:
+            raise ValueError(f"Expected an [N, D] corpus in {path}, got {self.embeddings.shape}")
+        self.chunk_rows = max(1, chunk_bytes // (self.dim * self.embeddings.itemsize))
+        self.peak_bandwidth = peak_bandwidth
+        self.last_scan_stats: Optional[ScanStats] = None
+
+    @property
+    def size(self) -> int:
+        return self.embeddings.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.embeddings.nbytes
+
+    def _read_chunk(self, start: int, chunk_rows: int) -> Tuple[np.ndarray, float]:
+        begin = time.perf_counter()
+        chunk = np.array(self.embeddings[start : start + chunk_rows])
+        return chunk, time.perf_counter() - begin
+
+    def search(
+        self, queries: np.ndarray, top_k: int, chunk_rows: Optional[int] = None, **params
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top_k search reading chunk_rows (default self.chunk_rows) rows at a time."""
+        chunk_rows = chunk_rows or self.chunk_rows
+        queries = jnp.asarray(queries, dtype=jnp.float32)
+        best_scores = jnp.full((queries.shape[0], top_k), INVALID_SCORE, dtype=jnp.float32)
+        best_indices = jnp.full((queries.shape[0], top_k), -1, dtype=jnp.int32)
+
+        start_time = time.perf_counter()
+        read_seconds = 0.0
+        with ThreadPoolExecutor(max_workers=1) as reader:
+            pending = reader.submit(self._read_chunk, 0, chunk_rows) if self.size else None
+            for start in range(0, self.size, chunk_rows):
+                chunk, seconds = pending.result()
+                read_seconds += seconds
+                if start + chunk_rows < self.size:
+                    pending = reader.submit(self._read_chunk, start + chunk_rows, chunk_rows)
+                best_scores, best_indices = _merge_chunk_top_k(
+                    best_scores, best_indices, queries, chunk, start, top_k
+                )
+            indices, scores = np.asarray(best_indices), np.asarray(best_scores)
+
+        self.last_scan_stats = ScanStats(
+            bytes_read=self.nbytes,
+            seconds=time.perf_counter() - start_time,
+            read_seconds=read_seconds,
+            peak_bandwidth=self.peak_bandwidth,
+        )
+        stats = self.last_scan_stats
+        peak = "" if stats.peak_fraction is None else f" ({stats.peak_fraction:.0%} of peak)"
+        logger.info(
+            f"Scanned {stats.bytes_read / 2**20:.1f} MiB of {self.path} in "
+            f"{stats.seconds:.3f}s ({stats.scan_throughput / 2**20:.1f} MiB/s), read at "
+            f"{stats.bandwidth / 2**20:.1f} MiB/s{peak}"
+        )
+        return indices.astype(np.int64), scores
+
+
+def assign_to_centroids(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest (L2) centroid [n] of each point [n, d]."""
+    centroid_sq = np.sum(centroids**2, axis=1)
+    assignment = np.empty(points.shape[0], dtype=np.int64)
+    for start in range(0, points.shape[0], _ASSIGN_BLOCK_SIZE):
+        block = points[start : start + _ASSIGN_BLOCK_SIZE]
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2; ||x||^2 does not change the argmin.
+        distances = centroid_sq[None, :] - 2.0 * (block @ centroids.T)
+        assignment[start : start + _ASSIGN_BLOCK_SIZE] = np.argmin(distances, axis=1)
+    return assignment
+
+
+def kmeans(
+    points: np.ndarray,
+    num_clusters: int,
+    num_iters: int = 20,
+    seed: int = 0,
+) -> np.ndarray:
+    """Lloyd's k-means; returns centroids [num_clusters, d].
+
+    Centroids start at randomly chosen points. A cluster that becomes empty is
+    re-seeded with a random point.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    n = points.shape[0]
+    if num_clusters > n:
+        raise ValueError(f"num_clusters ({num_clusters}) exceeds the number of points ({n})")
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(n, size=num_clusters, replace=False)].copy()
+
+    for _ in range(num_iters):
+        assignment = assign_to_centroids(points, centroids)
+        counts = np.bincount(assignment, minlength=num_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, points)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        num_empty = int((~nonempty).sum())
+        if num_empty:
+            centroids[~nonempty] = points[rng.choice(n, size=num_empty, replace=False)]
+
+    return centroids
+
+
+def _padded_ranges(
+    starts: np.ndarray, lengths: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate each query's row ranges [B, R], padded to the longest total L.
+
+    Returns:
+        positions: [B, L] rows of all ranges of each query, range by range
+            (0 on padding)
+        valid: [B, L] False on padding
+    """
+    B = lengths.shape[0]
+    flat_lengths = lengths.ravel()
+    totals = lengths.sum(axis=1)
+    L = int(totals.max(initial=0))
+    num_entries = int(totals.sum())
+    entry = np.arange(num_entries)
+    # Rows of all ranges of all queries, concatenated, then scattered into one
+    # row per query.
+    range_starts = np.cumsum(flat_lengths) - flat_lengths
+    flat_positions = np.repeat(starts.ravel() - range_starts, flat_lengths) + entry
+    query = np.repeat(np.arange(B), totals)
+    column = entry - (np.cumsum(totals) - totals)[query]
+    positions = np.zeros((B, L), dtype=np.int64)
+    positions[query, column] = flat_positions
+    return positions, np.arange(L)[None, :] < totals[:, None]
+
+
+class IVFPQIndex(CorpusIndex):
+    """Inverted-file index with product-quantized residuals (IVF-PQ).
+
+    A k-means coarse quantizer partitions the corpus into `num_lists` inverted
+    lists. Each entry stores the residual from its list centroid as
+    `num_subspaces` codes, one per D / num_subspaces dimensional subspace, each
+    indexing a codebook of `num_codes` centroids learned on training residuals.
+
+    Search probes the `nprobe` lists whose centroids have the largest inner
+    product with the query and scores their entries by asymmetric distance
+    computation: q.x ~= q.c_list + sum_m q_m . codebook[m, code_m]. A batch
+    of queries is scanned list by list: each probed list is decoded once and
+    scored against all the queries probing it in one matrix product, so the
+    per-entry cost is shared by the batch instead of paid per query.
+
+    Args:
+        centroids: [num_lists, D] coarse centroids
+        codebooks: [num_subspaces, num_codes, D / num_subspaces] PQ codebooks
+        list_offsets: [num_lists + 1] start of each inverted list in `codes`
+        list_ids: [N] corpus row of each entry, in inverted list order
+        codes: [N, num_subspaces] PQ codes, in inverted list order
+        nprobe: default number of lists probed per query
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        codebooks: np.ndarray,
+        list_offsets: np.ndarray,
+        list_ids: np.ndarray,
+        codes: np.ndarray,
+        nprobe: int = 8,
+    ):
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.codes = codes
+        self.nprobe = nprobe
+
+    @staticmethod
+    def build(
+        embeddings: np.ndarray,
+        num_lists: int,
+        num_subspaces: int,
+        num_codes: int = 256,
+        nprobe: int = 8,
+        num_iters: int = 20,
+        max_training_points: Optional[int] = 100000,
+        seed: int = 0,
+    ) -> "IVFPQIndex":
+        """Train the coarse quantizer and PQ codebooks and encode the corpus.
+
+        Args:
+            embeddings: [N, D] corpus embeddings
+            num_lists: number of inverted lists (coarse centroids)
+            num_subspaces: number of PQ subspaces; must divide D
+            num_codes: codebook size per subspace (<= 256 stores uint8 codes)
+            nprobe: default number of lists probed per query
+            num_iters: k-means iterations
+            max_training_points: train on a random sample of at most this many
+                embeddings (None = all)
+            seed: random seed of sampling and k-means initialization
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        N, D = embeddings.shape
+        if D % num_subspaces != 0:
+            raise ValueError(f"num_subspaces ({num_subspaces}) must divide the dimension ({D})")
+        sub_dim = D // num_subspaces
+
+        rng = np.random.default_rng(seed)
+        training = embeddings
+        if max_training_points is not None and N > max_training_points:
+            training = embeddings[rng.choice(N, size=max_training_points, replace=False)]
+
+        centroids = kmeans(training, num_lists, num_iters=num_iters, seed=seed)
+        training_residuals = training - centroids[assign_to_centroids(training, centroids)]
+        codebooks = np.stack(
+            [
+                kmeans(
+                    training_residuals[:, m * sub_dim : (m + 1) * sub_dim],
+                    num_codes,
+                    num_iters=num_iters,
+                    seed=seed + 1 + m,
+                )
+                for m in range(num_subspaces)
+            ]
+        )
+
+        assignment = assign_to_centroids(embeddings, centroids)
+        residuals = embeddings - centroids[assignment]
+        code_dtype = np.uint8 if num_codes <= 256 else np.uint16
+        codes = np.stack(
+            [
+                assign_to_centroids(residuals[:, m * sub_dim : (m + 1) * sub_dim], codebooks[m])
+                for m in range(num_subspaces)
+            ],
+            axis=1,
+        ).astype(code_dtype)
+
+        list_ids = np.argsort(assignment, kind="stable")
+        list_offsets = np.zeros(num_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=num_lists))
+
+        logger.info(
+            f"Built IVF-PQ index: {N} entries, {num_lists} lists, "
+            f"{num_subspaces}x{num_codes} codes"
+        )
+        return IVFPQIndex(
+            centroids=centroids,
+            codebooks=codebooks,
+            list_offsets=list_offsets,
+            list_ids=list_ids,
+            codes=np.ascontiguousarray(codes[list_ids]),
+            nprobe=nprobe,
+        )
+
+    @property
+    def size(self) -> int:
+        return self.list_ids.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def num_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.centroids.nbytes
+            + self.codebooks.nbytes
+            + self.list_offsets.nbytes
+            + self.list_ids.nbytes
+            + self.codes.nbytes
+        )
+
+    def search(
+        self, queries: np.ndarray, top_k: int, nprobe: Optional[int] = None, **params
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top_k search probing `nprobe` lists (default self.nprobe)."""
+        queries = np.asarray(queries, dtype=np.float32)
+        B = queries.shape[0]
+        num_subspaces, num_codes, sub_dim = self.codebooks.shape
+        nprobe = min(nprobe or self.nprobe, self.num_lists)
+
+        coarse_scores = queries @ self.centroids.T  # [B, num_lists]
+        probed_lists, _ = top_k_by_score(coarse_scores, nprobe)  # [B, nprobe]
+        starts = self.list_offsets[probed_lists]  # [B, nprobe]
+        lengths = self.list_offsets[probed_lists + 1] - starts
+        # Queries are scanned in blocks whose [block, L] entry scores stay bounded.
+        max_total = max(int(lengths.sum(axis=1).max(initial=0)), 1)
+        block = max(1, _ADC_BLOCK_ENTRIES // max_total)
+        codewords = self.codebooks.reshape(-1, sub_dim)  # [M * num_codes, D / M]
+        code_offsets = np.arange(num_subspaces) * num_codes
+
+        indices = np.full((B, top_k), -1, dtype=np.int64)
+        scores = np.full((B, top_k), INVALID_SCORE, dtype=np.float32)
+        for lo in range(0, B, block):
+            hi = min(lo + block, B)
+            positions, valid = _padded_ranges(starts[lo:hi], lengths[lo:hi])
+            if positions.shape[1] == 0:
+                continue
+            # Column of each (query, probed list) range in the padded entry scores.
+            columns = np.cumsum(lengths[lo:hi], axis=1) - lengths[lo:hi]
+            entry_scores = np.full(positions.shape, INVALID_SCORE, dtype=np.float32)
+            block_lists = probed_lists[lo:hi].ravel()
+            order = np.argsort(block_lists, kind="stable")
+            bounds = np.flatnonzero(np.diff(block_lists[order])) + 1
+            for group in np.split(order, bounds):
+                query_rows, probe = np.divmod(group, nprobe)
+                list_id = block_lists[group[0]]
+                start, end = self.list_offsets[list_id], self.list_offsets[list_id + 1]
+                if start == end:
+                    continue
+                # Decoded residuals [n, D] of the list, shared by its queries.
+                residuals = np.take(codewords, self.codes[start:end] + code_offsets, axis=0)
+                residuals = residuals.reshape(end - start, -1)
+                list_scores = queries[lo + query_rows] @ residuals.T  # [q, n]
+                list_scores += coarse_scores[lo + query_rows, list_id][:, None]
+                cols = columns[query_rows, probe][:, None] + np.arange(end - start)
+                entry_scores[query_rows[:, None], cols] = list_scores
+            top, top_scores = top_k_by_score(entry_scores, top_k)
+            found = (top >= 0) & (top_scores > INVALID_SCORE)
+            rows = np.take_along_axis(positions, np.maximum(top, 0), axis=1)
+            indices[lo:hi] = np.where(found, self.list_ids[rows], -1)
+            scores[lo:hi] = np.where(found, top_scores, INVALID_SCORE)
+
+        return indices, scores
+
+
+class AuthorClusteredIndex(CorpusIndex):
+    """Two-level index that shortlists authors, then scores their posts exactly.
+
+    The corpus is grouped by author: each author's posts occupy one contiguous
+    range of an author-ordered copy of the embeddings, and each author is
+    summarized by the mean of its post embeddings. Search scores the queries
+    against all author centroids, keeps the `num_authors` best authors per
+    query and scores only the posts in their ranges, so the cost depends on
+    the shortlisted authors' post counts rather than on the corpus size. The
+    posts of a batch of queries are padded to a common width and scored in
+    one batched product.
+
+    Args:
+        centroids: [num_authors, D] mean post embedding of each author
+        author_ids: [num_authors] author ID of each centroid, ascending
+        author_offsets: [num_authors + 1] start of each author's posts in
+            `embeddings`
+        post_rows: [N] corpus row of each entry, in author order
+        embeddings: [N, D] corpus embeddings, in author order
+        num_authors: default number of authors shortlisted per query
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        author_ids: np.ndarray,
+        author_offsets: np.ndarray,
+        post_rows: np.ndarray,
+        embeddings: np.ndarray,
+        num_authors: int = 64,
+    ):
+        self.centroids = centroids
+        self.author_ids = author_ids
+        self.author_offsets = author_offsets
+        self.post_rows = post_rows
+        self.embeddings = embeddings
+        self.num_authors = num_authors
+
+    @staticmethod
+    def build(
+        embeddings: np.ndarray, corpus_author_ids: np.ndarray, num_authors: int = 64
+    ) -> "AuthorClusteredIndex":
+        """Group corpus embeddings [N, D] by their authors [N] and pool author centroids."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        corpus_author_ids = np.asarray(corpus_author_ids)
+        if corpus_author_ids.shape[0] != embeddings.shape[0]:
+            raise ValueError(
+                f"Number of author IDs ({corpus_author_ids.shape[0]}) does not match the "
+                f"corpus ({embeddings.shape[0]})"
+            )
+        author_ids, author_of_post, counts = np.unique(
+            corpus_author_ids, return_inverse=True, return_counts=True
+        )
+        post_rows = np.argsort(author_of_post, kind="stable")
+        author_offsets = np.zeros(author_ids.shape[0] + 1, dtype=np.int64)
+        author_offsets[1:] = np.cumsum(counts)
+        sorted_embeddings = np.ascontiguousarray(embeddings[post_rows])
+        # Sum each author's contiguous range of posts.
+        centroids = np.add.reduceat(sorted_embeddings, author_offsets[:-1], axis=0)
+        centroids /= counts[:, None].astype(np.float32)
+
+        logger.info(
+            f"Built author-clustered index: {embeddings.shape[0]} entries, "
+            f"{author_ids.shape[0]} authors"
+        )
+        return AuthorClusteredIndex(
+            centroids=centroids,
+            author_ids=author_ids,
+            author_offsets=author_offsets,
+            post_rows=post_rows,
+            embeddings=sorted_embeddings,
+            num_authors=num_authors,
+        )
+
+    @property
+    def size(self) -> int:
+        return self.post_rows.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.centroids.nbytes
+            + self.author_ids.nbytes
+            + self.author_offsets.nbytes
+            + self.post_rows.nbytes
+            + self.embeddings.nbytes
+        )
+
+    def search(
+        self, queries: np.ndarray, top_k: int, num_authors: Optional[int] = None, **params
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top_k search over the posts of the `num_authors` best-scoring authors."""
+        queries = np.asarray(queries, dtype=np.float32)
+        B = queries.shape[0]
+        num_authors = min(num_authors or self.num_authors, self.centroids.shape[0])
+
+        shortlists, _ = top_k_by_score(queries @ self.centroids.T, num_authors)  # [B, A]
+        starts = self.author_offsets[shortlists]
+        lengths = self.author_offsets[shortlists + 1] - starts
+        # Queries are scored in blocks whose [block, L, D] post gathers stay bounded.
+        max_total = max(int(lengths.sum(axis=1).max(initial=0)), 1)
+        block = max(1, _AUTHOR_BLOCK_FLOATS // (max_total * self.dim))
+
+        indices = np.full((B, top_k), -1, dtype=np.int64)
+        scores = np.full((B, top_k), INVALID_SCORE, dtype=np.float32)
+        for lo in range(0, B, block):
+            hi = min(lo + block, B)
+            # Posts of each query's shortlisted authors, author by author.
+            positions, valid = _padded_ranges(starts[lo:hi], lengths[lo:hi])
+            post_scores = np.matmul(self.embeddings[positions], queries[lo:hi, :, None])[..., 0]
+            post_scores = np.where(valid, post_scores, INVALID_SCORE).astype(np.float32)
+            top, top_scores = top_k_by_score(post_scores, top_k)
+            found = (top >= 0) & (top_scores > INVALID_SCORE)
+            rows = np.take_along_axis(positions, np.maximum(top, 0), axis=1)
+            indices[lo:hi] = np.where(found, self.post_rows[rows], -1)
+            scores[lo:hi] = np.where(found, top_scores, INVALID_SCORE)
+
+        return indices, scores
+
+
+class HNSWIndex(CorpusIndex):
+    """Hierarchical navigable small world graph index (HNSW).
+
+    Every entry is a node on layers 0..level, with level drawn from a geometric
+    distribution, so each layer holds a shrinking subset of the layer below.
+    Adjacency is array-backed: layer l is an [capacity, degree] int32 array of
+    neighbor rows padded with -1 (degree 2 * max_neighbors on layer 0,
+    max_neighbors above). Full-precision vectors are kept, so result scores are
+    exact inner products.
+
+    Search descends greedily from the entry point through the upper layers and
+    then runs a best-first beam search of width `ef_search` on layer 0. All
+    queries of a batch advance in lockstep: each step expands the best
+    unexpanded nodes (`expand_width` of them) of every query's beam and scores
+    all gathered neighbors in one batched product.
+
+    Entries are inserted incrementally with `add`. A chunk of new entries is
+    linked in one batched search over the existing graph, with the other entries
+    of the chunk added as neighbor candidates; neighbors are chosen with the
+    HNSW diversity heuristic and linked in both directions.
+
+    Args:
+        dim: embedding dimension D
+        max_neighbors: M, neighbors selected per node and layer
+        ef_construction: beam width when linking inserted entries
+        ef_search: default beam width of search (raised to top_k if smaller)
+        expand_width: default number of beam nodes expanded per search step
+        insert_batch_size: entries linked per batched insertion step
+        seed: random seed of the level assignment
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        max_neighbors: int = 16,
+        ef_construction: int = 100,
+        ef_search: int = 64,
+        expand_width: int = 4,
+        insert_batch_size: int = 64,
+        seed: int = 0,
+    ):
+        self.max_neighbors = max_neighbors
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.expand_width = expand_width
+        self.insert_batch_size = insert_batch_size
+        self._rng = np.random.default_rng(seed)
+        self._level_multiplier = 1.0 / np.log(max(max_neighbors, 2))
+
+        self._size = 0
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.levels = np.zeros((0,), dtype=np.int8)
+        self.layers: List[np.ndarray] = []
+        self.entry_point = -1
+
+    @staticmethod
+    def build(
+        embeddings: np.ndarray,
+        max_neighbors: int = 16,
+        ef_construction: int = 100,
+        ef_search: int = 64,
+        expand_width: int = 4,
+        insert_batch_size: int = 64,
+        seed: int = 0,
+    ) -> "HNSWIndex":
+        """Build an index over corpus embeddings [N, D]; rows keep their order."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        index = HNSWIndex(
+            embeddings.shape[1],
+            max_neighbors=max_neighbors,
+            ef_construction=ef_construction,
+            ef_search=ef_search,
+            expand_width=expand_width,
+            insert_batch_size=insert_batch_size,
+            seed=seed,
+        )
+        index.add(embeddings)
+        logger.info(
+            f"Built HNSW index: {index.size} entries, {len(index.layers)} layers, "
+            f"M={max_neighbors}"
+        )
+        return index
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    @property
+    def max_level(self) -> int:
+        return len(self.layers) - 1
+
+    @property
+    def nbytes(self) -> int:
+        n = self._size
+        return (
+            self.vectors[:n].nbytes
+            + self.levels[:n].nbytes
+            + sum(layer[:n].nbytes for layer in self.layers)
+        )
+
+    def _degree(self, level: int) -> int:
+        return 2 * self.max_neighbors if level == 0 else self.max_neighbors
+
+    def _reserve(self, capacity: int):
+        """Grow the row arrays to hold at least `capacity` entries."""
+        if capacity <= self.vectors.shape[0]:
+            return
+        capacity = max(capacity, 2 * self.vectors.shape[0])
+
+        def grow(array: np.ndarray, fill) -> np.ndarray:
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[: array.shape[0]] = array
+            return grown
+
+        self.vectors = grow(self.vectors, 0.0)
+        self.levels = grow(self.levels, 0)
+        self.layers = [grow(layer, -1) for layer in self.layers]
+
+    def _add_layer(self):
+        level = len(self.layers)
+        self.layers.append(
+            np.full((self.vectors.shape[0], self._degree(level)), -1, dtype=np.int32)
+        )
+
+    def add(self, embeddings: np.ndarray) -> np.ndarray:
+        """Insert embeddings [n, D]; returns their rows [n] (appended after existing ones)."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        n = embeddings.shape[0]
+        start = self._size
+        self._reserve(start + n)
+        self.vectors[start : start + n] = embeddings
+        levels = np.floor(-np.log(1.0 - self._rng.random(n)) * self._level_multiplier)
+        self.levels[start : start + n] = np.minimum(levels, np.iinfo(np.int8).max)
+
+        position = start
+        while position < start + n:
+            if self._size == 0:
+                chunk = 1
+            else:
+                # Keep chunks small relative to the graph they are linked into.
+                chunk = min(self.insert_batch_size, self._size, start + n - position)
+            self._insert_chunk(np.arange(position, position + chunk))
+            position += chunk
+
+        return np.arange(start, start + n)
+
+    def _insert_chunk(self, rows: np.ndarray):
+        levels = self.levels[rows].astype(np.int64)
+        top_level = int(levels.max())
+        while self.max_level < top_level:
+            self._add_layer()
+
+        queries = self.vectors[rows]
+        graph_top = int(self.levels[self.entry_point]) if self.entry_point >= 0 else -1
+        # Pairwise scores of the chunk, for linking entries of the same chunk.
+        peer_scores = queries @ queries.T
+        np.fill_diagonal(peer_scores, -np.inf)
+
+        entries = np.full((len(rows), 1), self.entry_point, dtype=np.int64)
+        for level in range(top_level, -1, -1):
+            inserting = levels >= level
+            if level <= graph_top:
+                ef = np.where(inserting, self.ef_construction, 1)
+                found_ids, found_scores = self._search_layer(
+                    queries, entries, level, int(ef.max()), self.expand_width
+                )
+                # Non-inserting entries only descend greedily.
+                found_ids[~inserting, 1:] = -1
+                found_scores[~inserting, 1:] = -np.inf
+                entries = found_ids
+            else:
+                found_ids = np.full((len(rows), 0), -1, dtype=np.int64)
+                found_scores = np.full((len(rows), 0), -np.inf, dtype=np.float32)
+
+            for i in np.nonzero(inserting)[0]:
+                peers = np.nonzero(levels >= level)[0]
+                peers = peers[peers != i]
+                candidate_ids = np.concatenate([found_ids[i], rows[peers]])
+                candidate_scores = np.concatenate([found_scores[i], peer_scores[i, peers]])
+                valid = candidate_ids >= 0
+                neighbors = self._select_neighbors(
+                    candidate_ids[valid], candidate_scores[valid], self.max_neighbors
+                )
+                self.layers[level][rows[i], : len(neighbors)] = neighbors
+
+            for i in np.nonzero(inserting)[0]:
+                for neighbor in self.layers[level][rows[i]]:
+                    if neighbor < 0:
+                        break
+                    self._link(int(neighbor), int(rows[i]), level)
+
+        self._size = int(rows[-1]) + 1
+        if top_level > graph_top:
+            self.entry_point = int(rows[np.argmax(levels)])
+
+    def _select_neighbors(
+        self, candidate_ids: np.ndarray, candidate_scores: np.ndarray, max_count: int
+    ) -> np.ndarray:
+        """HNSW neighbor selection heuristic.
+
+        Candidates are taken best first; one is kept only if it is closer to the
+        base node than to every neighbor kept so far, favouring diverse directions.
+        """
+        order = np.argsort(-candidate_scores, kind="stable")
+        candidate_ids = candidate_ids[order]
+        candidate_scores = candidate_scores[order]
+        vectors = self.vectors[candidate_ids]
+        pairwise = vectors @ vectors.T
+        # Highest similarity of each candidate to any selected neighbor.
+        max_selected_sim = np.full(len(candidate_ids), -np.inf, dtype=np.float32)
+        selected: List[int] = []
+        start = 0
+        while len(selected) < max_count:
+            eligible = np.nonzero(max_selected_sim[start:] < candidate_scores[start:])[0]
+            if len(eligible) == 0:
+                break
+            i = start + int(eligible[0])
+            selected.append(i)
+            max_selected_sim = np.maximum(max_selected_sim, pairwise[i])
+            start = i + 1
+        return candidate_ids[selected].astype(np.int32)
+
+    def _link(self, node: int, new_neighbor: int, level: int):
+        """Add the reverse edge node -> new_neighbor, pruning a full neighbor list."""
+        neighbors = self.layers[level][node]
+        if np.any(neighbors == new_neighbor):
+            return
+        free = np.nonzero(neighbors < 0)[0]
+        if len(free):
+            neighbors[free[0]] = new_neighbor
+            return
+        candidate_ids = np.append(neighbors, new_neighbor)
+        candidate_scores = self.vectors[candidate_ids] @ self.vectors[node]
+        kept = self._select_neighbors(candidate_ids, candidate_scores, len(neighbors))
+        neighbors[:] = -1
+        neighbors[: len(kept)] = kept
+
+    def _search_layer(
+        self,
+        queries: np.ndarray,
+        entries: np.ndarray,
+        level: int,
+        ef: int,
+        expand_width: int = 1,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Batched best-first search of one layer.
+
+        Args:
+            queries: [B, D]
+            entries: [B, E] entry node rows, -1 padded
+            level: layer to search
+            ef: beam width
+            expand_width: beam nodes expanded per query and step; expanding
+                several at once trades extra scored neighbors for fewer steps
+
+        Returns:
+            ids: [B, ef] best nodes found, -1 padded, in no particular order
+            scores: [B, ef] their inner products with the queries, -inf padded
+        """
+        adjacency = self.layers[level]
+        B = queries.shape[0]
+        rows = np.arange(B)[:, None]
+        expand_width = min(expand_width, ef)
+
+        pool_ids = np.full((B, ef), -1, dtype=np.int64)
+        pool_scores = np.full((B, ef), -np.inf, dtype=np.float32)
+        expanded = np.ones((B, ef), dtype=bool)
+
+        def merge(new_ids: np.ndarray):
+            nonlocal pool_ids, pool_scores, expanded
+            new_scores = np.einsum("bd,bkd->bk", queries, self.vectors[np.maximum(new_ids, 0)])
+            # Drop padding, repeated ids and nodes already in the beam. A node
+            # that dropped out of the beam scores below its minimum, which only
+            # rises, so it cannot re-enter and search ends without a visited set.
+            order = np.argsort(new_ids, axis=1)
+            sorted_ids = new_ids[rows, order]
+            repeated = np.zeros_like(new_ids, dtype=bool)
+            repeated[rows, order[:, 1:]] = sorted_ids[:, 1:] == sorted_ids[:, :-1]
+            in_pool = np.any(new_ids[:, :, None] == pool_ids[:, None, :], axis=-1)
+            invalid = (new_ids < 0) | repeated | in_pool
+            new_scores = np.where(invalid, -np.inf, new_scores).astype(np.float32)
+
+            merged_ids = np.concatenate([pool_ids, new_ids], axis=1)
+            merged_scores = np.concatenate([pool_scores, new_scores], axis=1)
+            merged_expanded = np.concatenate([expanded, invalid], axis=1)
+            keep = np.argpartition(-merged_scores, ef - 1, axis=1)[:, :ef]
+            pool_scores = merged_scores[rows, keep]
+            valid = np.isfinite(pool_scores)
+            pool_ids = np.where(valid, merged_ids[rows, keep], -1)
+            expanded = merged_expanded[rows, keep] | ~valid
+
+        merge(entries)
+        while True:
+            frontier_scores = np.where(expanded, -np.inf, pool_scores)
+            if expand_width == 1:
+                best = np.argmax(frontier_scores, axis=1)[:, None]
+            else:
+                best = np.argpartition(-frontier_scores, expand_width - 1, axis=1)[
+                    :, :expand_width
+                ]
+            active = np.isfinite(frontier_scores[rows, best])  # [B, expand_width]
+            if not active.any():
+                break
+            expanded[rows, best] |= active
+            current = np.where(active, pool_ids[rows, best], -1)
+            neighbors = np.where(
+                active[:, :, None], adjacency[np.maximum(current, 0)], -1
+            )  # [B, expand_width, degree]
+            merge(neighbors.reshape(B, -1).astype(np.int64))
+
+        return pool_ids, pool_scores
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        ef_search: Optional[int] = None,
+        expand_width: Optional[int] = None,
+        **params,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top_k search with beam width `ef_search` (default self.ef_search),
+        expanding `expand_width` (default self.expand_width) beam nodes per step."""
+        queries = np.asarray(queries, dtype=np.float32)
+        B = queries.shape[0]
+        if self._size == 0:
+            return top_k_by_score(np.zeros((B, 0), dtype=np.float32), top_k)
+        ef = max(ef_search or self.ef_search, top_k)
+
+        entries = np.full((B, 1), self.entry_point, dtype=np.int64)
+        for level in range(self.max_level, 0, -1):
+            entries, _ = self._search_layer(queries, entries, level, 1)
+        ids, scores = self._search_layer(
+            queries, entries, 0, ef, expand_width or self.expand_width
+        )
+
+        top, top_scores = top_k_by_score(scores, top_k)
+        valid = (top >= 0) & np.isfinite(top_scores)
+        indices = np.where(valid, np.take_along_axis(ids, np.maximum(top, 0), axis=1), -1)
+        return indices, np.where(valid, top_scores, INVALID_SCORE).astype(np.float32)
@@ -0,0 +1,133 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import logging
+from dataclasses import dataclass
+from typing import Callable, Optional, Sequence, Tuple
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from jax.sharding import Mesh, NamedSharding
+from jax.sharding import PartitionSpec as P
+
+logger = logging.getLogger(__name__)
+
+# Mesh axis the corpus rows are partitioned along.
+CORPUS_AXIS = "corpus"
+
+# local_top_k(params, user_representation [B, D], corpus shard [S, D], top_k,
+# shard mask [S]) -> (indices into the shard [B, k], scores [B, k]).
+LocalTopKFn = Callable[..., Tuple[jax.Array, jax.Array]]
+
+
+@dataclass(frozen=True)
+class ShardedCorpus:
+    """Corpus embeddings partitioned along N across the devices of a mesh.
+
+    The corpus is zero-padded to num_shards * shard_size rows; mask is False on
+    the padding rows so they are never retrieved.
+    """
+
+    embeddings: jax.Array  # [num_shards * shard_size, D]
+    mask: jax.Array  # [num_shards * shard_size]
+    size: int
+    mesh: Mesh
+
+    @property
+    def num_shards(self) -> int:
+        return self.mesh.shape[CORPUS_AXIS]
+
+    @property
+    def shard_size(self) -> int:
+        return self.embeddings.shape[0] // self.num_shards
+
+
+def shard_corpus(
+    corpus_embeddings: jax.Array, devices: Optional[Sequence[jax.Device]] = None
+) -> ShardedCorpus:
+    """Partition corpus embeddings [N, D] row-wise across devices.
+
+    Args:
+        corpus_embeddings: [N, D] normalized corpus candidate embeddings
+        devices: devices to shard over; defaults to all local devices
+
+    Returns:
+        ShardedCorpus whose shard i holds rows [i * shard_size, (i + 1) * shard_size)
+    """
+    devices = list(devices) if devices is not None else jax.local_devices()
+    mesh = Mesh(np.array(devices), (CORPUS_AXIS,))
+    num_shards = len(devices)
+    size = corpus_embeddings.shape[0]
+    shard_size = max(-(-size // num_shards), 1)
+    padded_size = num_shards * shard_size
+
+    corpus = np.asarray(corpus_embeddings)
+    padded = np.zeros((padded_size, corpus.shape[1]), dtype=corpus.dtype)
+    padded[:size] = corpus
+    sharding = NamedSharding(mesh, P(CORPUS_AXIS))
+    logger.info(
+        f"Sharding corpus of {size} rows across {num_shards} devices "
+        f"({shard_size} rows per shard)"
+    )
+    return ShardedCorpus(
+        embeddings=jax.device_put(padded, sharding),
+        mask=jax.device_put(np.arange(padded_size) < size, sharding),
+        size=size,
+        mesh=mesh,
+    )
+
+
+def make_sharded_top_k(local_top_k: LocalTopKFn, mesh: Mesh):
+    """Build a jitted top-k over a corpus sharded along CORPUS_AXIS of mesh.
+
+    Every device scores the replicated user representations against its corpus
+    shard and keeps a local top-k; the [B, k] candidates of all shards are then
+    all-gathered and merged into the global top-k, which ends up replicated.
+
+    Args:
+        local_top_k: per-shard top-k, e.g. the applied
+            PhoenixRetrievalModel._retrieve_top_k (see LocalTopKFn)
+        mesh: mesh with a CORPUS_AXIS axis
+
+    Returns:
+        fn(params, user_representation [B, D], ShardedCorpus.embeddings,
+        ShardedCorpus.mask, top_k) -> (top_k_indices [B, K] into the unpadded
+        corpus rows, top_k_scores [B, K])
+    """
+
+    def shard_top_k(params, user_representation, embeddings, mask, top_k):
+        shard_size = embeddings.shape[0]
+        local_k = min(top_k, shard_size)
+        indices, scores = local_top_k(params, user_representation, embeddings, local_k, mask)
+        indices = indices + jax.lax.axis_index(CORPUS_AXIS) * shard_size
+
+        # [B, num_shards * local_k] candidates from all shards.
+        indices = jax.lax.all_gather(indices, CORPUS_AXIS, axis=1, tiled=True)
+        scores = jax.lax.all_gather(scores, CORPUS_AXIS, axis=1, tiled=True)
+        top_k_scores, order = jax.lax.top_k(scores, top_k)
+        return jnp.take_along_axis(indices, order, axis=1), top_k_scores
+
+    @functools.partial(jax.jit, static_argnums=4)
+    def sharded_top_k(params, user_representation, embeddings, mask, top_k):
+        return jax.shard_map(
+            functools.partial(shard_top_k, top_k=top_k),
+            mesh=mesh,
+            in_specs=(P(), P(), P(CORPUS_AXIS), P(CORPUS_AXIS)),
+            out_specs=(P(), P()),
+            check_vma=False,
+        )(params, user_representation, embeddings, mask)
+
+    return sharded_top_k
@@ -0,0 +1,269 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import dataclasses
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict
+
+import numpy as np
+
+from embedding_store import (
+    AUTHOR_TABLE,
+    POST_TABLE,
+    USER_TABLE,
+    EmbeddingTable,
+    EmbeddingTableStore,
+)
+
+logger = logging.getLogger(__name__)
+
+LRU = "lru"
+LFU = "lfu"
+
+_SET_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_SKETCH_MULTIPLIERS = np.array(
+    [0xBF58476D1CE4E5B9, 0x94D049BB133111EB, 0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD],
+    dtype=np.uint64,
+)
+_SKETCH_MAX_COUNT = 15
+
+
+@dataclass
+class CacheStats:
+    """Running counters for one embedding cache."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    rejected_admissions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected_admissions = 0
+
+
+def _next_power_of_two(x: int) -> int:
+    return 1 << max(0, int(x - 1).bit_length())
+
+
+class CachedEmbeddingTable(EmbeddingTable):
+    """Set-associative row cache in front of another EmbeddingTable.
+
+    Cached rows live in a single contiguous float32 slab of `capacity` rows,
+    indexed by a [num_sets, ways] key array, so lookups, hits and fills are
+    vectorized over the whole request and no per-row Python objects exist.
+
+    Eviction policies:
+    - "lru": evict the least recently used way of the set; always admit.
+    - "lfu": TinyLFU-style. Access frequencies are estimated with a 4-bit
+      count-min sketch that is halved every `sample_size` accesses. The way
+      with the lowest estimated frequency is the victim, and a missed row is
+      only admitted if it is estimated to be more frequent than the victim.
+    """
+
+    def __init__(
+        self,
+        backing: EmbeddingTable,
+        capacity: int,
+        policy: str = LRU,
+        ways: int = 8,
+        sketch_width: int = 0,
+        sample_size: int = 0,
+    ):
+        if policy not in (LRU, LFU):
+            raise ValueError(f"Unknown cache policy {policy!r}, expected {LRU!r} or {LFU!r}")
+        self.backing = backing
+        self.policy = policy
+        self.ways = ways
+        self.num_sets = _next_power_of_two(max(1, capacity // ways))
+        self._set_shift = np.uint64(64 - max(1, self.num_sets.bit_length() - 1))
+        self.capacity = self.num_sets * ways
+
+        self.slab = np.zeros((self.capacity, backing.dim), dtype=np.float32)
+        self.keys = np.full((self.num_sets, ways), -1, dtype=np.int64)
+        self.last_used = np.full((self.num_sets, ways), -1, dtype=np.int64)
+        self._tick = 0
+
+        self.sketch_width = _next_power_of_two(sketch_width or 4 * self.capacity)
+        self._sketch_shift = np.uint64(64 - max(1, self.sketch_width.bit_length() - 1))
+        self.sketch = np.zeros((_SKETCH_MULTIPLIERS.shape[0], self.sketch_width), dtype=np.uint8)
+        self.sample_size = sample_size or 10 * self.capacity
+        self._sketch_additions = 0
+
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    @property
+    def num_rows(self) -> int:
+        return self.backing.num_rows
+
+    @property
+    def dim(self) -> int:
+        return self.backing.dim
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the cache itself (slab, index and frequency sketch)."""
+        return self.slab.nbytes + self.keys.nbytes + self.last_used.nbytes + self.sketch.nbytes
+
+    def _set_index(self, keys: np.ndarray) -> np.ndarray:
+        if self.num_sets == 1:
+            return np.zeros(keys.shape, dtype=np.int64)
+        with np.errstate(over="ignore"):
+            mixed = keys.astype(np.uint64) * _SET_HASH_MULTIPLIER
+        return (mixed >> self._set_shift).astype(np.int64)
+
+    def _sketch_columns(self, keys: np.ndarray) -> np.ndarray:
+        with np.errstate(over="ignore"):
+            mixed = keys.astype(np.uint64)[None, :] * _SKETCH_MULTIPLIERS[:, None]
+        return (mixed >> self._sketch_shift).astype(np.int64)
+
+    def _record_accesses(self, keys: np.ndarray):
+        columns = self._sketch_columns(keys)
+        depth = np.arange(self.sketch.shape[0])[:, None]
+        counts = np.zeros(self.sketch.shape, dtype=np.int32)
+        np.add.at(counts, (np.broadcast_to(depth, columns.shape), columns), 1)
+        np.minimum(self.sketch + counts, _SKETCH_MAX_COUNT, out=counts)
+        self.sketch[:] = counts
+
+        self._sketch_additions += keys.shape[0]
+        if self._sketch_additions >= self.sample_size:
+            # Aging: halve all counters so the sketch tracks recent popularity.
+            self.sketch >>= 1
+            self._sketch_additions //= 2
+
+    def _estimate_frequency(self, keys: np.ndarray) -> np.ndarray:
+        columns = self._sketch_columns(keys.reshape(-1))
+        depth = np.arange(self.sketch.shape[0])[:, None]
+        estimate = self.sketch[depth, columns].min(axis=0).astype(np.int64)
+        return estimate.reshape(keys.shape)
+
+    def gather(self, rows: np.ndarray, out: np.ndarray):
+        with self._lock:
+            self._gather_locked(np.asarray(rows, dtype=np.int64), out)
+
+    def _gather_locked(self, rows: np.ndarray, out: np.ndarray):
+        self._tick += 1
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        values = np.empty((unique_rows.shape[0], self.dim), dtype=np.float32)
+
+        sets = self._set_index(unique_rows)
+        match = self.keys[sets] == unique_rows[:, None]
+        hit = match.any(axis=1)
+        hit_ways = match.argmax(axis=1)
+
+        hit_sets, hit_ways = sets[hit], hit_ways[hit]
+        values[hit] = self.slab[hit_sets * self.ways + hit_ways]
+        self.last_used[hit_sets, hit_ways] = self._tick
+
+        if self.policy == LFU:
+            self._record_accesses(unique_rows)
+
+        miss = ~hit
+        num_misses = int(miss.sum())
+        self.stats.hits += unique_rows.shape[0] - num_misses
+        self.stats.misses += num_misses
+        if num_misses:
+            miss_rows = unique_rows[miss]
+            miss_values = np.empty((num_misses, self.dim), dtype=np.float32)
+            self.backing.gather(miss_rows, miss_values)
+            values[miss] = miss_values
+            self._insert(miss_rows, sets[miss], miss_values)
+
+        np.take(values, inverse.reshape(-1), axis=0, out=out)
+
+    def _insert(self, keys: np.ndarray, sets: np.ndarray, values: np.ndarray):
+        """Insert missed rows, at most `ways` per set, choosing victims per policy."""
+        order = np.argsort(sets, kind="stable")
+        keys, sets, values = keys[order], sets[order], values[order]
+
+        # Rank of each miss among the misses that map to the same set.
+        first_in_set = np.r_[True, sets[1:] != sets[:-1]]
+        group_start = np.maximum.accumulate(np.where(first_in_set, np.arange(sets.shape[0]), 0))
+        rank = np.arange(sets.shape[0]) - group_start
+        fits = rank < self.ways
+        keys, sets, values, rank = keys[fits], sets[fits], values[fits], rank[fits]
+
+        resident = self.keys[sets]
+        if self.policy == LRU:
+            priority = self.last_used[sets]
+        else:
+            priority = np.where(resident >= 0, self._estimate_frequency(resident), -1)
+        victim_ways = np.take_along_axis(
+            np.argsort(priority, axis=1, kind="stable"), rank[:, None], axis=1
+        )[:, 0]
+        victim_keys = resident[np.arange(sets.shape[0]), victim_ways]
+
+        admit = np.ones(keys.shape[0], dtype=bool)
+        if self.policy == LFU:
+            victim_freq = np.where(victim_keys >= 0, self._estimate_frequency(victim_keys), -1)
+            admit = self._estimate_frequency(keys) > victim_freq
+            self.stats.rejected_admissions += int((~admit).sum())
+
+        sets, victim_ways = sets[admit], victim_ways[admit]
+        self.stats.evictions += int((victim_keys[admit] >= 0).sum())
+        self.keys[sets, victim_ways] = keys[admit]
+        self.last_used[sets, victim_ways] = self._tick
+        self.slab[sets * self.ways + victim_ways] = values[admit]
+
+
+def add_embedding_caches(
+    store: EmbeddingTableStore,
+    user_capacity: int = 0,
+    post_capacity: int = 0,
+    author_capacity: int = 0,
+    policy: str = LRU,
+    ways: int = 8,
+) -> EmbeddingTableStore:
+    """Return a copy of `store` whose tables are fronted by row caches.
+
+    A capacity of 0 leaves that table uncached.
+    """
+
+    def wrap(table: EmbeddingTable, capacity: int) -> EmbeddingTable:
+        if capacity <= 0:
+            return table
+        return CachedEmbeddingTable(table, capacity, policy=policy, ways=ways)
+
+    return dataclasses.replace(
+        store,
+        user_table=wrap(store.user_table, user_capacity),
+        post_table=wrap(store.post_table, post_capacity),
+        author_table=wrap(store.author_table, author_capacity),
+    )
+
+
+def cache_hit_rates(store: EmbeddingTableStore) -> Dict[str, float]:
+    """Return the hit rate of every cached table in `store`, keyed by table name."""
+    tables = {
+        USER_TABLE: store.user_table,
+        POST_TABLE: store.post_table,
+        AUTHOR_TABLE: store.author_table,
+    }
+    return {
+        name: table.stats.hit_rate
+        for name, table in tables.items()
+        if isinstance(table, CachedEmbeddingTable)
+    }
@@ -0,0 +1,632 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import math
+import mmap
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from recsys_model import HashConfig, RecsysBatch, RecsysEmbeddings
+
+logger = logging.getLogger(__name__)
+
+USER_TABLE = "user"
+POST_TABLE = "post"
+AUTHOR_TABLE = "author"
+
+FLOAT32 = "float32"
+BFLOAT16 = "bfloat16"
+INT8 = "int8"
+
+# File name suffixes of the on-disk table formats, relative to the table name.
+_TABLE_SUFFIXES = {
+    FLOAT32: ".npy",
+    BFLOAT16: ".bf16.npy",
+    INT8: ".int8.npy",
+}
+_INT8_SCALES_SUFFIX = ".int8_scales.npy"
+
+# Combiners of a compositional table's quotient and remainder embeddings.
+PRODUCT = "product"
+SUM = "sum"
+
+# A compositional table `<name>` is stored as two ordinary tables named
+# `<name>.quotient` and `<name>.remainder` plus a small JSON metadata file.
+_QUOTIENT_SUFFIX = ".quotient"
+_REMAINDER_SUFFIX = ".remainder"
+_COMPOSITIONAL_META_SUFFIX = ".qr.json"
+
+
+class EmbeddingTable(ABC):
+    """A hash-embedding table that can gather rows into a float32 output buffer."""
+
+    @property
+    @abstractmethod
+    def num_rows(self) -> int:
+        """Number of rows, including the padding row 0."""
+        pass
+
+    @property
+    @abstractmethod
+    def dim(self) -> int:
+        """Embedding dimension D."""
+        pass
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of table storage; defaults to a dense float32 table."""
+        return self.num_rows * self.dim * 4
+
+    @abstractmethod
+    def gather(self, rows: np.ndarray, out: np.ndarray):
+        """Gather `rows` [n] into `out` [n, D] float32.
+
+        Implementations must be safe to call concurrently on disjoint slices of
+        `out`, since large lookups are split across threads.
+        """
+        pass
+
+
+class MemmapEmbeddingTable(EmbeddingTable):
+    """Row-major float32 embedding table backed by a memory-mapped .npy file.
+
+    Rows are read through the OS page cache, so tables larger than RAM work;
+    only the pages touched by lookups are resident.
+    """
+
+    def __init__(self, path: str, writable: bool = False, advise_random: bool = True):
+        self.path = path
+        self.table = _open_memmap(path, writable, advise_random)
+        if self.table.ndim != 2:
+            raise ValueError(f"Embedding table {path} must be 2D, got shape {self.table.shape}")
+
+    @staticmethod
+    def create(path: str, num_rows: int, dim: int, dtype=np.float32) -> "MemmapEmbeddingTable":
+        """Create a zero-initialized table file and open it for writing."""
+        table = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(num_rows, dim))
+        table.flush()
+        del table
+        return MemmapEmbeddingTable(path, writable=True)
+
+    @property
+    def num_rows(self) -> int:
+        return self.table.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.table.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+    def gather(self, rows: np.ndarray, out: np.ndarray):
+        np.take(self.table, rows, axis=0, out=out)
+
+
+def _open_memmap(path: str, writable: bool, advise_random: bool) -> np.ndarray:
+    array = np.load(path, mmap_mode="r+" if writable else "r")
+    backing = getattr(array, "_mmap", None)
+    if advise_random and backing is not None and hasattr(mmap, "MADV_RANDOM"):
+        # Lookups are random row accesses; kernel read-ahead only wastes page cache.
+        backing.madvise(mmap.MADV_RANDOM)
+    return array
+
+
+class QuantizedEmbeddingTable(EmbeddingTable):
+    """Memory-mapped embedding table stored as bfloat16 or int8 rows.
+
+    - bfloat16: rows are stored as the upper 16 bits of the float32 values
+      (`<name>.bf16.npy`, uint16) and widened back on gather.
+    - int8: rows are symmetric-quantized with one float16 scale per row
+      (`<name>.int8.npy` and `<name>.int8_scales.npy`), dequantized on gather.
+
+    Use `quantize_table` to convert a float32 table offline.
+    """
+
+    def __init__(self, path_prefix: str, dtype: str, advise_random: bool = True):
+        if dtype not in (BFLOAT16, INT8):
+            raise ValueError(f"Unsupported quantized table dtype {dtype!r}")
+        self.path_prefix = path_prefix
+        self.dtype = dtype
+        self.table = _open_memmap(path_prefix + _TABLE_SUFFIXES[dtype], False, advise_random)
+        self.scales = None
+        if dtype == INT8:
+            self.scales = _open_memmap(path_prefix + _INT8_SCALES_SUFFIX, False, advise_random)
+
+    @property
+    def num_rows(self) -> int:
+        return self.table.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.table.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    def gather(self, rows: np.ndarray, out: np.ndarray):
+        stored = np.take(self.table, rows, axis=0)
+        if self.dtype == BFLOAT16:
+            widened = out.view(np.uint32)
+            np.left_shift(stored, 16, out=widened, dtype=np.uint32)
+        else:
+            scales = np.take(self.scales, rows, axis=0).astype(np.float32)  # type: ignore
+            np.multiply(stored, scales[:, None], out=out, dtype=np.float32)
+
+
+def quantize_rows(rows: np.ndarray, dtype: str):
+    """Quantize float32 rows [n, D]; returns (stored rows, per-row scales or None)."""
+    rows = np.ascontiguousarray(rows, dtype=np.float32)
+    if dtype == BFLOAT16:
+        bits = rows.view(np.uint32)
+        # Round to nearest even on the 16 dropped mantissa bits.
+        rounding = ((bits >> 16) & 1) + np.uint32(0x7FFF)
+        return ((bits + rounding) >> 16).astype(np.uint16), None
+    scales = np.abs(rows).max(axis=1) / 127.0
+    scales = scales.astype(np.float16)
+    safe_scales = np.where(scales > 0, scales.astype(np.float32), 1.0)
+    quantized = np.clip(np.rint(rows / safe_scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+def quantize_table(
+    src_path: str,
+    dst_prefix: str,
+    dtype: str,
+    chunk_rows: int = 1 << 16,
+) -> QuantizedEmbeddingTable:
+    """Convert a float32 .npy table into a QuantizedEmbeddingTable, streaming by chunks.
+
+    Args:
+        src_path: path of the float32 [N, D] .npy table
+        dst_prefix: output path prefix; format-specific suffixes are appended
+        dtype: "bfloat16" or "int8"
+        chunk_rows: rows converted per step, bounding the converter's memory use
+
+    Returns:
+        The converted table, opened for reading
+    """
+    if dtype not in (BFLOAT16, INT8):
+        raise ValueError(f"Unsupported quantized table dtype {dtype!r}")
+    src = np.load(src_path, mmap_mode="r")
+    num_rows, dim = src.shape
+    stored_dtype = np.uint16 if dtype == BFLOAT16 else np.int8
+    dst = np.lib.format.open_memmap(
+        dst_prefix + _TABLE_SUFFIXES[dtype], mode="w+", dtype=stored_dtype, shape=(num_rows, dim)
+    )
+    scales = None
+    if dtype == INT8:
+        scales = np.lib.format.open_memmap(
+            dst_prefix + _INT8_SCALES_SUFFIX, mode="w+", dtype=np.float16, shape=(num_rows,)
+        )
+
+    for start in range(0, num_rows, chunk_rows):
+        end = min(start + chunk_rows, num_rows)
+        stored, chunk_scales = quantize_rows(src[start:end], dtype)
+        dst[start:end] = stored
+        if scales is not None:
+            scales[start:end] = chunk_scales
+
+    dst.flush()
+    if scales is not None:
+        scales.flush()
+    del dst, scales
+    logger.info(f"Quantized {src_path} ({num_rows}x{dim}) to {dtype} at {dst_prefix}")
+    return QuantizedEmbeddingTable(dst_prefix, dtype)
+
+
+class CompositionalEmbeddingTable(EmbeddingTable):
+    """Quotient-remainder hash-embedding table built from two small tables.
+
+    Row `r` of the logical [num_rows, D] table is composed from row `r // m` of
+    the quotient table and row `r % m` of the remainder table, where m is the
+    number of remainder rows. Every logical row maps to a distinct (quotient,
+    remainder) pair, so rows stay distinguishable while memory drops from
+    num_rows * D to roughly (num_rows / m + m) * D; m = sqrt(num_rows)
+    minimizes it.
+
+    The two parts are combined elementwise by product or sum. Each part is an
+    ordinary EmbeddingTable and may itself be quantized.
+    """
+
+    def __init__(
+        self,
+        quotient_table: EmbeddingTable,
+        remainder_table: EmbeddingTable,
+        num_rows: int,
+        combiner: str = PRODUCT,
+    ):
+        if combiner not in (PRODUCT, SUM):
+            raise ValueError(f"Unknown combiner {combiner!r}, expected {PRODUCT!r} or {SUM!r}")
+        if quotient_table.dim != remainder_table.dim:
+            raise ValueError(
+                f"Quotient and remainder dims differ: {quotient_table.dim} vs {remainder_table.dim}"
+            )
+        num_quotient_rows = -(-num_rows // remainder_table.num_rows)
+        if quotient_table.num_rows < num_quotient_rows:
+            raise ValueError(
+                f"Quotient table has {quotient_table.num_rows} rows, "
+                f"{num_quotient_rows} needed for {num_rows} logical rows"
+            )
+        self.quotient_table = quotient_table
+        self.remainder_table = remainder_table
+        self.combiner = combiner
+        self._num_rows = num_rows
+
+    @staticmethod
+    def create(
+        directory: str,
+        name: str,
+        num_rows: int,
+        dim: int,
+        num_remainder_rows: int = 0,
+        combiner: str = PRODUCT,
+    ) -> "CompositionalEmbeddingTable":
+        """Create zero-initialized, writable quotient and remainder tables for `name`.
+
+        Args:
+            directory: store directory
+            name: logical table name, e.g. "post"
+            num_rows: logical number of rows (the hash range)
+            dim: embedding dimension D
+            num_remainder_rows: rows of the remainder table; 0 uses ceil(sqrt(num_rows))
+            combiner: "product" or "sum"
+        """
+        num_remainder_rows = num_remainder_rows or math.isqrt(num_rows - 1) + 1
+        num_quotient_rows = -(-num_rows // num_remainder_rows)
+        prefix = os.path.join(directory, name)
+        quotient_table = MemmapEmbeddingTable.create(
+            prefix + _QUOTIENT_SUFFIX + _TABLE_SUFFIXES[FLOAT32], num_quotient_rows, dim
+        )
+        remainder_table = MemmapEmbeddingTable.create(
+            prefix + _REMAINDER_SUFFIX + _TABLE_SUFFIXES[FLOAT32], num_remainder_rows, dim
+        )
+        with open(prefix + _COMPOSITIONAL_META_SUFFIX, "w") as f:
+            json.dump({"num_rows": num_rows, "combiner": combiner}, f)
+        return CompositionalEmbeddingTable(quotient_table, remainder_table, num_rows, combiner)
+
+    @property
+    def num_rows(self) -> int:
+        return self._num_rows
+
+    @property
+    def dim(self) -> int:
+        return self.quotient_table.dim
+
+    @property
+    def nbytes(self) -> int:
+        return self.quotient_table.nbytes + self.remainder_table.nbytes
+
+    def gather(self, rows: np.ndarray, out: np.ndarray):
+        quotient_rows, remainder_rows = np.divmod(rows, self.remainder_table.num_rows)
+        self.quotient_table.gather(quotient_rows, out)
+        remainder = np.empty_like(out)
+        self.remainder_table.gather(remainder_rows, remainder)
+        if self.combiner == PRODUCT:
+            np.multiply(out, remainder, out=out)
+        else:
+            np.add(out, remainder, out=out)
+
+
+def _read_compositional_meta(directory: str, name: str) -> Optional[dict]:
+    meta_path = os.path.join(directory, name) + _COMPOSITIONAL_META_SUFFIX
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def open_embedding_table(directory: str, name: str, writable: bool = False) -> EmbeddingTable:
+    """Open table `name` in `directory`, detecting its on-disk format."""
+    meta = _read_compositional_meta(directory, name)
+    if meta is not None:
+        return CompositionalEmbeddingTable(
+            open_embedding_table(directory, name + _QUOTIENT_SUFFIX, writable),
+            open_embedding_table(directory, name + _REMAINDER_SUFFIX, writable),
+            num_rows=meta["num_rows"],
+            combiner=meta["combiner"],
+        )
+    prefix = os.path.join(directory, name)
+    if os.path.exists(prefix + _TABLE_SUFFIXES[FLOAT32]):
+        return MemmapEmbeddingTable(prefix + _TABLE_SUFFIXES[FLOAT32], writable)
+    for dtype in (BFLOAT16, INT8):
+        if os.path.exists(prefix + _TABLE_SUFFIXES[dtype]):
+            if writable:
+                raise ValueError(f"Quantized table {prefix} cannot be opened for writing")
+            return QuantizedEmbeddingTable(prefix, dtype)
+    raise FileNotFoundError(f"No embedding table named {name!r} in {directory}")
+
+
+@dataclass
+class TableLookupStats:
+    """Running lookup counters for one embedding table."""
+
+    lookups: int = 0
+    unique_lookups: int = 0
+
+    @property
+    def unique_rate(self) -> float:
+        """Fraction of looked-up hashes that were unique within their batch."""
+        if self.lookups == 0:
+            return 1.0
+        return self.unique_lookups / self.lookups
+
+    def reset(self):
+        self.lookups = 0
+        self.unique_lookups = 0
+
+
+@dataclass
+class EmbeddingTableStore:
+    """User, post and author hash-embedding tables producing RecsysEmbeddings.
+
+    Hash 0 is the padding hash and always yields a zero embedding, regardless
+    of what row 0 of the backing table contains.
+
+    With `dedup` enabled, every hash field that reads a table is deduplicated
+    across the whole batch before gathering, so each distinct row is read once
+    and then expanded back to the field shapes with an inverse-index gather.
+    Per-table unique rates are accumulated in `lookup_stats`.
+    """
+
+    hash_config: HashConfig
+    user_table: EmbeddingTable
+    post_table: EmbeddingTable
+    author_table: EmbeddingTable
+    num_threads: int = 8
+    # Gathers with fewer rows than this run on the calling thread.
+    parallel_threshold: int = 1 << 14
+    dedup: bool = True
+
+    lookup_stats: Dict[str, TableLookupStats] = field(
+        default_factory=lambda: {
+            USER_TABLE: TableLookupStats(),
+            POST_TABLE: TableLookupStats(),
+            AUTHOR_TABLE: TableLookupStats(),
+        },
+        init=False,
+    )
+
+    _executor: Optional[ThreadPoolExecutor] = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        dims = {self.user_table.dim, self.post_table.dim, self.author_table.dim}
+        if len(dims) != 1:
+            raise ValueError(f"All embedding tables must share one dimension, got {dims}")
+
+    @property
+    def emb_size(self) -> int:
+        return self.user_table.dim
+
+    @staticmethod
+    def open(
+        directory: str,
+        hash_config: HashConfig,
+        writable: bool = False,
+        **kwargs,
+    ) -> "EmbeddingTableStore":
+        """Open a store from the user, post and author tables in `directory`.
+
+        Each table may be float32 (`<name>.npy`) or quantized by `quantize_store`.
+        """
+        return EmbeddingTableStore(
+            hash_config=hash_config,
+            user_table=open_embedding_table(directory, USER_TABLE, writable),
+            post_table=open_embedding_table(directory, POST_TABLE, writable),
+            author_table=open_embedding_table(directory, AUTHOR_TABLE, writable),
+            **kwargs,
+        )
+
+    @staticmethod
+    def create(
+        directory: str,
+        hash_config: HashConfig,
+        emb_size: int,
+        num_user_embeddings: int,
+        num_post_embeddings: int,
+        num_author_embeddings: int,
+        compositional_tables: Sequence[str] = (),
+        combiner: str = PRODUCT,
+        **kwargs,
+    ) -> "EmbeddingTableStore":
+        """Create zero-initialized, writable table files in `directory`.
+
+        Tables named in `compositional_tables` are created as quotient-remainder
+        CompositionalEmbeddingTables with sqrt-sized parts, combined by `combiner`.
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        def create_table(name: str, num_rows: int) -> EmbeddingTable:
+            if name in compositional_tables:
+                return CompositionalEmbeddingTable.create(
+                    directory, name, num_rows, emb_size, combiner=combiner
+                )
+            return MemmapEmbeddingTable.create(
+                os.path.join(directory, name + _TABLE_SUFFIXES[FLOAT32]), num_rows, emb_size
+            )
+
+        return EmbeddingTableStore(
+            hash_config=hash_config,
+            user_table=create_table(USER_TABLE, num_user_embeddings),
+            post_table=create_table(POST_TABLE, num_post_embeddings),
+            author_table=create_table(AUTHOR_TABLE, num_author_embeddings),
+            **kwargs,
+        )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.num_threads, thread_name_prefix="embedding_gather"
+            )
+        return self._executor
+
+    def close(self):
+        """Shut down the gather thread pool."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def gather(self, table: EmbeddingTable, hashes: np.ndarray) -> np.ndarray:
+        """Gather embeddings for a hash array of any shape.
+
+        Args:
+            table: table to gather from
+            hashes: [...] int hash indices (0 = padding)
+
+        Returns:
+            embeddings: [..., D] float32, zero where hash == 0
+        """
+        hashes = np.asarray(hashes)
+        rows = hashes.reshape(-1)
+        out = np.empty((rows.shape[0], table.dim), dtype=np.float32)
+
+        n = rows.shape[0]
+        if n < self.parallel_threshold or self.num_threads <= 1:
+            table.gather(rows, out)
+        else:
+            bounds = np.linspace(0, n, self.num_threads + 1).astype(np.int64)
+            futures = [
+                self._get_executor().submit(table.gather, rows[lo:hi], out[lo:hi])
+                for lo, hi in zip(bounds[:-1], bounds[1:])
+                if hi > lo
+            ]
+            for future in futures:
+                future.result()
+
+        out[rows == 0] = 0
+        return out.reshape((*hashes.shape, table.dim))
+
+    def _lookup_table(
+        self,
+        name: str,
+        table: EmbeddingTable,
+        hash_arrays: Sequence[np.ndarray],
+    ) -> List[np.ndarray]:
+        """Gather embeddings for several hash arrays that read the same table."""
+        hash_arrays = [np.asarray(hashes) for hashes in hash_arrays]
+        stats = self.lookup_stats[name]
+        total = sum(hashes.size for hashes in hash_arrays)
+        stats.lookups += total
+
+        if not self.dedup:
+            stats.unique_lookups += total
+            return [self.gather(table, hashes) for hashes in hash_arrays]
+
+        all_hashes = np.concatenate([hashes.reshape(-1) for hashes in hash_arrays])
+        unique_hashes, inverse = np.unique(all_hashes, return_inverse=True)
+        stats.unique_lookups += unique_hashes.shape[0]
+
+        unique_embeddings = self.gather(table, unique_hashes)
+        expanded = np.take(unique_embeddings, inverse.reshape(-1), axis=0)
+
+        outputs = []
+        start = 0
+        for hashes in hash_arrays:
+            end = start + hashes.size
+            outputs.append(expanded[start:end].reshape((*hashes.shape, table.dim)))
+            start = end
+        return outputs
+
+    def lookup(self, batch: RecsysBatch) -> RecsysEmbeddings:
+        """Look up all embeddings needed by the models for a batch.
+
+        Args:
+            batch: RecsysBatch (or CompactRecsysBatch) with hash fields
+
+        Returns:
+            RecsysEmbeddings with float32 user [B, Hu, D], history/candidate post
+            [B, S|C, Hi, D] and history/candidate author [B, S|C, Ha, D] embeddings
+        """
+        (user_embeddings,) = self._lookup_table(
+            USER_TABLE, self.user_table, [batch.user_hashes]  # type: ignore
+        )
+        history_post_embeddings, candidate_post_embeddings = self._lookup_table(
+            POST_TABLE,
+            self.post_table,
+            [batch.history_post_hashes, batch.candidate_post_hashes],  # type: ignore
+        )
+        history_author_embeddings, candidate_author_embeddings = self._lookup_table(
+            AUTHOR_TABLE,
+            self.author_table,
+            [batch.history_author_hashes, batch.candidate_author_hashes],  # type: ignore
+        )
+
+        for name, stats in self.lookup_stats.items():
+            logger.debug(f"{name} table unique rate: {stats.unique_rate:.3f}")
+
+        return RecsysEmbeddings(
+            user_embeddings=user_embeddings,
+            history_post_embeddings=history_post_embeddings,
+            candidate_post_embeddings=candidate_post_embeddings,
+            history_author_embeddings=history_author_embeddings,
+            candidate_author_embeddings=candidate_author_embeddings,
+        )
+
+
+def quantize_store(
+    src_directory: str,
+    dst_directory: str,
+    dtype: str,
+    tables: Sequence[str] = (POST_TABLE, AUTHOR_TABLE),
+    chunk_rows: int = 1 << 16,
+):
+    """Convert the float32 tables of a store directory into a quantized store directory.
+
+    Tables not listed in `tables` are copied unchanged as float32. Compositional
+    tables have both their quotient and remainder parts converted.
+    """
+    os.makedirs(dst_directory, exist_ok=True)
+    for name in (USER_TABLE, POST_TABLE, AUTHOR_TABLE):
+        parts = [name]
+        meta = _read_compositional_meta(src_directory, name)
+        if meta is not None:
+            parts = [name + _QUOTIENT_SUFFIX, name + _REMAINDER_SUFFIX]
+            with open(os.path.join(dst_directory, name) + _COMPOSITIONAL_META_SUFFIX, "w") as f:
+                json.dump(meta, f)
+        for part in parts:
+            _convert_table_file(
+                src_directory, dst_directory, part, dtype, name in tables, chunk_rows
+            )
+
+
+def _convert_table_file(
+    src_directory: str,
+    dst_directory: str,
+    name: str,
+    dtype: str,
+    quantize: bool,
+    chunk_rows: int,
+):
+    src_path = os.path.join(src_directory, name + _TABLE_SUFFIXES[FLOAT32])
+    dst_prefix = os.path.join(dst_directory, name)
+    if quantize:
+        quantize_table(src_path, dst_prefix, dtype, chunk_rows)
+    else:
+        src = np.load(src_path, mmap_mode="r")
+        dst = np.lib.format.open_memmap(
+            dst_prefix + _TABLE_SUFFIXES[FLOAT32], mode="w+", dtype=np.float32, shape=src.shape
+        )
+        for start in range(0, src.shape[0], chunk_rows):
+            dst[start : start + chunk_rows] = src[start : start + chunk_rows]
+        dst.flush()
+        del dst
@@ -14,7 +14,7 @@
 
 import logging
 from dataclasses import dataclass
-from typing import NamedTuple, Optional, Sequence, Union
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
 
 import haiku as hk
 import jax
@@ -75,14 +75,21 @@ class MHAOutput(NamedTuple):
     """Outputs of the multi-head attention operation."""
 
     embeddings: jax.Array
+    # Rotated keys and values of the input positions, [B, T, num_kv_heads, key_size].
+    key: Optional[jax.Array] = None
+    value: Optional[jax.Array] = None
 
 
 class DecoderOutput(NamedTuple):
     embeddings: jax.Array
+    key: Optional[jax.Array] = None
+    value: Optional[jax.Array] = None
 
 
 class TransformerOutput(NamedTuple):
     embeddings: jax.Array
+    # Per-layer (key, value) of the input positions, usable as a later prefix_kv.
+    layer_kv: Optional[List[Tuple[jax.Array, jax.Array]]] = None
 
 
 @dataclass
@@ -289,13 +296,26 @@ class MultiHeadAttention(hk.Module):
         key: jax.Array,
         value: jax.Array,
         mask: jax.Array,
+        positions: Optional[jax.Array] = None,
+        prefix_key: Optional[jax.Array] = None,
+        prefix_value: Optional[jax.Array] = None,
     ) -> MHAOutput:
+        """Attend from `query` to the cached prefix (if any) followed by `key`/`value`.
+
+        Args:
+            query, key, value: [B, T, D] inputs
+            mask: [B, 1, T, P + T] attention mask over prefix and input keys
+            positions: [B, T] RoPE positions of the inputs; defaults to 0..T-1
+            prefix_key: [B, P, num_kv_heads, key_size] already rotated keys of earlier positions
+            prefix_value: [B, P, num_kv_heads, value_size] values of earlier positions
+        """
         # In shape hints below, we suppress the leading dims [...] for brevity.
         # Hence e.g. [A, B] should be read in every case as [..., A, B].
         projection = self._linear_projection
 
         # Check that the keys and values have consistent batch size and sequence length.
         assert key.shape[:2] == value.shape[:2], f"key/value shape: {key.shape}/{value.shape}"
+        prefix_len = 0 if prefix_key is None else prefix_key.shape[1]
 
         if mask is not None:
             assert mask.ndim == 4
@@ -314,7 +334,7 @@ class MultiHeadAttention(hk.Module):
             }, f"mask/query shape: {mask.shape}/{query.shape}"
             assert mask.shape[3] in {
                 1,
-                key.shape[1],
+                prefix_len + key.shape[1],
             }, f"mask/query shape: {mask.shape}/{key.shape}"
 
         # Compute key/query/values (overload K/Q/V to denote the respective sizes).
@@ -324,8 +344,15 @@ class MultiHeadAttention(hk.Module):
         value_heads = projection(value, self.value_size, self.num_kv_heads, name="value")
 
         rotate = RotaryEmbedding(dim=self.key_size, base_exponent=int(1e4))
-        key_heads = rotate(key_heads, seq_dim=1, offset=0)
-        query_heads = rotate(query_heads, seq_dim=1, offset=0)
+        key_heads = rotate(key_heads, seq_dim=1, offset=0, t=positions)
+        query_heads = rotate(query_heads, seq_dim=1, offset=0, t=positions)
+        new_key_heads, new_value_heads = key_heads, value_heads
+
+        if prefix_key is not None and prefix_value is not None:
+            key_heads = jnp.concatenate([prefix_key.astype(key_heads.dtype), key_heads], axis=1)
+            value_heads = jnp.concatenate(
+                [prefix_value.astype(value_heads.dtype), value_heads], axis=1
+            )
 
         b, t, h, d = query_heads.shape
         _, _, kv_h, _ = key_heads.shape
@@ -360,7 +387,7 @@ class MultiHeadAttention(hk.Module):
 
         # Apply another projection to get the final embeddings.
         final_projection = Linear(self.model_size, with_bias=False)
-        return MHAOutput(final_projection(attn))
+        return MHAOutput(final_projection(attn), key=new_key_heads, value=new_value_heads)
 
     @hk.transparent
     def _linear_projection(
@@ -388,12 +415,16 @@ class MHABlock(hk.Module):
     def __call__(
         self,
         inputs: jax.Array,  # [B, T, D]
-        mask: jax.Array,  # [B, 1, T, T] or [B, 1, 1, T] or B[1, 1, 1, 1]
+        mask: jax.Array,  # [B, 1, T, P + T] or [B, 1, 1, P + T] or B[1, 1, 1, 1]
+        positions: Optional[jax.Array] = None,  # [B, T]
+        prefix_key: Optional[jax.Array] = None,  # [B, P, num_kv_heads, key_size]
+        prefix_value: Optional[jax.Array] = None,  # [B, P, num_kv_heads, key_size]
     ) -> MHAOutput:
         _, _, model_size = inputs.shape
+        prefix_len = 0 if prefix_key is None else prefix_key.shape[1]
         assert mask.ndim == 4, f"shape: {mask.shape}"
         assert mask.shape[2] in {1, inputs.shape[1]}, str(mask.shape)
-        assert mask.shape[3] in {1, inputs.shape[1]}, str(mask.shape)
+        assert mask.shape[3] in {1, prefix_len + inputs.shape[1]}, str(mask.shape)
         side_input = inputs
 
         def attn_block(query, key, value, mask) -> MHAOutput:
@@ -403,12 +434,12 @@ class MHABlock(hk.Module):
                 key_size=self.key_size,
                 model_size=model_size,
                 attn_output_multiplier=self.attn_output_multiplier,
-            )(query, key, value, mask)
+            )(query, key, value, mask, positions, prefix_key, prefix_value)
 
         attn_output = attn_block(inputs, side_input, side_input, mask)
         h_attn = attn_output.embeddings
 
-        return MHAOutput(embeddings=h_attn)
+        return MHAOutput(embeddings=h_attn, key=attn_output.key, value=attn_output.value)
 
 
 @dataclass
@@ -456,8 +487,11 @@ class DecoderLayer(hk.Module):
     def __call__(
         self,
         inputs: jax.Array,  # [B, T, D]
-        mask: jax.Array,  # [B, 1, T, T] or [B, 1, 1, T]
+        mask: jax.Array,  # [B, 1, T, P + T] or [B, 1, 1, P + T]
         padding_mask: Optional[jax.Array],
+        positions: Optional[jax.Array] = None,  # [B, T]
+        prefix_key: Optional[jax.Array] = None,  # [B, P, num_kv_heads, key_size]
+        prefix_value: Optional[jax.Array] = None,  # [B, P, num_kv_heads, key_size]
     ) -> DecoderOutput:
         """Transforms input embedding sequences to output embedding sequences."""
         del padding_mask  # Unused.
@@ -472,7 +506,7 @@ class DecoderLayer(hk.Module):
             num_kv_heads=self.num_kv_heads,
             key_size=self.key_size,
             attn_output_multiplier=self.attn_output_multiplier,
-        )(layer_norm(h), mask)
+        )(layer_norm(h), mask, positions, prefix_key, prefix_value)
         h_attn = attn_output.embeddings
 
         h_attn = layer_norm(h_attn)
@@ -494,6 +528,8 @@ class DecoderLayer(hk.Module):
 
         return DecoderOutput(
             embeddings=h,
+            key=attn_output.key,
+            value=attn_output.value,
         )
 
 
@@ -518,6 +554,9 @@ class Transformer(hk.Module):
         embeddings: jax.Array,  # [B, T, D]
         mask: jax.Array,  # [B, T]
         candidate_start_offset: Optional[int] = None,
+        positions: Optional[jax.Array] = None,  # [B, T]
+        prefix_kv: Optional[Sequence[Tuple[jax.Array, jax.Array]]] = None,
+        prefix_mask: Optional[jax.Array] = None,  # [B, P]
     ) -> TransformerOutput:
         """Transforms input embedding sequences to output embedding sequences.
 
@@ -528,9 +567,16 @@ class Transformer(hk.Module):
                 candidates that can only attend to positions before the offset (user+history)
                 and themselves (self-attention), but not to other candidates.
                 Used for recommendation system inference.
+            positions: RoPE positions of the inputs [B, T]; defaults to 0..T-1. Set when
+                the inputs continue a cached prefix.
+            prefix_kv: Per-layer (key, value) of earlier positions, as returned in
+                TransformerOutput.layer_kv. Every input attends to all valid prefix
+                positions, which must precede the inputs causally.
+            prefix_mask: Validity of the prefix positions [B, P]; required with prefix_kv
 
         Returns:
-            TransformerOutput containing the output embeddings.
+            TransformerOutput containing the output embeddings and the per-layer
+            keys and values of the inputs.
         """
 
         fprop_dtype = embeddings.dtype
@@ -550,12 +596,22 @@ class Transformer(hk.Module):
             )  # [B=1, H=1, T, T]
             mask = mask * causal_mask  # [B, H=1, T, T]
 
+        if prefix_kv is not None:
+            if prefix_mask is None:
+                raise ValueError("prefix_mask is required with prefix_kv")
+            prefix_attn_mask = jnp.broadcast_to(
+                prefix_mask[:, None, None, :].astype(mask.dtype),
+                (mask.shape[0], 1, mask.shape[2], prefix_mask.shape[1]),
+            )
+            mask = jnp.concatenate([prefix_attn_mask, mask], axis=-1)  # [B, H=1, T, P + T]
+
         h = embeddings
 
         def block(
             h,
             mask,
             padding_mask,
+            layer_prefix: Tuple[Optional[jax.Array], Optional[jax.Array]] = (None, None),
             layer_index: Optional[int] = None,
             widening_factor: Optional[int] = None,
             name: Optional[str] = None,
@@ -569,18 +625,23 @@ class Transformer(hk.Module):
                 attn_output_multiplier=self.attn_output_multiplier,
                 name=name,
                 layer_index=layer_index,
-            )(h, mask, padding_mask)
+            )(h, mask, padding_mask, positions, *layer_prefix)
 
+        layer_kv = []
         for i in range(self.num_layers):
+            layer_prefix = (None, None) if prefix_kv is None else prefix_kv[i]
             decoder_output = block(
                 h,
                 mask,
                 padding_mask,
+                layer_prefix=layer_prefix,
                 layer_index=i,
                 name=f"decoder_layer_{i}",
             )
             h = decoder_output.embeddings
+            layer_kv.append((decoder_output.key, decoder_output.value))
 
         return TransformerOutput(
             embeddings=h,
+            layer_kv=layer_kv,
         )
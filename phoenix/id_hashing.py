@@ -0,0 +1,200 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from recsys_model import HashConfig, RecsysBatch
+
+logger = logging.getLogger(__name__)
+
+# Raw ID reserved for padding. It always hashes to 0, the padding hash.
+PADDING_ID = 0
+
+# Elements hashed per inner step; keeps the uint64 temporaries cache-resident.
+_CHUNK_SIZE = 1 << 14
+
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _splitmix64(state: int) -> int:
+    """Scalar splitmix64 step, used to derive per-hash constants from a seed."""
+    z = (state + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return z ^ (z >> 31)
+
+
+def _hash_constants(num_hashes: int, seed: int) -> np.ndarray:
+    """Derive independent (multiplier, increment) pairs for each hash function."""
+    constants = np.empty((num_hashes, 2), dtype=np.uint64)
+    state = _splitmix64(seed)
+    for i in range(num_hashes):
+        state = _splitmix64(state)
+        constants[i, 0] = state | 1  # multiplier must be odd
+        state = _splitmix64(state)
+        constants[i, 1] = state
+    return constants
+
+
+def multi_hash(
+    ids: np.ndarray,
+    num_hashes: int,
+    table_size: int,
+    seed: int = 0,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Hash raw int64 IDs into `num_hashes` independent buckets of a table.
+
+    Each ID is first scrambled with the splitmix64 finalizer (seeded), then fed
+    through one multiply-add per hash function. The high 32 bits are mapped onto
+    [1, table_size) with a multiply-shift range reduction, so a valid ID never
+    hashes to the padding row 0. PADDING_ID maps to 0 in every hash slot.
+
+    Args:
+        ids: [...] raw IDs (int64 or uint64)
+        num_hashes: number of hash functions
+        table_size: number of rows in the embedding table, including padding row 0
+        seed: seed selecting the hash family
+        out: optional preallocated [..., num_hashes] int32 output; may be a strided view
+
+    Returns:
+        hashes: [..., num_hashes] int32 in [1, table_size) for valid IDs, 0 for padding
+    """
+    if table_size < 2 or table_size > (1 << 31):
+        raise ValueError(f"table_size must be in [2, 2**31], got {table_size}")
+    ids = np.asarray(ids)
+    if out is None:
+        out = np.empty((*ids.shape, num_hashes), dtype=np.int32)
+    elif out.shape != (*ids.shape, num_hashes) or out.dtype != np.int32:
+        raise ValueError(f"out must be int32 of shape {(*ids.shape, num_hashes)}")
+
+    constants = _hash_constants(num_hashes, seed)
+    num_buckets = np.uint64(table_size - 1)
+    seed_offset = np.uint64((seed * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF)
+    shift_32 = np.uint64(32)
+
+    flat_ids = ids.reshape(-1).astype(np.uint64, copy=False)
+    # Reshaping a strided view (e.g. a slice of a padded batch field) would
+    # copy, so such outputs are filled through a contiguous scratch buffer.
+    target = out if out.flags.c_contiguous else np.empty(out.shape, dtype=np.int32)
+    flat_out = target.reshape(-1, num_hashes)
+    chunk = min(_CHUNK_SIZE, max(1, flat_ids.shape[0]))
+    z = np.empty(chunk, dtype=np.uint64)
+    tmp = np.empty(chunk, dtype=np.uint64)
+    h = np.empty(chunk, dtype=np.uint64)
+
+    with np.errstate(over="ignore"):
+        for start in range(0, flat_ids.shape[0], chunk):
+            x = flat_ids[start : start + chunk]
+            n = x.shape[0]
+            zc, tc, hc = z[:n], tmp[:n], h[:n]
+
+            # splitmix64 finalizer of (id + seed * gamma + gamma)
+            np.add(x, seed_offset, out=zc)
+            np.add(zc, _GOLDEN_GAMMA, out=zc)
+            np.right_shift(zc, np.uint64(30), out=tc)
+            np.bitwise_xor(zc, tc, out=zc)
+            np.multiply(zc, _MIX_1, out=zc)
+            np.right_shift(zc, np.uint64(27), out=tc)
+            np.bitwise_xor(zc, tc, out=zc)
+            np.multiply(zc, _MIX_2, out=zc)
+            np.right_shift(zc, np.uint64(31), out=tc)
+            np.bitwise_xor(zc, tc, out=zc)
+
+            padding = x == PADDING_ID
+            for i in range(num_hashes):
+                np.multiply(zc, constants[i, 0], out=hc)
+                np.add(hc, constants[i, 1], out=hc)
+                np.right_shift(hc, shift_32, out=hc)
+                np.multiply(hc, num_buckets, out=hc)
+                np.right_shift(hc, shift_32, out=hc)
+                np.add(hc, np.uint64(1), out=hc)
+                hc[padding] = 0
+                flat_out[start : start + n, i] = hc
+
+    if target is not out:
+        np.copyto(out, target)
+    return out
+
+
+@dataclass
+class IdHasher:
+    """Maps raw user/post/author IDs to the hash indices declared by HashConfig.
+
+    Each entity type uses its own seeded hash family and table size, so the
+    same raw ID value hashes independently in the user, post and author tables.
+    """
+
+    hash_config: HashConfig
+    num_user_embeddings: int = 100000
+    num_post_embeddings: int = 100000
+    num_author_embeddings: int = 100000
+    seed: int = 0
+
+    def hash_user_ids(self, ids: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Hash user IDs [...] -> [..., num_user_hashes]."""
+        return multi_hash(
+            ids, self.hash_config.num_user_hashes, self.num_user_embeddings, self.seed, out
+        )
+
+    def hash_post_ids(self, ids: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Hash post IDs [...] -> [..., num_item_hashes]."""
+        return multi_hash(
+            ids, self.hash_config.num_item_hashes, self.num_post_embeddings, self.seed + 1, out
+        )
+
+    def hash_author_ids(self, ids: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Hash author IDs [...] -> [..., num_author_hashes]."""
+        return multi_hash(
+            ids, self.hash_config.num_author_hashes, self.num_author_embeddings, self.seed + 2, out
+        )
+
+    def fill_batch_hashes(
+        self,
+        batch: RecsysBatch,
+        user_ids: np.ndarray,
+        history_post_ids: np.ndarray,
+        history_author_ids: np.ndarray,
+        candidate_post_ids: np.ndarray,
+        candidate_author_ids: np.ndarray,
+    ) -> RecsysBatch:
+        """Write the hashes of raw IDs directly into the hash fields of `batch`.
+
+        The hash arrays of `batch` must be writable int32 NumPy arrays of the
+        matching shape (e.g. the buffers returned by RaggedBatchCollator or
+        create_dummy_batch_from_config). Padding positions should carry PADDING_ID.
+
+        Args:
+            batch: RecsysBatch whose hash fields are overwritten in place
+            user_ids: [B]
+            history_post_ids: [B, S]
+            history_author_ids: [B, S]
+            candidate_post_ids: [B, C]
+            candidate_author_ids: [B, C]
+
+        Returns:
+            The same `batch`, for convenience
+        """
+        self.hash_user_ids(user_ids, out=batch.user_hashes)  # type: ignore
+        self.hash_post_ids(history_post_ids, out=batch.history_post_hashes)  # type: ignore
+        self.hash_author_ids(history_author_ids, out=batch.history_author_hashes)  # type: ignore
+        self.hash_post_ids(candidate_post_ids, out=batch.candidate_post_hashes)  # type: ignore
+        self.hash_author_ids(candidate_author_ids, out=batch.candidate_author_hashes)  # type: ignore
+        return batch
@@ -0,0 +1,626 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import dataclasses
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import jax
+import numpy as np
+
+from corpus_index import INVALID_SCORE, CorpusIndex, top_k_by_score
+
+logger = logging.getLogger(__name__)
+
+# segment_top_k(embeddings [capacity, D], top_k, mask [capacity]) -> (indices
+# [B, k], scores [B, k]) for the queries being served, e.g. the applied
+# PhoenixRetrievalModel._retrieve_top_k.
+SegmentTopKFn = Callable[[jax.Array, int, jax.Array], Tuple[jax.Array, jax.Array]]
+
+# Indexed segments fetch top_k * _INDEX_OVERSAMPLE + (excluded rows) results,
+# at most the segment size, before dropping excluded rows.
+_INDEX_OVERSAMPLE = 2
+# Beyond this fraction of excluded rows an indexed segment is scanned exactly
+# with a mask instead, as the oversampled index search would approach a scan.
+_MAX_INDEX_EXCLUDED_FRACTION = 0.5
+
+
+def _capacity_for(num_rows: int, min_capacity: int) -> int:
+    """Power-of-two row capacity, so segment shapes (and compilations) change rarely."""
+    capacity = min_capacity
+    while capacity < num_rows:
+        capacity *= 2
+    return capacity
+
+
+def _embeddings_to_device(embeddings: np.ndarray, capacity: int) -> jax.Array:
+    """Zero-pad rows [n, D] to capacity and copy them to device."""
+    padded = np.zeros((capacity, embeddings.shape[1]), dtype=embeddings.dtype)
+    padded[: embeddings.shape[0]] = embeddings
+    return jax.device_put(padded)
+
+
+def _mask_to_device(deleted: np.ndarray, capacity: int) -> jax.Array:
+    """corpus_mask [capacity] of rows with tombstones [n]; padding rows are masked."""
+    mask = np.zeros(capacity, dtype=bool)
+    mask[: deleted.shape[0]] = ~deleted
+    return jax.device_put(mask)
+
+
+def _make_segment(
+    embeddings: jax.Array,
+    post_ids: np.ndarray,
+    deleted: np.ndarray,
+    created_at: np.ndarray,
+    index: Optional[CorpusIndex] = None,
+) -> "CorpusSegment":
+    """CorpusSegment over device rows [capacity, D] and host columns [size]."""
+    capacity = embeddings.shape[0]
+    min_created_at = int(created_at.min()) if created_at.shape[0] else 0
+    created_offset = np.zeros(capacity, dtype=np.int32)
+    created_offset[: created_at.shape[0]] = created_at - min_created_at
+    return CorpusSegment(
+        embeddings=embeddings,
+        mask=_mask_to_device(deleted, capacity),
+        post_ids=post_ids,
+        deleted=deleted,
+        created_at=created_at,
+        created_offset=jax.device_put(created_offset),
+        min_created_at=min_created_at,
+        max_created_at=int(created_at.max()) if created_at.shape[0] else 0,
+        index=index,
+    )
+
+
+@dataclasses.dataclass(frozen=True)
+class CorpusSegment:
+    """Immutable corpus rows on device.
+
+    mask is the corpus_mask of the segment: False on padding rows beyond size
+    and on tombstoned (deleted) rows. An optional ANN index covers the first
+    size rows; since indexes cannot mask, index searches are oversampled by the
+    number of excluded rows and filtered. Segments with mostly excluded rows
+    are scanned exactly with the mask instead of searching the index.
+
+    Creation times (seconds) are kept on device as int32 offsets from
+    min_created_at, so age windows are applied by extending the mask.
+    """
+
+    embeddings: jax.Array  # [capacity, D]
+    mask: jax.Array  # [capacity]
+    post_ids: np.ndarray  # [size]
+    deleted: np.ndarray  # [size] tombstones
+    created_at: np.ndarray  # [size]
+    created_offset: jax.Array  # [capacity] created_at - min_created_at
+    min_created_at: int
+    max_created_at: int
+    index: Optional[CorpusIndex] = None
+
+    @property
+    def size(self) -> int:
+        return self.post_ids.shape[0]
+
+    @property
+    def num_deleted(self) -> int:
+        return int(self.deleted.sum())
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        segment_top_k: SegmentTopKFn,
+        min_created_at: Optional[int] = None,
+        **index_params,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k live rows of the segment [B, K], padded with -1 / INVALID_SCORE.
+
+        Rows created before min_created_at are excluded; the segment is not
+        scored at all when it lies entirely outside the window.
+        """
+        if self.size == 0 or (min_created_at is not None and self.max_created_at < min_created_at):
+            empty = np.zeros((queries.shape[0], 0), dtype=np.float32)
+            return top_k_by_score(empty, top_k)
+        partial = min_created_at is not None and self.min_created_at < min_created_at
+        excluded = self.deleted
+        if partial:
+            excluded = excluded | (self.created_at < min_created_at)
+        num_excluded = int(excluded.sum())
+
+        if self.index is None or num_excluded > _MAX_INDEX_EXCLUDED_FRACTION * self.size:
+            mask = self.mask
+            if partial:
+                mask = mask & (self.created_offset >= min_created_at - self.min_created_at)
+            indices, scores = segment_top_k(
+                self.embeddings, min(top_k, self.embeddings.shape[0]), mask
+            )
+            indices, scores = np.asarray(indices), np.asarray(scores, dtype=np.float32)
+            # Masked rows score -INF (== INVALID_SCORE).
+            live = scores > INVALID_SCORE / 2
+        else:
+            oversampled = min(top_k * _INDEX_OVERSAMPLE + num_excluded, self.size)
+            indices, scores = self.index.search(queries, oversampled, **index_params)
+            live = (indices >= 0) & ~excluded[np.maximum(indices, 0)]
+        scores = np.where(live, scores, INVALID_SCORE)
+        top, top_scores = top_k_by_score(scores, top_k)
+        valid = (top >= 0) & (top_scores > INVALID_SCORE)
+        top_indices = np.take_along_axis(indices, np.maximum(top, 0), axis=1)
+        return np.where(valid, top_indices, -1), np.where(valid, top_scores, INVALID_SCORE)
+
+
+@dataclasses.dataclass(frozen=True)
+class CorpusSnapshot:
+    """A consistent, immutable view of a MutableCorpus.
+
+    Later appends, deletes and compactions publish new snapshots and never
+    change this one, so a retrieval request reads a single corpus version.
+    Results index the concatenation of the segments' rows, which is only
+    meaningful within the snapshot; post IDs are the stable identifiers.
+    """
+
+    segments: Tuple[CorpusSegment, ...]
+    version: int
+
+    @property
+    def size(self) -> int:
+        return sum(segment.size for segment in self.segments)
+
+    @property
+    def num_live(self) -> int:
+        return sum(segment.size - segment.num_deleted for segment in self.segments)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        segment_top_k: SegmentTopKFn,
+        min_created_at: Optional[int] = None,
+        **index_params,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Top-k live corpus entries across all segments.
+
+        Args:
+            queries: [B, D] user representations
+            top_k: Number of candidates to retrieve
+            segment_top_k: brute-force top-k of the queries against one segment
+            min_created_at: optional creation time (seconds) of the oldest
+                eligible post; older segments are skipped, straddling ones masked
+            index_params: search parameters of the segments' ANN indexes
+
+        Returns:
+            top_k_indices [B, K], top_k_scores [B, K] and top_k_post_ids [B, K],
+            padded with -1 / INVALID_SCORE / -1
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        all_indices, all_scores, all_post_ids = [], [], []
+        offset = 0
+        for segment in self.segments:
+            indices, scores = segment.search(
+                queries, top_k, segment_top_k, min_created_at, **index_params
+            )
+            valid = indices >= 0
+            all_indices.append(np.where(valid, indices + offset, -1))
+            all_scores.append(scores)
+            all_post_ids.append(np.where(valid, segment.post_ids[np.maximum(indices, 0)], -1))
+            offset += segment.size
+
+        if not all_scores:
+            empty = np.zeros((queries.shape[0], 0), dtype=np.float32)
+            indices, scores = top_k_by_score(empty, top_k)
+            return indices, scores, indices.copy()
+        scores = np.concatenate(all_scores, axis=1)
+        top, top_scores = top_k_by_score(scores, top_k)
+        valid = (top >= 0) & (top_scores > INVALID_SCORE)
+        top = np.maximum(top, 0)
+        top_indices = np.take_along_axis(np.concatenate(all_indices, axis=1), top, axis=1)
+        top_post_ids = np.take_along_axis(np.concatenate(all_post_ids, axis=1), top, axis=1)
+        return (
+            np.where(valid, top_indices, -1),
+            np.where(valid, top_scores, INVALID_SCORE),
+            np.where(valid, top_post_ids, -1),
+        )
+
+
+class MutableCorpus:
+    """Corpus of post embeddings that supports appends and deletes while serving.
+
+    The corpus is a dense base segment, sorted by post ID and optionally
+    indexed, plus an append-only segment that new posts are written to. Deletes
+    set bits in per-segment tombstone bitmaps, which become the segments'
+    corpus_mask. Writes are visible to the next snapshot(): only the segment
+    that changed is copied to device again, and the append segment is kept
+    small by compaction.
+
+    Compaction folds the append segment into a new base segment without the
+    tombstoned rows and rebuilds the ANN index. It runs outside the write lock,
+    on a background thread once the append segment or the deleted fraction
+    passes its threshold, and swaps the new base in atomically; writes made
+    while it ran are carried over.
+
+    Args:
+        dim: embedding dimension D
+        index_builder: optional function building an ANN index over the base
+            segment rows, e.g. functools.partial(HNSWIndex.build, max_neighbors=16)
+        max_append_rows: append segment size that triggers compaction
+        max_deleted_fraction: fraction of tombstoned rows that triggers compaction
+        auto_compact: compact in the background when a threshold is passed
+        min_capacity: minimum device row capacity of a segment
+        clock: current time in seconds; default creation time of appended posts
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        index_builder: Optional[Callable[[np.ndarray], CorpusIndex]] = None,
+        max_append_rows: int = 65536,
+        max_deleted_fraction: float = 0.1,
+        auto_compact: bool = True,
+        min_capacity: int = 1024,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.dim = dim
+        self.clock = clock
+        self.index_builder = index_builder
+        self.max_append_rows = max_append_rows
+        self.max_deleted_fraction = max_deleted_fraction
+        self.auto_compact = auto_compact
+        self.min_capacity = min_capacity
+
+        self._lock = threading.Lock()
+        self._compaction_lock = threading.Lock()
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._version = 0
+
+        self._base: Optional[CorpusSegment] = None
+        self._base_post_ids = np.zeros(0, dtype=np.int64)
+        self._base_deleted = np.zeros(0, dtype=bool)
+        self._base_dirty = False
+
+        self._append_embeddings = np.zeros((min_capacity, dim), dtype=np.float32)
+        self._append_post_ids = np.zeros(min_capacity, dtype=np.int64)
+        self._append_deleted = np.zeros(min_capacity, dtype=bool)
+        self._append_created_at = np.zeros(min_capacity, dtype=np.int64)
+        self._append_size = 0
+        self._append_rows: Dict[int, int] = {}
+        self._append_segment: Optional[CorpusSegment] = None
+
+        self._snapshot: Optional[CorpusSnapshot] = None
+
+    @property
+    def num_appended(self) -> int:
+        """Rows in the append segment, including tombstoned ones."""
+        return self._append_size
+
+    @property
+    def num_deleted(self) -> int:
+        """Tombstoned rows not yet removed by compaction."""
+        return int(self._base_deleted.sum() + self._append_deleted[: self._append_size].sum())
+
+    def _delete_locked(self, post_ids: np.ndarray) -> int:
+        num_deleted = 0
+        if self._base_post_ids.shape[0]:
+            rows = np.searchsorted(self._base_post_ids, post_ids)
+            found = rows < self._base_post_ids.shape[0]
+            rows = rows[found]
+            rows = rows[self._base_post_ids[rows] == post_ids[found]]
+            rows = rows[~self._base_deleted[rows]]
+            self._base_deleted[rows] = True
+            self._base_dirty |= rows.shape[0] > 0
+            num_deleted += rows.shape[0]
+        for post_id in post_ids.tolist():
+            row = self._append_rows.pop(post_id, None)
+            if row is not None:
+                self._append_deleted[row] = True
+                self._append_segment = None
+                num_deleted += 1
+        return num_deleted
+
+    def append(
+        self,
+        embeddings: np.ndarray,
+        post_ids: np.ndarray,
+        created_at: Optional[np.ndarray] = None,
+    ):
+        """Add new posts [n, D] with IDs [n]; existing IDs are replaced.
+
+        created_at [n] are the posts' creation times in seconds (default: now).
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        post_ids = np.asarray(post_ids, dtype=np.int64)
+        if created_at is None:
+            created_at = np.full(post_ids.shape[0], int(self.clock()), dtype=np.int64)
+        created_at = np.broadcast_to(np.asarray(created_at, dtype=np.int64), post_ids.shape)
+        if embeddings.shape != (post_ids.shape[0], self.dim):
+            raise ValueError(
+                f"Expected embeddings of shape {(post_ids.shape[0], self.dim)}, "
+                f"got {embeddings.shape}"
+            )
+        if np.unique(post_ids).shape[0] != post_ids.shape[0]:
+            raise ValueError("Duplicate post IDs in one append")
+
+        with self._lock:
+            self._delete_locked(post_ids)
+            start, end = self._append_size, self._append_size + post_ids.shape[0]
+            if end > self._append_post_ids.shape[0]:
+                # Reallocate instead of resizing in place: published snapshots
+                # keep views of the old buffers.
+                capacity = _capacity_for(end, self.min_capacity)
+                self._append_embeddings = np.resize(self._append_embeddings, (capacity, self.dim))
+                self._append_post_ids = np.resize(self._append_post_ids, capacity)
+                self._append_deleted = np.resize(self._append_deleted, capacity)
+                self._append_created_at = np.resize(self._append_created_at, capacity)
+            self._append_embeddings[start:end] = embeddings
+            self._append_post_ids[start:end] = post_ids
+            self._append_deleted[start:end] = False
+            self._append_created_at[start:end] = created_at
+            self._append_rows.update(zip(post_ids.tolist(), range(start, end)))
+            self._append_size = end
+            self._append_segment = None
+            self._snapshot = None
+            self._version += 1
+        self._maybe_compact()
+
+    def delete(self, post_ids: np.ndarray) -> int:
+        """Tombstone posts by ID; returns the number of rows deleted."""
+        with self._lock:
+            num_deleted = self._delete_locked(np.asarray(post_ids, dtype=np.int64))
+            if num_deleted:
+                self._snapshot = None
+                self._version += 1
+        self._maybe_compact()
+        return num_deleted
+
+    def snapshot(self) -> CorpusSnapshot:
+        """The current corpus version; re-copies only segments changed since the last one."""
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            if self._base is not None and self._base_dirty:
+                self._base = dataclasses.replace(
+                    self._base,
+                    mask=_mask_to_device(self._base_deleted, self._base.embeddings.shape[0]),
+                    deleted=self._base_deleted.copy(),
+                )
+                self._base_dirty = False
+            if self._append_segment is None and self._append_size:
+                size = self._append_size
+                capacity = _capacity_for(size, self.min_capacity)
+                self._append_segment = _make_segment(
+                    _embeddings_to_device(self._append_embeddings[:size], capacity),
+                    self._append_post_ids[:size],
+                    self._append_deleted[:size].copy(),
+                    self._append_created_at[:size],
+                )
+            segments = tuple(s for s in (self._base, self._append_segment) if s is not None)
+            self._snapshot = CorpusSnapshot(segments=segments, version=self._version)
+            return self._snapshot
+
+    def _maybe_compact(self):
+        if not self.auto_compact:
+            return
+        total = self._base_post_ids.shape[0] + self._append_size
+        if self._append_size >= self.max_append_rows or (
+            total and self.num_deleted >= self.max_deleted_fraction * total
+        ):
+            self.compact_in_background()
+
+    def compact_in_background(self) -> threading.Thread:
+        """Start a compaction thread unless one is running; returns the running thread."""
+        with self._lock:
+            thread = self._compaction_thread
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(
+                    target=self.compact, name="corpus-compaction", daemon=True
+                )
+                self._compaction_thread = thread
+                thread.start()
+            return thread
+
+    def compact(self):
+        """Rebuild the base segment from all live rows and swap it in."""
+        with self._compaction_lock:
+            start_time = time.perf_counter()
+            with self._lock:
+                base = self._base
+                base_deleted = self._base_deleted.copy()
+                num_appended = self._append_size
+                append_embeddings = self._append_embeddings[:num_appended]
+                append_post_ids = self._append_post_ids[:num_appended]
+                append_deleted = self._append_deleted[:num_appended].copy()
+                append_created_at = self._append_created_at[:num_appended]
+
+            # Build the new base segment without holding the lock.
+            if base is None:
+                base_embeddings = np.zeros((0, self.dim), dtype=np.float32)
+                base_post_ids = np.zeros(0, dtype=np.int64)
+                base_created_at = np.zeros(0, dtype=np.int64)
+            else:
+                base_embeddings = np.asarray(base.embeddings[: base.size])
+                base_post_ids = base.post_ids
+                base_created_at = base.created_at
+            post_ids = np.concatenate([base_post_ids, append_post_ids])
+            live_rows = np.flatnonzero(~np.concatenate([base_deleted, append_deleted]))
+            rows = live_rows[np.argsort(post_ids[live_rows], kind="stable")]
+            # The base and the compacted append rows are indexed as one array.
+            num_base = base_post_ids.shape[0]
+            from_base = rows < num_base
+            embeddings = np.empty((rows.shape[0], self.dim), dtype=np.float32)
+            embeddings[from_base] = base_embeddings[rows[from_base]]
+            embeddings[~from_base] = append_embeddings[rows[~from_base] - num_base]
+            new_post_ids = post_ids[rows]
+            new_created_at = np.concatenate([base_created_at, append_created_at])[rows]
+            index = self.index_builder(embeddings) if self.index_builder else None
+            capacity = _capacity_for(rows.shape[0], self.min_capacity)
+            device_embeddings = _embeddings_to_device(embeddings, capacity)
+
+            with self._lock:
+                # Carry over deletes and appends made during the build.
+                deleted_now = np.concatenate(
+                    [self._base_deleted, self._append_deleted[:num_appended]]
+                )
+                new_deleted = deleted_now[rows]
+                tail = slice(num_appended, self._append_size)
+                tail_embeddings = self._append_embeddings[tail]
+                tail_post_ids = self._append_post_ids[tail]
+                tail_deleted = self._append_deleted[tail]
+                tail_created_at = self._append_created_at[tail]
+
+                self._base_post_ids = new_post_ids
+                self._base_deleted = new_deleted
+                self._base = _make_segment(
+                    device_embeddings, new_post_ids, new_deleted.copy(), new_created_at, index
+                )
+                self._base_dirty = False
+
+                capacity = _capacity_for(tail_post_ids.shape[0], self.min_capacity)
+                self._append_embeddings = np.zeros((capacity, self.dim), dtype=np.float32)
+                self._append_post_ids = np.zeros(capacity, dtype=np.int64)
+                self._append_deleted = np.zeros(capacity, dtype=bool)
+                self._append_created_at = np.zeros(capacity, dtype=np.int64)
+                self._append_size = tail_post_ids.shape[0]
+                self._append_embeddings[: self._append_size] = tail_embeddings
+                self._append_post_ids[: self._append_size] = tail_post_ids
+                self._append_deleted[: self._append_size] = tail_deleted
+                self._append_created_at[: self._append_size] = tail_created_at
+                self._append_rows = {
+                    post_id: row
+                    for row, post_id in enumerate(tail_post_ids.tolist())
+                    if not tail_deleted[row]
+                }
+                self._append_segment = None
+                self._snapshot = None
+                self._version += 1
+
+            logger.info(
+                f"Compacted corpus to {rows.shape[0]} rows ({num_appended} appended, "
+                f"{post_ids.shape[0] - rows.shape[0]} deleted) "
+                f"in {time.perf_counter() - start_time:.2f}s"
+            )
+
+
+class TimePartitionedCorpus:
+    """Corpus partitioned into MutableCorpus segments by post creation time.
+
+    Posts are appended to the partition of their creation time bucket
+    (partition_seconds wide, e.g. hourly or daily), so snapshot segments have
+    narrow [min_created_at, max_created_at] ranges: an age-filtered search
+    skips whole partitions outside the window and masks only the one
+    straddling its start. Partitions older than retention_seconds are dropped
+    on the next write or snapshot; snapshots taken before keep them alive.
+
+    Writes and snapshot() hold one lock across all partitions, so replacing a
+    post that moves to another partition (tombstone in the old one, new row in
+    the new one) is published as a single snapshot change.
+
+    Args:
+        dim: embedding dimension D
+        partition_seconds: width of a creation time partition
+        retention_seconds: optional age after which partitions are dropped
+        clock: current time in seconds
+        corpus_kwargs: MutableCorpus arguments of each partition
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        partition_seconds: int = 3600,
+        retention_seconds: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+        **corpus_kwargs,
+    ):
+        self.dim = dim
+        self.partition_seconds = partition_seconds
+        self.retention_seconds = retention_seconds
+        self.clock = clock
+        self.corpus_kwargs = corpus_kwargs
+
+        self._lock = threading.Lock()
+        self._partitions: Dict[int, MutableCorpus] = {}
+        self._version = 0
+
+    @property
+    def partitions(self) -> Dict[int, MutableCorpus]:
+        """Live partitions by creation time bucket (created_at // partition_seconds)."""
+        with self._lock:
+            return dict(self._partitions)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop partitions whose posts are all older than retention_seconds."""
+        if self.retention_seconds is None:
+            return 0
+        # A partition ends at (bucket + 1) * partition_seconds.
+        oldest = (now if now is not None else self.clock()) - self.retention_seconds
+        with self._lock:
+            expired = [
+                bucket
+                for bucket in self._partitions
+                if (bucket + 1) * self.partition_seconds <= oldest
+            ]
+            for bucket in expired:
+                del self._partitions[bucket]
+            self._version += len(expired)
+        if expired:
+            logger.info(f"Dropped {len(expired)} expired corpus partitions")
+        return len(expired)
+
+    def append(
+        self,
+        embeddings: np.ndarray,
+        post_ids: np.ndarray,
+        created_at: Optional[np.ndarray] = None,
+    ):
+        """Add new posts [n, D] with IDs and creation times [n]; existing IDs are replaced."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        post_ids = np.asarray(post_ids, dtype=np.int64)
+        if created_at is None:
+            created_at = np.full(post_ids.shape[0], int(self.clock()), dtype=np.int64)
+        created_at = np.broadcast_to(np.asarray(created_at, dtype=np.int64), post_ids.shape)
+
+        self.expire()
+        buckets = created_at // self.partition_seconds
+        with self._lock:
+            # A replaced post may live in another partition; no snapshot sees
+            # it deleted there before it is appended to its new partition.
+            self._delete_locked(post_ids)
+            for bucket in np.unique(buckets).tolist():
+                rows = buckets == bucket
+                partition = self._partitions.get(bucket)
+                if partition is None:
+                    partition = MutableCorpus(self.dim, clock=self.clock, **self.corpus_kwargs)
+                    self._partitions[bucket] = partition
+                partition.append(embeddings[rows], post_ids[rows], created_at[rows])
+            self._version += 1
+
+    def _delete_locked(self, post_ids: np.ndarray) -> int:
+        return sum(partition.delete(post_ids) for partition in self._partitions.values())
+
+    def delete(self, post_ids: np.ndarray) -> int:
+        """Tombstone posts by ID; returns the number of rows deleted."""
+        post_ids = np.asarray(post_ids, dtype=np.int64)
+        with self._lock:
+            num_deleted = self._delete_locked(post_ids)
+            self._version += 1
+        return num_deleted
+
+    def snapshot(self) -> CorpusSnapshot:
+        """Segments of all live partitions, oldest first."""
+        self.expire()
+        with self._lock:
+            segments = tuple(
+                segment
+                for _, partition in sorted(self._partitions.items())
+                for segment in partition.snapshot().segments
+            )
+            return CorpusSnapshot(segments=segments, version=self._version)
@@ -0,0 +1,323 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from recsys_model import PrefixExtendOutput, RecsysBatch
+from recsys_retrieval_model import UserExtendOutput
+
+logger = logging.getLogger(__name__)
+
+HIT = "hit"
+PARTIAL_HIT = "partial_hit"
+MISS = "miss"
+
+
+@dataclass
+class PrefixCacheStats:
+    """Running counters for a PrefixCache.
+
+    reused_positions / computed_positions count user+history sequence positions
+    served from the cache vs. run through the transformer.
+    """
+
+    hits: int = 0
+    partial_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    reused_positions: int = 0
+    computed_positions: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.partial_hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    @property
+    def partial_hit_rate(self) -> float:
+        return self.partial_hits / self.lookups if self.lookups else 0.0
+
+    @property
+    def miss_rate(self) -> float:
+        return self.misses / self.lookups if self.lookups else 0.0
+
+    def reset(self):
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reused_positions = 0
+        self.computed_positions = 0
+
+
+@dataclass
+class _PrefixEntry:
+    """Cached keys/values of one user's first 1 + history_len sequence positions."""
+
+    history_len: int
+    fingerprint: bytes
+    keys: np.ndarray  # [L, 1 + history_len, num_kv_heads, key_size]
+    values: np.ndarray  # [L, 1 + history_len, num_kv_heads, key_size]
+    mask: np.ndarray  # [1 + history_len] bool
+    # Retrieval user tower only: sum of the outputs over the valid cached positions.
+    output_sum: Optional[np.ndarray] = None  # [D] float32
+
+    @property
+    def output_count(self) -> int:
+        return int(self.mask.sum())
+
+    @property
+    def nbytes(self) -> int:
+        nbytes = self.keys.nbytes + self.values.nbytes + self.mask.nbytes
+        if self.output_sum is not None:
+            nbytes += self.output_sum.nbytes
+        return nbytes
+
+
+class PrefixPlan(NamedTuple):
+    """Per-batch cache lookup result, produced by PrefixCache.prepare.
+
+    prefix_kv / prefix_mask / prefix_len / num_new are the arguments of
+    PhoenixModel.extend, plus prefix_output_sum for
+    PhoenixRetrievalModel.extend_user_representation; the remaining fields are
+    used by PrefixCache.update.
+    """
+
+    prefix_kv: Optional[List[Tuple[np.ndarray, np.ndarray]]]
+    prefix_mask: Optional[np.ndarray]  # [B, P]
+    prefix_len: np.ndarray  # [B]
+    num_new: int
+    prefix_output_sum: Optional[np.ndarray]  # [B, D]
+    user_keys: List[Optional[bytes]]
+    history_ends: np.ndarray  # [B]
+    entries: List[Optional[_PrefixEntry]]
+    outcomes: List[str]
+
+
+def history_ends(batch: RecsysBatch) -> np.ndarray:
+    """Number of history positions up to and including each user's last valid event [B]."""
+    valid = np.asarray(batch.history_post_hashes)[:, :, 0] != 0
+    S = valid.shape[1]
+    return np.where(valid.any(axis=1), S - np.argmax(valid[:, ::-1], axis=1), 0)
+
+
+def history_fingerprint(batch: RecsysBatch, index: int, history_len: int) -> bytes:
+    """Fingerprint of the first `history_len` history events of batch row `index`."""
+    digest = hashlib.blake2b(digest_size=16)
+    for field in (
+        batch.history_post_hashes,
+        batch.history_author_hashes,
+        batch.history_actions,
+        batch.history_product_surface,
+    ):
+        digest.update(np.ascontiguousarray(np.asarray(field)[index, :history_len]).tobytes())
+    return digest.digest()
+
+
+class PrefixCache:
+    """Bounded cross-request cache of per-user user+history keys/values.
+
+    The user+history block is causal, so appending engagement events leaves the
+    keys/values of earlier positions unchanged. For each user (keyed by the
+    user hashes) the cache keeps every layer's keys/values of the user token and
+    the history up to the last valid event, plus a fingerprint of that history.
+    A later request whose history starts with the cached events reuses them and
+    only the new events and the candidates are run through the transformer
+    (PhoenixModel.extend). For the retrieval user tower the entries also carry
+    the running sum of the pooled outputs, so user representations are updated
+    without re-encoding the history
+    (PhoenixRetrievalModel.extend_user_representation).
+
+    - hit: history unchanged; only candidates are computed
+    - partial hit: k new events appended; k positions are computed and appended
+    - miss: no entry, or the history no longer starts with the cached events
+      (e.g. the oldest events were dropped from a full window)
+
+    Entries are evicted least-recently-used first to keep the total size of the
+    cached arrays under `max_bytes`. Entries depend on the model parameters and
+    embedding tables: call `clear()` whenever either changes, and do not share
+    one cache between models.
+
+    Args:
+        max_bytes: memory budget for cached keys/values
+        bucket_size: the number of newly computed positions and the width of
+            the cached prefix are rounded up to multiples of this, bounding the
+            number of distinct shapes (and compilations) of the extend step
+    """
+
+    def __init__(self, max_bytes: int, bucket_size: int = 16):
+        if bucket_size < 1:
+            raise ValueError(f"bucket_size must be positive, got {bucket_size}")
+        self.max_bytes = max_bytes
+        self.bucket_size = bucket_size
+        self.stats = PrefixCacheStats()
+        self._entries: "OrderedDict[bytes, _PrefixEntry]" = OrderedDict()
+        self._bytes_used = 0
+        self._lock = threading.Lock()
+
+    @property
+    def bytes_used(self) -> int:
+        return self._bytes_used
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes_used = 0
+
+    def prepare(self, batch: RecsysBatch) -> PrefixPlan:
+        """Look up cached prefixes for every user in `batch`."""
+        user_hashes = np.asarray(batch.user_hashes)
+        B, S = np.asarray(batch.history_post_hashes).shape[:2]
+        ends = history_ends(batch)
+        prefix_len = np.zeros(B, dtype=np.int32)
+        user_keys: List[Optional[bytes]] = []
+        entries: List[Optional[_PrefixEntry]] = []
+        outcomes: List[str] = []
+
+        with self._lock:
+            for b in range(B):
+                # Padding rows (user hash 0) are never cached.
+                key = user_hashes[b].tobytes() if user_hashes[b, 0] != 0 else None
+                entry = self._entries.get(key) if key is not None else None
+                if entry is not None and (
+                    entry.history_len > ends[b]
+                    or entry.fingerprint != history_fingerprint(batch, b, entry.history_len)
+                ):
+                    entry = None
+
+                if entry is None:
+                    outcomes.append(MISS)
+                    self.stats.misses += 1
+                else:
+                    self._entries.move_to_end(key)  # type: ignore
+                    prefix_len[b] = 1 + entry.history_len
+                    if entry.history_len == ends[b]:
+                        outcomes.append(HIT)
+                        self.stats.hits += 1
+                    else:
+                        outcomes.append(PARTIAL_HIT)
+                        self.stats.partial_hits += 1
+                user_keys.append(key)
+                entries.append(entry)
+
+            num_new_per_user = 1 + ends - prefix_len
+            self.stats.reused_positions += int(prefix_len.sum())
+            self.stats.computed_positions += int(num_new_per_user.sum())
+
+        max_new = int(num_new_per_user.max()) if B else 0
+        num_new = min(-(-max_new // self.bucket_size) * self.bucket_size, 1 + S)
+
+        prefix_kv, prefix_mask, prefix_output_sum = None, None, None
+        P = int(prefix_len.max()) if B else 0
+        if P > 0:
+            # Extra prefix slots are masked out.
+            P = min(-(-P // self.bucket_size) * self.bucket_size, 1 + S)
+            template = next(entry for entry in entries if entry is not None)
+            L, _, num_kv_heads, key_size = template.keys.shape
+            keys = np.zeros((L, B, P, num_kv_heads, key_size), dtype=template.keys.dtype)
+            values = np.zeros((L, B, P, num_kv_heads, key_size), dtype=template.values.dtype)
+            prefix_mask = np.zeros((B, P), dtype=bool)
+            if template.output_sum is not None:
+                prefix_output_sum = np.zeros((B,) + template.output_sum.shape, dtype=np.float32)
+            for b, entry in enumerate(entries):
+                if entry is None:
+                    continue
+                n = entry.keys.shape[1]
+                keys[:, b, :n] = entry.keys
+                values[:, b, :n] = entry.values
+                prefix_mask[b, :n] = entry.mask
+                if prefix_output_sum is not None:
+                    prefix_output_sum[b] = entry.output_sum
+            prefix_kv = [(keys[layer], values[layer]) for layer in range(L)]
+
+        return PrefixPlan(
+            prefix_kv=prefix_kv,
+            prefix_mask=prefix_mask,
+            prefix_len=prefix_len,
+            num_new=num_new,
+            prefix_output_sum=prefix_output_sum,
+            user_keys=user_keys,
+            history_ends=ends,
+            entries=entries,
+            outcomes=outcomes,
+        )
+
+    def update(
+        self,
+        batch: RecsysBatch,
+        plan: PrefixPlan,
+        output: Union[PrefixExtendOutput, UserExtendOutput],
+    ):
+        """Store the extended prefixes computed by PhoenixModel.extend or
+        PhoenixRetrievalModel.extend_user_representation."""
+        if plan.num_new == 0:
+            return
+        new_keys = np.stack([np.asarray(k) for k, _ in output.layer_kv])  # [L, B, K, h, d]
+        new_values = np.stack([np.asarray(v) for _, v in output.layer_kv])
+        new_mask = np.asarray(output.new_mask)
+        output_sum = None
+        if isinstance(output, UserExtendOutput):
+            output_sum = np.asarray(output.output_sum, dtype=np.float32)
+
+        with self._lock:
+            for b, key in enumerate(plan.user_keys):
+                num_new = int(1 + plan.history_ends[b] - plan.prefix_len[b])
+                if key is None or num_new == 0:
+                    continue
+                keys = new_keys[:, b, :num_new]
+                values = new_values[:, b, :num_new]
+                mask = new_mask[b, :num_new]
+                previous = plan.entries[b]
+                if previous is not None:
+                    keys = np.concatenate([previous.keys, keys], axis=1)
+                    values = np.concatenate([previous.values, values], axis=1)
+                    mask = np.concatenate([previous.mask, mask])
+                history_len = int(plan.history_ends[b])
+                self._put(
+                    key,
+                    _PrefixEntry(
+                        history_len=history_len,
+                        fingerprint=history_fingerprint(batch, b, history_len),
+                        keys=np.ascontiguousarray(keys),
+                        values=np.ascontiguousarray(values),
+                        mask=np.ascontiguousarray(mask),
+                        output_sum=None if output_sum is None else output_sum[b].copy(),
+                    ),
+                )
+
+    def _put(self, key: bytes, entry: _PrefixEntry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes_used -= old.nbytes
+        if entry.nbytes > self.max_bytes:
+            return
+        while self._entries and self._bytes_used + entry.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes_used -= evicted.nbytes
+            self.stats.evictions += 1
+        self._entries[key] = entry
+        self._bytes_used += entry.nbytes
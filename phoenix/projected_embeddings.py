@@ -0,0 +1,373 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import haiku as hk
+import numpy as np
+
+from embedding_store import (
+    AUTHOR_TABLE,
+    POST_TABLE,
+    EmbeddingTable,
+    EmbeddingTableStore,
+)
+from id_hashing import PADDING_ID
+from recsys_model import HashConfig, ProjectedRecsysEmbeddings, RecsysBatch
+
+logger = logging.getLogger(__name__)
+
+_IDS_SUFFIX = ".ids.npy"
+_HISTORY_SUFFIX = ".history.npy"
+_CANDIDATE_SUFFIX = ".candidate.npy"
+
+
+@dataclass
+class ProjectionWeights:
+    """Post and author row blocks of proj_mat_3 (history) and proj_mat_2 (candidates).
+
+    The candidate blocks are None for models without a candidate reduce
+    (e.g. the retrieval model, whose candidate tower is nonlinear).
+    """
+
+    history_post: np.ndarray  # [num_item_hashes * D, D]
+    history_author: np.ndarray  # [num_author_hashes * D, D]
+    candidate_post: Optional[np.ndarray] = None
+    candidate_author: Optional[np.ndarray] = None
+
+    @staticmethod
+    def from_params(params: hk.Params, hash_config: HashConfig) -> "ProjectionWeights":
+        """Slice the projection row blocks out of ranking or retrieval model params."""
+        module_params = next(
+            (module for module in params.values() if "proj_mat_3" in module), None
+        )
+        if module_params is None:
+            raise ValueError("params do not contain proj_mat_3")
+
+        def blocks(proj_mat) -> tuple:
+            proj_mat = np.asarray(proj_mat, dtype=np.float32)
+            D = proj_mat.shape[1]
+            post_rows = hash_config.num_item_hashes * D
+            author_rows = hash_config.num_author_hashes * D
+            return proj_mat[:post_rows], proj_mat[post_rows : post_rows + author_rows]
+
+        history_post, history_author = blocks(module_params["proj_mat_3"])
+        candidate_post, candidate_author = None, None
+        if "proj_mat_2" in module_params:
+            candidate_post, candidate_author = blocks(module_params["proj_mat_2"])
+        return ProjectionWeights(history_post, history_author, candidate_post, candidate_author)
+
+
+def project_embeddings(embeddings: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Project hash embeddings [..., H, D] through a row block [H * D, D] to [..., D]."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    flat = embeddings.reshape((*embeddings.shape[:-2], -1))
+    return flat @ weights
+
+
+class ProjectedEntityTable:
+    """Precomputed projected embeddings for a fixed vocabulary of entity IDs.
+
+    Stored as `<name>.ids.npy` (sorted int64 IDs), `<name>.history.npy` and,
+    optionally, `<name>.candidate.npy` ([N, D] float32), all memory-mapped.
+    """
+
+    def __init__(self, path_prefix: str):
+        self.path_prefix = path_prefix
+        self.ids = np.load(path_prefix + _IDS_SUFFIX, mmap_mode="r")
+        self.history = np.load(path_prefix + _HISTORY_SUFFIX, mmap_mode="r")
+        self.candidate = None
+        if os.path.exists(path_prefix + _CANDIDATE_SUFFIX):
+            self.candidate = np.load(path_prefix + _CANDIDATE_SUFFIX, mmap_mode="r")
+
+    @property
+    def num_entities(self) -> int:
+        return self.ids.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.history.shape[1]
+
+    def find(self, ids: np.ndarray):
+        """Return (rows, found) for `ids`; rows are only meaningful where found."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.num_entities == 0:
+            return np.zeros(ids.shape, dtype=np.int64), np.zeros(ids.shape, dtype=bool)
+        rows = np.minimum(np.searchsorted(self.ids, ids), self.num_entities - 1)
+        return rows, self.ids[rows] == ids
+
+
+def build_projected_table(
+    directory: str,
+    name: str,
+    ids: np.ndarray,
+    hashes: np.ndarray,
+    store: EmbeddingTableStore,
+    table: EmbeddingTable,
+    history_weights: np.ndarray,
+    candidate_weights: Optional[np.ndarray] = None,
+    chunk_rows: int = 1 << 16,
+) -> ProjectedEntityTable:
+    """Offline job: materialize projected embeddings for a vocabulary of entities.
+
+    Must be rerun whenever the model's projection weights or hash tables change.
+
+    Args:
+        directory: output directory
+        name: table name, e.g. "post"
+        ids: [N] unique raw entity IDs (PADDING_ID is not allowed)
+        hashes: [N, H] hashes of each entity into `table`
+        store: store used to gather the hash embeddings
+        table: hash-embedding table of this entity type
+        history_weights: [H * D, D] row block of proj_mat_3
+        candidate_weights: [H * D, D] row block of proj_mat_2, if the model has one
+        chunk_rows: entities projected per step, bounding memory use
+
+    Returns:
+        The written table, opened for reading
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if np.any(ids == PADDING_ID):
+        raise ValueError(f"Entity IDs must not contain the padding ID {PADDING_ID}")
+    order = np.argsort(ids, kind="stable")
+    ids = ids[order]
+    if np.any(ids[1:] == ids[:-1]):
+        raise ValueError("Entity IDs must be unique")
+    hashes = np.asarray(hashes)[order]
+
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, name)
+    np.save(prefix + _IDS_SUFFIX, ids)
+
+    num_entities, D = ids.shape[0], history_weights.shape[1]
+    outputs = [(history_weights, _HISTORY_SUFFIX)]
+    if candidate_weights is not None:
+        outputs.append((candidate_weights, _CANDIDATE_SUFFIX))
+    files = [
+        np.lib.format.open_memmap(
+            prefix + suffix, mode="w+", dtype=np.float32, shape=(num_entities, D)
+        )
+        for _, suffix in outputs
+    ]
+
+    for start in range(0, num_entities, chunk_rows):
+        end = min(start + chunk_rows, num_entities)
+        embeddings = store.gather(table, hashes[start:end])
+        for (weights, _), out in zip(outputs, files):
+            out[start:end] = project_embeddings(embeddings, weights)
+
+    for out in files:
+        out.flush()
+    del files
+    logger.info(f"Projected {num_entities} {name} embeddings to {prefix}")
+    return ProjectedEntityTable(prefix)
+
+
+@dataclass
+class ProjectedLookupStats:
+    """Counts of entity lookups served from precomputed tables vs projected on the fly."""
+
+    precomputed: int = 0
+    computed: int = 0
+
+    @property
+    def precomputed_rate(self) -> float:
+        total = self.precomputed + self.computed
+        if total == 0:
+            return 0.0
+        return self.precomputed / total
+
+    def reset(self):
+        self.precomputed = 0
+        self.computed = 0
+
+
+@dataclass
+class ProjectedEmbeddingStore:
+    """Produces ProjectedRecsysEmbeddings from raw entity IDs.
+
+    Post and author projections come from the precomputed tables. Entities
+    missing from those tables (e.g. posts created after the offline job ran)
+    are gathered from the raw hash tables and projected on the host, so
+    results match the unprojected model either way. User embeddings are
+    always raw hash embeddings.
+    """
+
+    embedding_store: EmbeddingTableStore
+    weights: ProjectionWeights
+    post_table: ProjectedEntityTable
+    author_table: ProjectedEntityTable
+
+    lookup_stats: Dict[str, ProjectedLookupStats] = field(
+        default_factory=lambda: {
+            POST_TABLE: ProjectedLookupStats(),
+            AUTHOR_TABLE: ProjectedLookupStats(),
+        },
+        init=False,
+    )
+
+    @staticmethod
+    def open(
+        directory: str, embedding_store: EmbeddingTableStore, weights: ProjectionWeights
+    ) -> "ProjectedEmbeddingStore":
+        """Open the post and author tables written by build_projected_tables."""
+        return ProjectedEmbeddingStore(
+            embedding_store=embedding_store,
+            weights=weights,
+            post_table=ProjectedEntityTable(os.path.join(directory, POST_TABLE)),
+            author_table=ProjectedEntityTable(os.path.join(directory, AUTHOR_TABLE)),
+        )
+
+    def _project(
+        self,
+        name: str,
+        projected_table: ProjectedEntityTable,
+        precomputed: Optional[np.ndarray],
+        raw_table: EmbeddingTable,
+        weights: np.ndarray,
+        ids: np.ndarray,
+        hashes: np.ndarray,
+    ) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        hashes = np.asarray(hashes)
+        flat_ids = ids.reshape(-1)
+        flat_hashes = hashes.reshape(flat_ids.shape[0], -1)
+        out = np.zeros((flat_ids.shape[0], weights.shape[1]), dtype=np.float32)
+
+        rows, found = projected_table.find(flat_ids)
+        valid = flat_ids != PADDING_ID
+        found &= valid
+        if precomputed is not None:
+            out[found] = precomputed[rows[found]]
+        else:
+            found[:] = False
+
+        missing = valid & ~found
+        if missing.any():
+            embeddings = self.embedding_store.gather(raw_table, flat_hashes[missing])
+            out[missing] = project_embeddings(embeddings, weights)
+
+        stats = self.lookup_stats[name]
+        stats.precomputed += int(found.sum())
+        stats.computed += int(missing.sum())
+        return out.reshape((*ids.shape, weights.shape[1]))
+
+    def lookup(
+        self,
+        batch: RecsysBatch,
+        history_post_ids: np.ndarray,
+        history_author_ids: np.ndarray,
+        candidate_post_ids: np.ndarray,
+        candidate_author_ids: np.ndarray,
+    ) -> ProjectedRecsysEmbeddings:
+        """Look up projected embeddings for a batch.
+
+        Args:
+            batch: RecsysBatch whose hash fields correspond to the given IDs
+            history_post_ids / history_author_ids: [B, S] raw IDs (PADDING_ID = padding)
+            candidate_post_ids / candidate_author_ids: [B, C] raw IDs
+
+        Returns:
+            ProjectedRecsysEmbeddings; candidate fields are None if the weights
+            have no candidate projection.
+        """
+        store = self.embedding_store
+        weights = self.weights
+        user_embeddings = store.gather(store.user_table, batch.user_hashes)  # type: ignore
+
+        history_post = self._project(
+            POST_TABLE,
+            self.post_table,
+            self.post_table.history,
+            store.post_table,
+            weights.history_post,
+            history_post_ids,
+            batch.history_post_hashes,  # type: ignore
+        )
+        history_author = self._project(
+            AUTHOR_TABLE,
+            self.author_table,
+            self.author_table.history,
+            store.author_table,
+            weights.history_author,
+            history_author_ids,
+            batch.history_author_hashes,  # type: ignore
+        )
+
+        candidate_post, candidate_author = None, None
+        if weights.candidate_post is not None and weights.candidate_author is not None:
+            candidate_post = self._project(
+                POST_TABLE,
+                self.post_table,
+                self.post_table.candidate,
+                store.post_table,
+                weights.candidate_post,
+                candidate_post_ids,
+                batch.candidate_post_hashes,  # type: ignore
+            )
+            candidate_author = self._project(
+                AUTHOR_TABLE,
+                self.author_table,
+                self.author_table.candidate,
+                store.author_table,
+                weights.candidate_author,
+                candidate_author_ids,
+                batch.candidate_author_hashes,  # type: ignore
+            )
+
+        return ProjectedRecsysEmbeddings(
+            user_embeddings=user_embeddings,
+            history_post_embeddings=history_post,
+            candidate_post_embeddings=candidate_post,  # type: ignore
+            history_author_embeddings=history_author,
+            candidate_author_embeddings=candidate_author,  # type: ignore
+        )
+
+
+def build_projected_tables(
+    directory: str,
+    store: EmbeddingTableStore,
+    weights: ProjectionWeights,
+    post_ids: np.ndarray,
+    post_hashes: np.ndarray,
+    author_ids: np.ndarray,
+    author_hashes: np.ndarray,
+    chunk_rows: int = 1 << 16,
+):
+    """Offline job: materialize the post and author tables for one model version."""
+    build_projected_table(
+        directory,
+        POST_TABLE,
+        post_ids,
+        post_hashes,
+        store,
+        store.post_table,
+        weights.history_post,
+        weights.candidate_post,
+        chunk_rows,
+    )
+    build_projected_table(
+        directory,
+        AUTHOR_TABLE,
+        author_ids,
+        author_hashes,
+        store,
+        store.author_table,
+        weights.history_author,
+        weights.candidate_author,
+        chunk_rows,
+    )
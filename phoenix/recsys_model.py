@@ -14,11 +14,12 @@
 
 import logging
 from dataclasses import dataclass
-from typing import Any, NamedTuple, Optional, Tuple
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 import haiku as hk
 import jax
 import jax.numpy as jnp
+import numpy as np
 
 from grok import (
     TransformerConfig,
@@ -38,6 +39,27 @@ class HashConfig:
     num_author_hashes: int = 2
 
 
+@dataclass
+class DeviceEmbeddingConfig:
+    """Hash-embedding tables held on device as model parameters.
+
+    When set on a model config, the model gathers RecsysEmbeddings from these
+    tables inside the forward pass, so only the integer RecsysBatch features
+    have to be transferred from the host.
+    """
+
+    num_user_embeddings: int
+    num_post_embeddings: int
+    num_author_embeddings: int
+    param_dtype: Any = jnp.float32
+
+
+USER_EMBEDDING_TABLE = "user_embedding_table"
+POST_EMBEDDING_TABLE = "post_embedding_table"
+AUTHOR_EMBEDDING_TABLE = "author_embedding_table"
+
+
+@jax.tree_util.register_dataclass
 @dataclass
 class RecsysEmbeddings:
     """Container for pre-looked-up embeddings from the embedding tables.
@@ -53,12 +75,49 @@ class RecsysEmbeddings:
     candidate_author_embeddings: jax.typing.ArrayLike
 
 
+@jax.tree_util.register_dataclass
+@dataclass
+class ProjectedRecsysEmbeddings:
+    """Embeddings with the post and author parts already projected to D dimensions.
+
+    `block_history_reduce` and `block_candidate_reduce` are linear in each
+    concatenated part, so a post's (or author's) contribution to a token is
+    its concatenated hash embeddings times the matching row block of
+    proj_mat_3 (history) or proj_mat_2 (candidates). Those products can be
+    computed once per model version (see projected_embeddings.py); the model
+    then only adds them to the action and product-surface contributions.
+
+    user_embeddings are the raw [B, num_user_hashes, D] hash embeddings; the
+    other fields are projected [B, S, D] (history) and [B, C, D] (candidates).
+    """
+
+    user_embeddings: jax.typing.ArrayLike
+    history_post_embeddings: jax.typing.ArrayLike
+    candidate_post_embeddings: jax.typing.ArrayLike
+    history_author_embeddings: jax.typing.ArrayLike
+    candidate_author_embeddings: jax.typing.ArrayLike
+
+
 class RecsysModelOutput(NamedTuple):
     """Output of the recommendation model."""
 
     logits: jax.Array
 
 
+class PrefixExtendOutput(NamedTuple):
+    """Output of PhoenixModel.extend.
+
+    logits: [B, C, num_actions] candidate logits, as from PhoenixModel.__call__
+    layer_kv: per-layer (key, value) of the K new user/history positions,
+        each [B, K, num_kv_heads, key_size]; append the valid ones to the prefix
+    new_mask: [B, K] True where a new position is a valid (non-padding) token
+    """
+
+    logits: jax.Array
+    layer_kv: List[Tuple[jax.Array, jax.Array]]
+    new_mask: jax.Array
+
+
 class RecsysBatch(NamedTuple):
     """Input batch for the recommendation model.
 
@@ -76,6 +135,260 @@ class RecsysBatch(NamedTuple):
     candidate_product_surface: jax.typing.ArrayLike
 
 
+class CompactRecsysBatch(NamedTuple):
+    """Compact encoding of a RecsysBatch for host memory and host->device transfer.
+
+    Same fields as RecsysBatch, except:
+    - history_actions: [B, S] uint32 bitmask, bit i set when action i is present
+    - history_product_surface / candidate_product_surface: uint8 indices (uint16
+      or int32 for product surface vocabularies above 256 or 65536 entries)
+
+    The models unpack history_actions on device, so either batch type can be
+    passed wherever a RecsysBatch is accepted.
+    """
+
+    user_hashes: jax.typing.ArrayLike
+    history_post_hashes: jax.typing.ArrayLike
+    history_author_hashes: jax.typing.ArrayLike
+    history_actions: jax.typing.ArrayLike
+    history_product_surface: jax.typing.ArrayLike
+    candidate_post_hashes: jax.typing.ArrayLike
+    candidate_author_hashes: jax.typing.ArrayLike
+    candidate_product_surface: jax.typing.ArrayLike
+
+
+MAX_PACKED_ACTIONS = 32
+
+
+def pack_history_actions(history_actions: np.ndarray) -> np.ndarray:
+    """Pack multi-hot action vectors into a uint32 bitmask.
+
+    Args:
+        history_actions: [..., num_actions] multi-hot actions (nonzero = present)
+
+    Returns:
+        packed: [...] uint32 with bit i set when action i is present
+    """
+    num_actions = history_actions.shape[-1]
+    if num_actions > MAX_PACKED_ACTIONS:
+        raise ValueError(f"Cannot pack {num_actions} actions into {MAX_PACKED_ACTIONS} bits")
+    bits = np.left_shift(np.uint32(1), np.arange(num_actions, dtype=np.uint32))
+    return np.bitwise_or.reduce(np.where(history_actions != 0, bits, np.uint32(0)), axis=-1)
+
+
+def unpack_history_actions(packed: jax.typing.ArrayLike, num_actions: int) -> jax.Array:
+    """Unpack a uint32 action bitmask into float32 multi-hot vectors on device.
+
+    Args:
+        packed: [...] uint32 bitmask from pack_history_actions
+        num_actions: number of actions encoded in the bitmask
+
+    Returns:
+        history_actions: [..., num_actions] float32 multi-hot actions
+    """
+    shifts = jnp.arange(num_actions, dtype=jnp.uint32)
+    bits = jnp.right_shift(jnp.asarray(packed, dtype=jnp.uint32)[..., None], shifts) & 1
+    return bits.astype(jnp.float32)
+
+
+def pack_product_surface(product_surface: np.ndarray, vocab_size: int) -> np.ndarray:
+    """Store product surface indices in the smallest unsigned dtype holding vocab_size.
+
+    Raises ValueError for indices outside [0, vocab_size), which would otherwise
+    wrap around silently.
+    """
+    product_surface = np.asarray(product_surface)
+    if product_surface.size and (
+        product_surface.min() < 0 or product_surface.max() >= vocab_size
+    ):
+        raise ValueError(f"Product surface indices must be in [0, {vocab_size})")
+    if vocab_size <= 1 << 8:
+        return product_surface.astype(np.uint8)
+    if vocab_size <= 1 << 16:
+        return product_surface.astype(np.uint16)
+    return product_surface.astype(np.int32)
+
+
+def compact_batch(
+    batch: RecsysBatch, product_surface_vocab_size: int = 1 << 8
+) -> CompactRecsysBatch:
+    """Convert a RecsysBatch into its compact encoding.
+
+    Args:
+        batch: dense RecsysBatch
+        product_surface_vocab_size: the model's product_surface_vocab_size; it
+            selects the dtype of the packed product surfaces
+    """
+    return CompactRecsysBatch(
+        user_hashes=batch.user_hashes,
+        history_post_hashes=batch.history_post_hashes,
+        history_author_hashes=batch.history_author_hashes,
+        history_actions=pack_history_actions(np.asarray(batch.history_actions)),
+        history_product_surface=pack_product_surface(
+            batch.history_product_surface, product_surface_vocab_size
+        ),
+        candidate_post_hashes=batch.candidate_post_hashes,
+        candidate_author_hashes=batch.candidate_author_hashes,
+        candidate_product_surface=pack_product_surface(
+            batch.candidate_product_surface, product_surface_vocab_size
+        ),
+    )
+
+
+def expand_batch(batch: CompactRecsysBatch, num_actions: int) -> RecsysBatch:
+    """Convert a CompactRecsysBatch back into the dense float32/int32 RecsysBatch."""
+    return RecsysBatch(
+        user_hashes=batch.user_hashes,
+        history_post_hashes=batch.history_post_hashes,
+        history_author_hashes=batch.history_author_hashes,
+        history_actions=np.asarray(unpack_history_actions(batch.history_actions, num_actions)),
+        history_product_surface=np.asarray(batch.history_product_surface).astype(np.int32),
+        candidate_post_hashes=batch.candidate_post_hashes,
+        candidate_author_hashes=batch.candidate_author_hashes,
+        candidate_product_surface=np.asarray(batch.candidate_product_surface).astype(np.int32),
+    )
+
+
+def get_history_actions(
+    batch: Union[RecsysBatch, CompactRecsysBatch], num_actions: int
+) -> jax.typing.ArrayLike:
+    """Return [B, S, num_actions] multi-hot history actions, unpacking compact batches."""
+    if isinstance(batch, CompactRecsysBatch):
+        return unpack_history_actions(batch.history_actions, num_actions)
+    return batch.history_actions
+
+
+def lookup_device_embeddings(
+    batch: Union[RecsysBatch, CompactRecsysBatch],
+    emb_size: int,
+    device_embeddings: DeviceEmbeddingConfig,
+) -> RecsysEmbeddings:
+    """Gather RecsysEmbeddings in-graph from device-resident hash tables.
+
+    Must be called inside a haiku transform. Hash 0 yields a zero embedding.
+
+    Args:
+        batch: RecsysBatch (or CompactRecsysBatch) with hash fields
+        emb_size: embedding dimension D
+        device_embeddings: table sizes and parameter dtype
+
+    Returns:
+        RecsysEmbeddings with float32 embeddings of the usual shapes
+    """
+    embed_init = hk.initializers.VarianceScaling(1.0, mode="fan_out")
+
+    def table(name: str, num_rows: int) -> jax.Array:
+        return hk.get_parameter(
+            name, [num_rows, emb_size], dtype=device_embeddings.param_dtype, init=embed_init
+        )
+
+    def gather(embedding_table: jax.Array, hashes: jax.typing.ArrayLike) -> jax.Array:
+        hashes = jnp.asarray(hashes)
+        # Out-of-range hashes are rejected by resolve_recsys_embeddings when the
+        # batch is concrete; clipping keeps traced gathers from filling with NaN.
+        embeddings = jnp.take(embedding_table, hashes, axis=0, mode="clip").astype(jnp.float32)
+        return embeddings * (hashes != 0)[..., None]
+
+    user_table = table(USER_EMBEDDING_TABLE, device_embeddings.num_user_embeddings)
+    post_table = table(POST_EMBEDDING_TABLE, device_embeddings.num_post_embeddings)
+    author_table = table(AUTHOR_EMBEDDING_TABLE, device_embeddings.num_author_embeddings)
+
+    return RecsysEmbeddings(
+        user_embeddings=gather(user_table, batch.user_hashes),
+        history_post_embeddings=gather(post_table, batch.history_post_hashes),
+        candidate_post_embeddings=gather(post_table, batch.candidate_post_hashes),
+        history_author_embeddings=gather(author_table, batch.history_author_hashes),
+        candidate_author_embeddings=gather(author_table, batch.candidate_author_hashes),
+    )
+
+
+def resolve_recsys_embeddings(
+    batch: Union[RecsysBatch, CompactRecsysBatch],
+    recsys_embeddings: Optional[RecsysEmbeddings],
+    emb_size: int,
+    device_embeddings: Optional[DeviceEmbeddingConfig],
+) -> RecsysEmbeddings:
+    """Return host-provided embeddings, or gather them from device tables if absent.
+
+    Out-of-range hashes are clipped by the gather; callers validate host batches
+    with check_hash_ranges before they are transferred.
+    """
+    if recsys_embeddings is not None:
+        return recsys_embeddings
+    if device_embeddings is None:
+        raise ValueError("recsys_embeddings must be provided unless device_embeddings is set")
+    return lookup_device_embeddings(batch, emb_size, device_embeddings)
+
+
+def check_hash_ranges(
+    batch: Union[RecsysBatch, CompactRecsysBatch], device_embeddings: DeviceEmbeddingConfig
+):
+    """Check host batch hashes against the device table sizes.
+
+    Raises ValueError like an out-of-range host store lookup. Runs on the host
+    arrays, so it adds no device-to-host sync to the forward pass.
+    """
+    tables = [
+        ("user_hashes", device_embeddings.num_user_embeddings),
+        ("history_post_hashes", device_embeddings.num_post_embeddings),
+        ("candidate_post_hashes", device_embeddings.num_post_embeddings),
+        ("history_author_hashes", device_embeddings.num_author_embeddings),
+        ("candidate_author_hashes", device_embeddings.num_author_embeddings),
+    ]
+    for name, num_rows in tables:
+        hashes = np.asarray(getattr(batch, name))
+        if not hashes.size:
+            continue
+        if hashes.min() < 0 or hashes.max() >= num_rows:
+            raise ValueError(
+                f"{name} must be in [0, {num_rows}) for the device embedding table, "
+                f"got [{hashes.min()}, {hashes.max()}]"
+            )
+
+
+def set_device_embedding_tables(
+    params: hk.Params,
+    user_table: Optional[jax.typing.ArrayLike] = None,
+    post_table: Optional[jax.typing.ArrayLike] = None,
+    author_table: Optional[jax.typing.ArrayLike] = None,
+) -> hk.Params:
+    """Return a copy of `params` with device embedding tables replaced.
+
+    Tables are cast to the dtype of the existing parameter (e.g. bfloat16).
+    """
+    replacements = {
+        USER_EMBEDDING_TABLE: user_table,
+        POST_EMBEDDING_TABLE: post_table,
+        AUTHOR_EMBEDDING_TABLE: author_table,
+    }
+    new_params = {}
+    for module_name, module_params in params.items():
+        new_module_params = dict(module_params)
+        for param_name, value in replacements.items():
+            if value is None or param_name not in module_params:
+                continue
+            current = module_params[param_name]
+            if tuple(current.shape) != tuple(np.shape(value)):
+                raise ValueError(
+                    f"{param_name} has shape {current.shape}, got table of shape {np.shape(value)}"
+                )
+            new_module_params[param_name] = jnp.asarray(value, dtype=current.dtype)
+        new_params[module_name] = new_module_params
+    return new_params
+
+
+def _get_projection(
+    name: str, input_size: int, emb_size: int, embed_init_scale: float
+) -> jax.Array:
+    embed_init = hk.initializers.VarianceScaling(embed_init_scale, mode="fan_out")
+    return hk.get_parameter(
+        name,
+        [input_size, emb_size],
+        dtype=jnp.float32,
+        init=lambda shape, dtype: embed_init(list(reversed(shape)), dtype).T,
+    )
+
+
 def block_user_reduce(
     user_hashes: jnp.ndarray,
     user_embeddings: jnp.ndarray,
@@ -163,13 +476,7 @@ def block_history_reduce(
         axis=-1,
     )
 
-    embed_init = hk.initializers.VarianceScaling(embed_init_scale, mode="fan_out")
-    proj_mat_3 = hk.get_parameter(
-        "proj_mat_3",
-        [post_author_embedding.shape[-1], D],
-        dtype=jnp.float32,
-        init=lambda shape, dtype: embed_init(list(reversed(shape)), dtype).T,
-    )
+    proj_mat_3 = _get_projection("proj_mat_3", post_author_embedding.shape[-1], D, embed_init_scale)
 
     history_embedding = jnp.dot(post_author_embedding.astype(proj_mat_3.dtype), proj_mat_3).astype(
         post_author_embedding.dtype
@@ -225,13 +532,7 @@ def block_candidate_reduce(
         axis=-1,
     )
 
-    embed_init = hk.initializers.VarianceScaling(embed_init_scale, mode="fan_out")
-    proj_mat_2 = hk.get_parameter(
-        "proj_mat_2",
-        [post_author_embedding.shape[-1], D],
-        dtype=jnp.float32,
-        init=lambda shape, dtype: embed_init(list(reversed(shape)), dtype).T,
-    )
+    proj_mat_2 = _get_projection("proj_mat_2", post_author_embedding.shape[-1], D, embed_init_scale)
 
     candidate_embedding = jnp.dot(
         post_author_embedding.astype(proj_mat_2.dtype), proj_mat_2
@@ -242,6 +543,102 @@ def block_candidate_reduce(
     return candidate_embedding, candidate_padding_mask
 
 
+def block_history_reduce_projected(
+    history_post_hashes: jnp.ndarray,
+    history_post_projected: jnp.ndarray,
+    history_author_projected: jnp.ndarray,
+    history_product_surface_embeddings: jnp.ndarray,
+    history_actions_embeddings: jnp.ndarray,
+    num_item_hashes: int,
+    num_author_hashes: int,
+    embed_init_scale: float = 1.0,
+) -> Tuple[jax.Array, jax.Array]:
+    """block_history_reduce for post/author parts already projected through proj_mat_3.
+
+    Declares proj_mat_3 with the same shape as block_history_reduce, so the
+    same parameters serve both input modes; only the action and product
+    surface row blocks are multiplied here.
+
+    Args:
+        history_post_hashes: [B, S, num_item_hashes]
+        history_post_projected: [B, S, D] - post hash embeddings @ post rows of proj_mat_3
+        history_author_projected: [B, S, D] - author hash embeddings @ author rows of proj_mat_3
+        history_product_surface_embeddings: [B, S, D]
+        history_actions_embeddings: [B, S, D]
+        num_item_hashes: number of hash functions for items
+        num_author_hashes: number of hash functions for authors
+        embed_init_scale: initialization scale
+
+    Returns:
+        history_embeddings: [B, S, D]
+        history_padding_mask: [B, S]
+    """
+    B, S, D = history_post_projected.shape
+    offset = (num_item_hashes + num_author_hashes) * D
+
+    proj_mat_3 = _get_projection("proj_mat_3", offset + 2 * D, D, embed_init_scale)
+    actions_proj = proj_mat_3[offset : offset + D]
+    product_surface_proj = proj_mat_3[offset + D :]
+
+    history_embedding = (
+        history_post_projected.astype(jnp.float32)
+        + history_author_projected.astype(jnp.float32)
+        + jnp.dot(history_actions_embeddings.astype(actions_proj.dtype), actions_proj)
+        + jnp.dot(
+            history_product_surface_embeddings.astype(product_surface_proj.dtype),
+            product_surface_proj,
+        )
+    )
+
+    history_padding_mask = (history_post_hashes[:, :, 0] != 0).reshape(B, S)
+
+    return history_embedding, history_padding_mask
+
+
+def block_candidate_reduce_projected(
+    candidate_post_hashes: jnp.ndarray,
+    candidate_post_projected: jnp.ndarray,
+    candidate_author_projected: jnp.ndarray,
+    candidate_product_surface_embeddings: jnp.ndarray,
+    num_item_hashes: int,
+    num_author_hashes: int,
+    embed_init_scale: float = 1.0,
+) -> Tuple[jax.Array, jax.Array]:
+    """block_candidate_reduce for post/author parts already projected through proj_mat_2.
+
+    Args:
+        candidate_post_hashes: [B, C, num_item_hashes]
+        candidate_post_projected: [B, C, D] - post hash embeddings @ post rows of proj_mat_2
+        candidate_author_projected: [B, C, D] - author hash embeddings @ author rows of proj_mat_2
+        candidate_product_surface_embeddings: [B, C, D]
+        num_item_hashes: number of hash functions for items
+        num_author_hashes: number of hash functions for authors
+        embed_init_scale: initialization scale
+
+    Returns:
+        candidate_embeddings: [B, C, D]
+        candidate_padding_mask: [B, C]
+    """
+    B, C, D = candidate_post_projected.shape
+    offset = (num_item_hashes + num_author_hashes) * D
+
+    proj_mat_2 = _get_projection("proj_mat_2", offset + D, D, embed_init_scale)
+    product_surface_proj = proj_mat_2[offset:]
+
+    candidate_embedding = (
+        candidate_post_projected.astype(jnp.float32)
+        + candidate_author_projected.astype(jnp.float32)
+        + jnp.dot(
+            candidate_product_surface_embeddings.astype(product_surface_proj.dtype),
+            product_surface_proj,
+        )
+    )
+
+    candidate_padding_mask = (candidate_post_hashes[:, :, 0] != 0).reshape(B, C).astype(jnp.bool_)
+
+    return candidate_embedding, candidate_padding_mask
+
+
 @dataclass
 class PhoenixModelConfig:
     """Configuration for the recommendation system model."""
@@ -259,6 +656,8 @@ class PhoenixModelConfig:
 
     product_surface_vocab_size: int = 16
 
+    device_embeddings: Optional[DeviceEmbeddingConfig] = None
+
     _initialized = False
 
     def __post_init__(self):
@@ -365,13 +764,17 @@ class PhoenixModel(hk.Module):
     def build_inputs(
         self,
         batch: RecsysBatch,
-        recsys_embeddings: RecsysEmbeddings,
+        recsys_embeddings: Optional[Union[RecsysEmbeddings, ProjectedRecsysEmbeddings]] = None,
     ) -> Tuple[jax.Array, jax.Array, int]:
         """Build input embeddings from batch and pre-looked-up embeddings.
 
         Args:
-            batch: RecsysBatch containing hashes, actions, product surfaces
-            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings
+            batch: RecsysBatch (or CompactRecsysBatch) containing hashes, actions,
+                product surfaces
+            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings,
+                or ProjectedRecsysEmbeddings with precomputed post/author projections.
+                May be None when config.device_embeddings is set, in which case the
+                embeddings are gathered from the device-resident tables.
 
         Returns:
             embeddings: [B, 1 + history_len + num_candidates, D]
@@ -380,6 +783,11 @@ class PhoenixModel(hk.Module):
         """
         config = self.config
         hash_config = config.hash_config
+        projected = isinstance(recsys_embeddings, ProjectedRecsysEmbeddings)
+        if not projected:
+            recsys_embeddings = resolve_recsys_embeddings(
+                batch, recsys_embeddings, config.emb_size, config.device_embeddings
+            )
 
         history_product_surface_embeddings = self._single_hot_to_embeddings(
             batch.history_product_surface,  # type: ignore
@@ -394,7 +802,8 @@ class PhoenixModel(hk.Module):
             "product_surface_embedding_table",
         )
 
-        history_actions_embeddings = self._get_action_embeddings(batch.history_actions)  # type: ignore
+        history_actions = get_history_actions(batch, config.num_actions)
+        history_actions_embeddings = self._get_action_embeddings(history_actions)  # type: ignore
 
         user_embeddings, user_padding_mask = block_user_reduce(
             batch.user_hashes,  # type: ignore
@@ -404,7 +813,8 @@ class PhoenixModel(hk.Module):
             1.0,
         )
 
-        history_embeddings, history_padding_mask = block_history_reduce(
+        history_reduce = block_history_reduce_projected if projected else block_history_reduce
+        history_embeddings, history_padding_mask = history_reduce(
             batch.history_post_hashes,  # type: ignore
             recsys_embeddings.history_post_embeddings,  # type: ignore
             recsys_embeddings.history_author_embeddings,  # type: ignore
@@ -415,7 +825,8 @@ class PhoenixModel(hk.Module):
             1.0,
         )
 
-        candidate_embeddings, candidate_padding_mask = block_candidate_reduce(
+        candidate_reduce = block_candidate_reduce_projected if projected else block_candidate_reduce
+        candidate_embeddings, candidate_padding_mask = candidate_reduce(
             batch.candidate_post_hashes,  # type: ignore
             recsys_embeddings.candidate_post_embeddings,  # type: ignore
             recsys_embeddings.candidate_author_embeddings,  # type: ignore
@@ -439,13 +850,15 @@ class PhoenixModel(hk.Module):
     def __call__(
         self,
         batch: RecsysBatch,
-        recsys_embeddings: RecsysEmbeddings,
+        recsys_embeddings: Optional[Union[RecsysEmbeddings, ProjectedRecsysEmbeddings]] = None,
     ) -> RecsysModelOutput:
         """Forward pass for ranking candidates.
 
         Args:
             batch: RecsysBatch containing hashes, actions, product surfaces
-            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings
+            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings,
+                ProjectedRecsysEmbeddings with precomputed post/author projections,
+                or None to gather them from config.device_embeddings
 
         Returns:
             RecsysModelOutput containing logits for each candidate. Shape = [B, num_candidates, num_actions]
@@ -467,8 +880,74 @@ class PhoenixModel(hk.Module):
 
         candidate_embeddings = out_embeddings[:, candidate_start_offset:, :]
 
+        return RecsysModelOutput(logits=self._decode_logits(candidate_embeddings))
+
+    def _decode_logits(self, candidate_embeddings: jax.Array) -> jax.Array:
         unembeddings = self._get_unembedding()
         logits = jnp.dot(candidate_embeddings.astype(unembeddings.dtype), unembeddings)
-        logits = logits.astype(self.fprop_dtype)
+        return logits.astype(self.fprop_dtype)
+
+    @hk.experimental.name_like("__call__")
+    def extend(
+        self,
+        batch: RecsysBatch,
+        recsys_embeddings: Optional[Union[RecsysEmbeddings, ProjectedRecsysEmbeddings]],
+        prefix_kv: Optional[Sequence[Tuple[jax.Array, jax.Array]]],
+        prefix_mask: Optional[jax.Array],
+        prefix_len: jax.Array,
+        num_new: int,
+    ) -> PrefixExtendOutput:
+        """Score candidates reusing cached keys/values of a user+history prefix.
+
+        User+history attention is causal, so the keys and values of the first
+        `prefix_len` sequence positions do not depend on later positions. Only
+        the next `num_new` positions and the candidates are run through the
+        transformer; they attend to the cached prefix and keep their full-sequence
+        RoPE positions, so logits match __call__ on the same batch.
+
+        Args:
+            batch: full RecsysBatch, as for __call__
+            recsys_embeddings: embeddings for the full batch, as for __call__
+            prefix_kv: per-layer (key, value) [B, P, num_kv_heads, key_size] of the
+                cached positions, padded to a common P; None when nothing is cached
+            prefix_mask: [B, P] True for cached positions that are valid tokens
+                (positions at or beyond prefix_len must be False)
+            prefix_len: [B] number of cached sequence positions per user (0 = none)
+            num_new: K, number of positions computed after each user's prefix;
+                must cover the last valid history position of every user
+
+        Returns:
+            PrefixExtendOutput with candidate logits and the new positions' keys/values
+        """
+        embeddings, padding_mask, candidate_start_offset = self.build_inputs(
+            batch, recsys_embeddings
+        )
+        B, T, _ = embeddings.shape
+
+        new_positions = jnp.asarray(prefix_len)[:, None] + jnp.arange(num_new)[None, :]  # [B, K]
+        in_history = new_positions < candidate_start_offset
+        gather_positions = jnp.minimum(new_positions, candidate_start_offset - 1)
+        new_embeddings = jnp.take_along_axis(embeddings, gather_positions[..., None], axis=1)
+        new_mask = jnp.take_along_axis(padding_mask, gather_positions, axis=1) & in_history
+
+        candidate_positions = jnp.broadcast_to(
+            jnp.arange(candidate_start_offset, T)[None, :], (B, T - candidate_start_offset)
+        )
+        tokens = jnp.concatenate([new_embeddings, embeddings[:, candidate_start_offset:]], axis=1)
+        token_mask = jnp.concatenate([new_mask, padding_mask[:, candidate_start_offset:]], axis=1)
+        positions = jnp.concatenate([new_positions, candidate_positions], axis=1)
+
+        model_output = self.model(
+            tokens,
+            token_mask,
+            candidate_start_offset=num_new,
+            positions=positions.astype(jnp.float32),
+            prefix_kv=prefix_kv,
+            prefix_mask=prefix_mask,
+        )
+
+        out_embeddings = layer_norm(model_output.embeddings)
+        logits = self._decode_logits(out_embeddings[:, num_new:, :])
+        layer_kv = [(k[:, :num_new], v[:, :num_new]) for k, v in model_output.layer_kv]  # type: ignore
 
-        return RecsysModelOutput(logits=logits)
+        return PrefixExtendOutput(logits=logits, layer_kv=layer_kv, new_mask=new_mask)
@@ -12,9 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import logging
 from dataclasses import dataclass
-from typing import Any, NamedTuple, Optional, Tuple
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 import haiku as hk
 import jax
@@ -22,11 +23,16 @@ import jax.numpy as jnp
 
 from grok import TransformerConfig, Transformer
 from recsys_model import (
+    DeviceEmbeddingConfig,
     HashConfig,
+    ProjectedRecsysEmbeddings,
     RecsysBatch,
     RecsysEmbeddings,
     block_history_reduce,
+    block_history_reduce_projected,
     block_user_reduce,
+    get_history_actions,
+    resolve_recsys_embeddings,
 )
 
 logger = logging.getLogger(__name__)
@@ -43,6 +49,214 @@ class RetrievalOutput(NamedTuple):
     top_k_scores: jax.Array
 
 
+class UserExtendOutput(NamedTuple):
+    """Output of PhoenixRetrievalModel.extend_user_representation.
+
+    user_representation: [B, D] L2-normalized user embedding, as from
+        build_user_representation on the full batch
+    output_sum: [B, D] float32 sum of the transformer outputs over all valid
+        user+history positions (cached prefix and new positions)
+    layer_kv: per-layer (key, value) of the K new positions, each
+        [B, K, num_kv_heads, key_size]; append the valid ones to the prefix
+    new_mask: [B, K] True where a new position is a valid (non-padding) token
+    """
+
+    user_representation: jax.Array
+    output_sum: jax.Array
+    layer_kv: List[Tuple[jax.Array, jax.Array]]
+    new_mask: jax.Array
+
+
+class CorpusExclusions(NamedTuple):
+    """Per-user corpus entries to leave out of the top-k (seen posts, blocked authors).
+
+    Sets are sorted ascending and left-padded with -1 to a common width, so
+    membership is a binary search per corpus entry.
+
+    excluded_rows: [B, E] int32 corpus row indices excluded per user
+    excluded_authors: [B, A] int32 author codes excluded per user
+    corpus_authors: [N] int32 author code of each corpus row
+    """
+
+    excluded_rows: jax.Array
+    excluded_authors: jax.Array
+    corpus_authors: jax.Array
+
+
+def _sorted_contains(sorted_sets: jax.Array, values: jax.Array) -> jax.Array:
+    """[B, n] whether values [n] are in each user's sorted set [B, E]."""
+    B, E = sorted_sets.shape
+    if E == 0:
+        return jnp.zeros((B, values.shape[0]), dtype=jnp.bool_)
+    positions = jax.vmap(lambda s: jnp.searchsorted(s, values))(sorted_sets)
+    found = jnp.take_along_axis(sorted_sets, jnp.minimum(positions, E - 1), axis=1)
+    return found == values[None, :]
+
+
+def exclusion_mask(exclusions: CorpusExclusions, rows: jax.Array, authors: jax.Array) -> jax.Array:
+    """[B, n] True where corpus rows [n] (with author codes [n]) are excluded."""
+    return _sorted_contains(exclusions.excluded_rows, rows) | _sorted_contains(
+        exclusions.excluded_authors, authors
+    )
+
+
+def _select_top_k(
+    scores: jax.Array, k: int, recall_target: Optional[float]
+) -> Tuple[jax.Array, jax.Array]:
+    if recall_target is None or recall_target >= 1.0:
+        return jax.lax.top_k(scores, k)
+    return jax.lax.approx_max_k(scores, k, recall_target=recall_target)
+
+
+def tiled_top_k(
+    user_representation: jax.Array,
+    corpus_embeddings: jax.Array,
+    top_k: int,
+    corpus_mask: Optional[jax.Array] = None,
+    tile_size: int = 65536,
+    recall_target: Optional[float] = None,
+    exclusions: Optional[CorpusExclusions] = None,
+) -> Tuple[jax.Array, jax.Array]:
+    """Top-k corpus entries per user, scanning the corpus in fixed-size tiles.
+
+    Each loop step scores one [tile_size, D] tile, takes its top-k and merges it
+    into a running [B, top_k] buffer, so the live score buffers are
+    O(B * (tile_size + top_k)) regardless of N. Tiles are read in place with
+    dynamic_slice; the last tile's start is clamped to N - tile_size and rows
+    already covered by the previous tile are masked.
+
+    Args:
+        user_representation: [B, D] normalized user embeddings
+        corpus_embeddings: [N, D] normalized corpus candidate embeddings
+        top_k: Number of candidates to retrieve
+        corpus_mask: [N] optional mask for valid corpus entries
+        tile_size: corpus rows scored per step
+        recall_target: if below 1.0, per-tile selection uses the hardware
+            approximate top-k (jax.lax.approx_max_k) with this expected recall
+        exclusions: optional per-user excluded rows and authors, masked per tile
+
+    Returns:
+        top_k_indices: [B, K] indices of top-k candidates
+        top_k_scores: [B, K] similarity scores of top-k candidates
+    """
+    B = user_representation.shape[0]
+    N = corpus_embeddings.shape[0]
+    score_dtype = jnp.result_type(user_representation.dtype, corpus_embeddings.dtype)
+    tile_size = min(tile_size, N)
+    tile_k = min(top_k, tile_size)
+    num_tiles = -(-N // tile_size)
+
+    def step(i, carry):
+        best_scores, best_indices = carry
+        start = jnp.minimum(i * tile_size, N - tile_size)
+        tile = jax.lax.dynamic_slice_in_dim(corpus_embeddings, start, tile_size)
+        positions = start + jnp.arange(tile_size)
+        valid = positions >= i * tile_size
+        if corpus_mask is not None:
+            valid = valid & jax.lax.dynamic_slice_in_dim(corpus_mask, start, tile_size)
+
+        scores = jnp.matmul(user_representation, tile.T).astype(jnp.float32)
+        valid = valid[None, :]
+        if exclusions is not None:
+            tile_authors = jax.lax.dynamic_slice_in_dim(exclusions.corpus_authors, start, tile_size)
+            valid = valid & ~exclusion_mask(exclusions, positions, tile_authors)
+        scores = jnp.where(valid, scores, -INF)
+        tile_scores, tile_indices = _select_top_k(scores, tile_k, recall_target)
+
+        merged_scores = jnp.concatenate([best_scores, tile_scores], axis=1)
+        merged_indices = jnp.concatenate([best_indices, positions[tile_indices]], axis=1)
+        best_scores, order = jax.lax.top_k(merged_scores, top_k)
+        return best_scores, jnp.take_along_axis(merged_indices, order, axis=1)
+
+    init = (
+        jnp.full((B, top_k), -2 * INF, dtype=jnp.float32),
+        jnp.zeros((B, top_k), dtype=jnp.int32),
+    )
+    top_k_scores, top_k_indices = jax.lax.fori_loop(0, num_tiles, step, init)
+    return top_k_indices, top_k_scores.astype(score_dtype)
+
+
+@functools.partial(jax.jit, static_argnames=("num_select",))
+def mmr_select(
+    candidate_embeddings: jax.Array,
+    relevance: jax.Array,
+    num_select: int,
+    diversity_lambda: Union[float, jax.Array],
+) -> jax.Array:
+    """Maximal marginal relevance selection over retrieved candidates.
+
+    Greedily picks, num_select times, the candidate maximizing
+    lambda * relevance - (1 - lambda) * (max similarity to the picks so far).
+    The loop runs a fixed number of steps and keeps each user's running max
+    similarity [B, K], updated with one [B, K, D] x [B, D] product per pick, so
+    a step costs O(B * K * D) instead of recomputing all pairwise similarities.
+    Candidates with relevance at or below -INF / 2 (padding, masked entries)
+    are picked only after all others.
+
+    Args:
+        candidate_embeddings: [B, K, D] normalized embeddings of the candidates
+        relevance: [B, K] relevance scores of the candidates (e.g. top-k scores)
+        num_select: number of candidates to pick, at most K
+        diversity_lambda: 1.0 orders by relevance only; lower values trade
+            relevance for dissimilarity to the candidates already picked
+
+    Returns:
+        [B, num_select] positions into K of the picked candidates, in pick order
+    """
+    B, K = relevance.shape
+    relevance = relevance.astype(jnp.float32)
+    candidate_embeddings = candidate_embeddings.astype(jnp.float32)
+    valid = relevance > -INF / 2
+    batch = jnp.arange(B)
+
+    def step(i, carry):
+        picked, max_similarity, order = carry
+        penalty = jnp.where(i == 0, 0.0, max_similarity)
+        scores = diversity_lambda * relevance - (1.0 - diversity_lambda) * penalty
+        scores = jnp.where(valid, scores, -INF)
+        scores = jnp.where(picked, -jnp.inf, scores)
+        choice = jnp.argmax(scores, axis=1)  # [B]
+
+        similarity = jnp.einsum(
+            "bkd,bd->bk", candidate_embeddings, candidate_embeddings[batch, choice]
+        )
+        return (
+            picked.at[batch, choice].set(True),
+            jnp.maximum(max_similarity, similarity),
+            order.at[:, i].set(choice.astype(jnp.int32)),
+        )
+
+    init = (
+        jnp.zeros((B, K), dtype=jnp.bool_),
+        jnp.full((B, K), -jnp.inf, dtype=jnp.float32),
+        jnp.zeros((B, num_select), dtype=jnp.int32),
+    )
+    _, _, order = jax.lax.fori_loop(0, num_select, step, init)
+    return order
+
+
+def normalize_user_representation(
+    output_sum: jax.Array, output_count: jax.Array
+) -> Tuple[jax.Array, jax.Array]:
+    """Mean-pool summed transformer outputs and L2-normalize.
+
+    Args:
+        output_sum: [B, D] sum of the outputs over valid positions
+        output_count: [B, 1] number of valid positions
+
+    Returns:
+        user_representation: L2-normalized user embedding [B, D]
+        user_norm: Pre-normalization L2 norm [B, 1]
+    """
+    user_representation = output_sum / jnp.maximum(output_count, 1.0)
+
+    user_norm_sq = jnp.sum(user_representation**2, axis=-1, keepdims=True)
+    user_norm = jnp.sqrt(jnp.maximum(user_norm_sq, EPS))
+    user_representation = user_representation / user_norm
+
+    return user_representation, user_norm
+
+
 @dataclass
 class CandidateTower(hk.Module):
     """Candidate tower that projects post+author embeddings to a shared embedding space.
@@ -111,6 +325,7 @@ class PhoenixRetrievalModelConfig:
     emb_size: int
     history_seq_len: int = 128
     candidate_seq_len: int = 32
+    num_actions: int = 19
 
     name: Optional[str] = None
     fprop_dtype: Any = jnp.bfloat16
@@ -119,6 +334,14 @@ class PhoenixRetrievalModelConfig:
 
     product_surface_vocab_size: int = 16
 
+    device_embeddings: Optional[DeviceEmbeddingConfig] = None
+
+    # Score the corpus in tiles of this many rows with a running top-k merge,
+    # bounding score memory to O(B * (tile + K)); None scores it in one matmul.
+    corpus_tile_size: Optional[int] = None
+    # If set below 1.0, top-k selection uses jax.lax.approx_max_k with this recall.
+    approx_top_k_recall: Optional[float] = None
+
     _initialized: bool = False
 
     def __post_init__(self):
@@ -203,26 +426,32 @@ class PhoenixRetrievalModel(hk.Module):
         output = jnp.dot(input_one_hot, embedding_table)
         return output.astype(self.fprop_dtype)
 
-    def build_user_representation(
+    def _resolve_embeddings(
         self,
         batch: RecsysBatch,
-        recsys_embeddings: RecsysEmbeddings,
-    ) -> Tuple[jax.Array, jax.Array]:
-        """Build user representation from user features and history.
-
-        Uses the Phoenix transformer to encode user + history embeddings
-        into a single user representation vector.
+        recsys_embeddings: Optional[Union[RecsysEmbeddings, ProjectedRecsysEmbeddings]],
+    ) -> Union[RecsysEmbeddings, ProjectedRecsysEmbeddings]:
+        config = self.config
+        if isinstance(recsys_embeddings, ProjectedRecsysEmbeddings):
+            return recsys_embeddings
+        return resolve_recsys_embeddings(
+            batch, recsys_embeddings, config.emb_size, config.device_embeddings
+        )
 
-        Args:
-            batch: RecsysBatch containing hashes, actions, product surfaces
-            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings
+    def build_user_inputs(
+        self,
+        batch: RecsysBatch,
+        recsys_embeddings: Optional[Union[RecsysEmbeddings, ProjectedRecsysEmbeddings]] = None,
+    ) -> Tuple[jax.Array, jax.Array]:
+        """Build the user+history input sequence of the user tower.
 
         Returns:
-            user_representation: L2-normalized user embedding [B, D]
-            user_norm: Pre-normalization L2 norm [B, 1]
+            embeddings: [B, 1 + S, D] user token followed by the history
+            padding_mask: [B, 1 + S] True for valid positions
         """
         config = self.config
         hash_config = config.hash_config
+        recsys_embeddings = self._resolve_embeddings(batch, recsys_embeddings)
 
         history_product_surface_embeddings = self._single_hot_to_embeddings(
             batch.history_product_surface,  # type: ignore
@@ -231,7 +460,8 @@ class PhoenixRetrievalModel(hk.Module):
             "product_surface_embedding_table",
         )
 
-        history_actions_embeddings = self._get_action_embeddings(batch.history_actions)  # type: ignore
+        history_actions = get_history_actions(batch, config.num_actions)
+        history_actions_embeddings = self._get_action_embeddings(history_actions)  # type: ignore
 
         user_embeddings, user_padding_mask = block_user_reduce(
             batch.user_hashes,  # type: ignore
@@ -241,7 +471,10 @@ class PhoenixRetrievalModel(hk.Module):
             1.0,
         )
 
-        history_embeddings, history_padding_mask = block_history_reduce(
+        history_reduce = block_history_reduce
+        if isinstance(recsys_embeddings, ProjectedRecsysEmbeddings):
+            history_reduce = block_history_reduce_projected
+        history_embeddings, history_padding_mask = history_reduce(
             batch.history_post_hashes,  # type: ignore
             recsys_embeddings.history_post_embeddings,  # type: ignore
             recsys_embeddings.history_author_embeddings,  # type: ignore
@@ -254,9 +487,33 @@ class PhoenixRetrievalModel(hk.Module):
 
         embeddings = jnp.concatenate([user_embeddings, history_embeddings], axis=1)
         padding_mask = jnp.concatenate([user_padding_mask, history_padding_mask], axis=1)
+        return embeddings.astype(self.fprop_dtype), padding_mask
+
+    def build_user_representation(
+        self,
+        batch: RecsysBatch,
+        recsys_embeddings: Optional[Union[RecsysEmbeddings, ProjectedRecsysEmbeddings]] = None,
+    ) -> Tuple[jax.Array, jax.Array]:
+        """Build user representation from user features and history.
+
+        Uses the Phoenix transformer to encode user + history embeddings
+        into a single user representation vector.
+
+        Args:
+            batch: RecsysBatch (or CompactRecsysBatch) containing hashes, actions,
+                product surfaces
+            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings,
+                ProjectedRecsysEmbeddings with history post/author parts precomputed
+                through proj_mat_3, or None to gather them from config.device_embeddings
+
+        Returns:
+            user_representation: L2-normalized user embedding [B, D]
+            user_norm: Pre-normalization L2 norm [B, 1]
+        """
+        embeddings, padding_mask = self.build_user_inputs(batch, recsys_embeddings)
 
         model_output = self.model(
-            embeddings.astype(self.fprop_dtype),
+            embeddings,
             padding_mask,
             candidate_start_offset=None,
         )
@@ -267,18 +524,92 @@ class PhoenixRetrievalModel(hk.Module):
         user_embeddings_masked = user_outputs * mask_float
         user_embedding_sum = jnp.sum(user_embeddings_masked, axis=1)  # [B, D]
         mask_sum = jnp.sum(mask_float, axis=1)  # [B, 1]
-        user_representation = user_embedding_sum / jnp.maximum(mask_sum, 1.0)
 
-        user_norm_sq = jnp.sum(user_representation**2, axis=-1, keepdims=True)
-        user_norm = jnp.sqrt(jnp.maximum(user_norm_sq, EPS))
-        user_representation = user_representation / user_norm
+        return normalize_user_representation(user_embedding_sum, mask_sum)
+
+    def extend_user_representation(
+        self,
+        batch: RecsysBatch,
+        recsys_embeddings: Optional[Union[RecsysEmbeddings, ProjectedRecsysEmbeddings]],
+        prefix_kv: Optional[Sequence[Tuple[jax.Array, jax.Array]]],
+        prefix_mask: Optional[jax.Array],
+        prefix_len: jax.Array,
+        num_new: int,
+        prefix_output_sum: Optional[jax.Array] = None,
+    ) -> UserExtendOutput:
+        """Update user representations from a cached user+history prefix.
+
+        User tower attention is causal, so the outputs of the first `prefix_len`
+        positions do not change when events are appended. Their sum is carried in
+        `prefix_output_sum`; only the next `num_new` positions are run through the
+        transformer (attending to the cached keys/values), added to the sum and
+        mean-pooled, matching build_user_representation on the full batch.
+
+        Args:
+            batch: full RecsysBatch, as for build_user_representation
+            recsys_embeddings: embeddings for the full batch
+            prefix_kv: per-layer (key, value) [B, P, num_kv_heads, key_size] of the
+                cached positions, padded to a common P; None when nothing is cached
+            prefix_mask: [B, P] True for cached positions that are valid tokens
+            prefix_len: [B] number of cached sequence positions per user (0 = none)
+            num_new: K, number of positions computed after each user's prefix;
+                must cover the last valid history position of every user
+            prefix_output_sum: [B, D] sum of the transformer outputs over the valid
+                cached positions; None when nothing is cached
 
-        return user_representation, user_norm
+        Returns:
+            UserExtendOutput with the updated representation and output sum
+        """
+        embeddings, padding_mask = self.build_user_inputs(batch, recsys_embeddings)
+        B, T, D = embeddings.shape
+
+        if prefix_output_sum is None:
+            prefix_output_sum = jnp.zeros((B, D), dtype=jnp.float32)
+        prefix_count = jnp.zeros((B, 1), dtype=jnp.float32)
+        if prefix_mask is not None:
+            prefix_count = jnp.sum(prefix_mask, axis=1, keepdims=True).astype(jnp.float32)
+
+        if num_new == 0:
+            user_representation, _ = normalize_user_representation(
+                prefix_output_sum, prefix_count
+            )
+            return UserExtendOutput(
+                user_representation=user_representation,
+                output_sum=prefix_output_sum,
+                layer_kv=[],
+                new_mask=jnp.zeros((B, 0), dtype=jnp.bool_),
+            )
+
+        new_positions = jnp.asarray(prefix_len)[:, None] + jnp.arange(num_new)[None, :]  # [B, K]
+        gather_positions = jnp.minimum(new_positions, T - 1)
+        new_embeddings = jnp.take_along_axis(embeddings, gather_positions[..., None], axis=1)
+        new_mask = jnp.take_along_axis(padding_mask, gather_positions, axis=1) & (new_positions < T)
+
+        model_output = self.model(
+            new_embeddings,
+            new_mask,
+            candidate_start_offset=None,
+            positions=new_positions.astype(jnp.float32),
+            prefix_kv=prefix_kv,
+            prefix_mask=prefix_mask,
+        )
+
+        mask_float = new_mask.astype(jnp.float32)[:, :, None]  # [B, K, 1]
+        output_sum = prefix_output_sum + jnp.sum(model_output.embeddings * mask_float, axis=1)
+        output_count = prefix_count + jnp.sum(mask_float, axis=1)
+        user_representation, _ = normalize_user_representation(output_sum, output_count)
+
+        return UserExtendOutput(
+            user_representation=user_representation,
+            output_sum=output_sum.astype(jnp.float32),
+            layer_kv=list(model_output.layer_kv),  # type: ignore
+            new_mask=new_mask,
+        )
 
     def build_candidate_representation(
         self,
         batch: RecsysBatch,
-        recsys_embeddings: RecsysEmbeddings,
+        recsys_embeddings: Optional[RecsysEmbeddings] = None,
     ) -> Tuple[jax.Array, jax.Array]:
         """Build candidate (item) representations.
 
@@ -287,13 +618,20 @@ class PhoenixRetrievalModel(hk.Module):
 
         Args:
             batch: RecsysBatch containing candidate hashes
-            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings
+            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings,
+                or None to gather them from config.device_embeddings
 
         Returns:
             candidate_representation: L2-normalized candidate embeddings [B, C, D]
             candidate_padding_mask: Valid candidate mask [B, C]
         """
         config = self.config
+        if isinstance(recsys_embeddings, ProjectedRecsysEmbeddings):
+            raise ValueError(
+                "The candidate tower is nonlinear and needs raw RecsysEmbeddings, "
+                "not ProjectedRecsysEmbeddings"
+            )
+        recsys_embeddings = self._resolve_embeddings(batch, recsys_embeddings)
 
         candidate_post_embeddings = recsys_embeddings.candidate_post_embeddings
         candidate_author_embeddings = recsys_embeddings.candidate_author_embeddings
@@ -314,19 +652,22 @@ class PhoenixRetrievalModel(hk.Module):
     def __call__(
         self,
         batch: RecsysBatch,
-        recsys_embeddings: RecsysEmbeddings,
+        recsys_embeddings: Optional[Union[RecsysEmbeddings, ProjectedRecsysEmbeddings]],
         corpus_embeddings: jax.Array,
         top_k: int,
         corpus_mask: Optional[jax.Array] = None,
+        exclusions: Optional[CorpusExclusions] = None,
     ) -> RetrievalOutput:
         """Retrieve top-k candidates from corpus for each user.
 
         Args:
             batch: RecsysBatch containing hashes, actions, product surfaces
-            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings
+            recsys_embeddings: RecsysEmbeddings (or ProjectedRecsysEmbeddings) for the
+                user tower, or None to gather them from config.device_embeddings
             corpus_embeddings: [N, D] normalized corpus candidate embeddings
             top_k: Number of candidates to retrieve
             corpus_mask: [N] optional mask for valid corpus entries
+            exclusions: optional per-user corpus rows and authors to leave out
 
         Returns:
             RetrievalOutput containing user representation and top-k results
@@ -334,7 +675,7 @@ class PhoenixRetrievalModel(hk.Module):
         user_representation, _ = self.build_user_representation(batch, recsys_embeddings)
 
         top_k_indices, top_k_scores = self._retrieve_top_k(
-            user_representation, corpus_embeddings, top_k, corpus_mask
+            user_representation, corpus_embeddings, top_k, corpus_mask, exclusions
         )
 
         return RetrievalOutput(
@@ -349,6 +690,7 @@ class PhoenixRetrievalModel(hk.Module):
         corpus_embeddings: jax.Array,
         top_k: int,
         corpus_mask: Optional[jax.Array] = None,
+        exclusions: Optional[CorpusExclusions] = None,
     ) -> Tuple[jax.Array, jax.Array]:
         """Retrieve top-k candidates from a corpus for each user.
 
@@ -357,16 +699,34 @@ class PhoenixRetrievalModel(hk.Module):
             corpus_embeddings: [N, D] normalized corpus candidate embeddings
             top_k: Number of candidates to retrieve
             corpus_mask: [N] optional mask for valid corpus entries
+            exclusions: optional per-user corpus rows and authors to leave out
 
         Returns:
             top_k_indices: [B, K] indices of top-k candidates
             top_k_scores: [B, K] similarity scores of top-k candidates
         """
+        config = self.config
+        if config.corpus_tile_size is not None:
+            return tiled_top_k(
+                user_representation,
+                corpus_embeddings,
+                top_k,
+                corpus_mask,
+                tile_size=config.corpus_tile_size,
+                recall_target=config.approx_top_k_recall,
+                exclusions=exclusions,
+            )
+
         scores = jnp.matmul(user_representation, corpus_embeddings.T)
 
         if corpus_mask is not None:
             scores = jnp.where(corpus_mask[None, :], scores, -INF)
 
-        top_k_scores, top_k_indices = jax.lax.top_k(scores, top_k)
+        if exclusions is not None:
+            rows = jnp.arange(corpus_embeddings.shape[0])
+            excluded = exclusion_mask(exclusions, rows, exclusions.corpus_authors)
+            scores = jnp.where(excluded, -INF, scores)
+
+        top_k_scores, top_k_indices = _select_top_k(scores, top_k, config.approx_top_k_recall)
 
         return top_k_indices, top_k_scores
@@ -0,0 +1,270 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark approximate corpus indexes against exact retrieval.
+
+Builds a corpus of CandidateTower embeddings and compares, for single-user
+queries, the exact top-k of PhoenixRetrievalModel._retrieve_top_k with the
+HNSW and IVF-PQ indexes, with author-clustered search (top-A authors, then
+their posts) and with exactly rescored int8/bfloat16 corpus scans: recall@K
+against the exact top-K, p50/p99 latency and index (or scanned) size, and
+the throughput of batched searches of B queries per call.
+"""
+
+import dataclasses
+import logging
+import time
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+from corpus_index import AuthorClusteredIndex, HNSWIndex, IVFPQIndex, QuantizedCorpusIndex
+from embedding_store import BFLOAT16, INT8
+from grok import TransformerConfig
+from recsys_model import HashConfig
+from recsys_retrieval_model import PhoenixRetrievalModelConfig
+from run_embedding_quantization_eval import corpus_batch, randomize_zero_init_params
+from runners import (
+    ACTIONS,
+    RecsysRetrievalInferenceRunner,
+    RetrievalModelRunner,
+    create_example_batch,
+)
+
+
+def latency_percentiles(fn, queries: np.ndarray):
+    """Run fn on each query [1, D] separately; returns (results, p50 ms, p99 ms)."""
+    fn(queries[:1])  # warm up
+    latencies, results = [], []
+    for i in range(queries.shape[0]):
+        start = time.perf_counter()
+        results.append(fn(queries[i : i + 1]))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def batched_throughput(fn, queries: np.ndarray, batch_size: int) -> float:
+    """Queries per second of fn over queries split into batches of batch_size."""
+    fn(queries[:batch_size])  # warm up
+    start = time.perf_counter()
+    for i in range(0, queries.shape[0], batch_size):
+        fn(queries[i : i + batch_size])
+    return queries.shape[0] / (time.perf_counter() - start)
+
+
+def make_retriever(emb_size: int, history_seq_len: int) -> RecsysRetrievalInferenceRunner:
+    """An initialized retrieval runner with randomized (non-zero) transformer weights."""
+    hash_config = HashConfig(num_user_hashes=2, num_item_hashes=2, num_author_hashes=2)
+    retriever = RecsysRetrievalInferenceRunner(
+        runner=RetrievalModelRunner(
+            model=PhoenixRetrievalModelConfig(
+                emb_size=emb_size,
+                history_seq_len=history_seq_len,
+                candidate_seq_len=8,
+                hash_config=hash_config,
+                model=TransformerConfig(
+                    emb_size=emb_size,
+                    widening_factor=2,
+                    key_size=64,
+                    num_q_heads=2,
+                    num_kv_heads=2,
+                    num_layers=2,
+                    attn_output_multiplier=0.125,
+                ),
+            ),
+            bs_per_device=0.125,
+        ),
+        name="retrieval",
+    )
+    retriever.initialize()
+    retriever.params = randomize_zero_init_params(retriever.params)
+    return retriever
+
+
+def encode_example_corpus(
+    retriever: RecsysRetrievalInferenceRunner,
+    corpus_size: int,
+    num_queries: int,
+    num_topics: int = 200,
+    num_authors: int = 2000,
+    corpus_chunk: int = 2000,
+    seed: int = 0,
+):
+    """Encode a clustered random corpus and random users with the retriever's towers.
+
+    Returns:
+        corpus: [corpus_size, D] normalized CandidateTower embeddings
+        corpus_authors: [corpus_size] author of each post
+        queries: [num_queries, D] user representations
+    """
+    emb_size = retriever.runner.model.emb_size
+    batch, embeddings = create_example_batch(
+        batch_size=num_queries,
+        emb_size=emb_size,
+        history_len=retriever.runner.model.history_seq_len,
+        num_candidates=8,
+        num_actions=len(ACTIONS),
+    )
+    # Posts are drawn around topic centers and authors post on one topic each,
+    # giving the corpus the cluster structure of real post embeddings.
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(num_topics, 2, emb_size))
+    author_topics = rng.integers(0, num_topics, size=num_authors)
+    authors = topics[author_topics] + 0.5 * rng.normal(size=(num_authors, 2, emb_size))
+    corpus_parts, corpus_authors = [], []
+    for start in range(0, corpus_size, corpus_chunk):
+        chunk_size = min(corpus_chunk, corpus_size - start)
+        hashes = rng.integers(1, 100000, size=(chunk_size, 2)).astype(np.int32)
+        chunk_batch = corpus_batch(hashes, hashes, batch)
+        post_authors = rng.integers(0, num_authors, size=chunk_size)
+        corpus_authors.append(post_authors)
+        posts = topics[author_topics[post_authors]] + rng.normal(size=(chunk_size, 2, emb_size))
+        chunk_embeddings = dataclasses.replace(
+            embeddings,
+            candidate_post_embeddings=posts[None],
+            candidate_author_embeddings=authors[post_authors][None],
+        )
+        corpus_parts.append(
+            np.asarray(retriever.encode_candidates(chunk_batch, chunk_embeddings)[0], np.float32)
+        )
+    queries = np.asarray(retriever.encode_user(batch, embeddings), dtype=np.float32)
+    return np.concatenate(corpus_parts), np.concatenate(corpus_authors), queries
+
+
+def main():
+    emb_size = 128
+    history_seq_len = 32
+    corpus_size = 20000
+    num_queries = 200
+    top_k = 100
+    batch_sizes = (1, 16, 200)
+
+    retriever = make_retriever(emb_size, history_seq_len)
+    corpus, corpus_authors, queries = encode_example_corpus(retriever, corpus_size, num_queries)
+    corpus_device = jnp.asarray(corpus)
+
+    def exact_search(query):
+        indices, _ = retriever.retrieve_for_users_fn(
+            retriever.params, jnp.asarray(query), corpus_device, top_k
+        )
+        return np.asarray(jax.block_until_ready(indices))
+
+    exact, exact_p50, exact_p99 = latency_percentiles(exact_search, queries)
+    exact = np.concatenate(exact)
+
+    def recall(results):
+        results = np.concatenate(results)
+        return np.mean([len(np.intersect1d(r, e)) / top_k for r, e in zip(results, exact)])
+
+    rows = [("exact", "-", 1.0, exact_p50, exact_p99, corpus.nbytes, 0.0)]
+
+    start = time.perf_counter()
+    hnsw = HNSWIndex.build(corpus, max_neighbors=16, ef_construction=128)
+    build_seconds = time.perf_counter() - start
+    for ef_search in (100, 200, 400):
+        results, p50, p99 = latency_percentiles(
+            lambda q: hnsw.search(q, top_k, ef_search=ef_search)[0], queries
+        )
+        rows.append(
+            ("hnsw", f"ef={ef_search}", recall(results), p50, p99, hnsw.nbytes, build_seconds)
+        )
+
+    start = time.perf_counter()
+    ivfpq = IVFPQIndex.build(corpus, num_lists=128, num_subspaces=32, num_codes=256)
+    build_seconds = time.perf_counter() - start
+    batched_rows = []
+    for nprobe in (8, 32):
+        results, p50, p99 = latency_percentiles(
+            lambda q: ivfpq.search(q, top_k, nprobe=nprobe)[0], queries
+        )
+        rows.append(
+            ("ivfpq", f"nprobe={nprobe}", recall(results), p50, p99, ivfpq.nbytes, build_seconds)
+        )
+        batched_rows.append(
+            (
+                "ivfpq",
+                f"nprobe={nprobe}",
+                [
+                    batched_throughput(lambda q: ivfpq.search(q, top_k, nprobe=nprobe), queries, b)
+                    for b in batch_sizes
+                ],
+            )
+        )
+
+    start = time.perf_counter()
+    by_author = AuthorClusteredIndex.build(corpus, corpus_authors)
+    build_seconds = time.perf_counter() - start
+    for shortlist in (20, 50, 200):
+        results, p50, p99 = latency_percentiles(
+            lambda q: by_author.search(q, top_k, num_authors=shortlist)[0], queries
+        )
+        rows.append(
+            (
+                "authors",
+                f"A={shortlist}",
+                recall(results),
+                p50,
+                p99,
+                by_author.nbytes,
+                build_seconds,
+            )
+        )
+        batched_rows.append(
+            (
+                "authors",
+                f"A={shortlist}",
+                [
+                    batched_throughput(
+                        lambda q: by_author.search(q, top_k, num_authors=shortlist), queries, b
+                    )
+                    for b in batch_sizes
+                ],
+            )
+        )
+
+    for dtype in (INT8, BFLOAT16):
+        start = time.perf_counter()
+        quantized = QuantizedCorpusIndex(corpus, dtype)
+        build_seconds = time.perf_counter() - start
+        results, p50, p99 = latency_percentiles(
+            lambda q: quantized.search(q, top_k, oversample=4)[0], queries
+        )
+        rows.append(
+            (dtype, "oversample=4", recall(results), p50, p99, quantized.scan_nbytes, build_seconds)
+        )
+
+    print("=" * 78)
+    print(f"CORPUS INDEX BENCHMARK ({corpus_size} posts, {num_queries} single-user queries)")
+    print("=" * 78)
+    print(
+        f"{'Index':<8} {'Params':<12} {'recall@' + str(top_k):>10} {'p50 ms':>8} {'p99 ms':>8}"
+        f" {'MB':>8} {'build s':>8}"
+    )
+    for name, params, rec, p50, p99, nbytes, build in rows:
+        print(
+            f"{name:<8} {params:<12} {rec:>10.4f} {p50:>8.3f} {p99:>8.3f}"
+            f" {nbytes / 2**20:>8.2f} {build:>8.1f}"
+        )
+
+    print()
+    print("BATCHED SEARCH THROUGHPUT (queries/s)")
+    print(f"{'Index':<8} {'Params':<12}" + "".join(f" {'B=' + str(b):>9}" for b in batch_sizes))
+    for name, params, throughputs in batched_rows:
+        print(f"{name:<8} {params:<12}" + "".join(f" {qps:>9.0f}" for qps in throughputs))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,192 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure the effect of quantized embedding tables on ranking and retrieval outputs.
+
+Compares float32 tables against bfloat16 and int8 (per-row scale) tables:
+- Ranking: difference in per-action logits and probabilities of the ranker
+- Retrieval: recall@K of the quantized top-K against the float32 top-K
+"""
+
+import logging
+import os
+import tempfile
+
+import jax
+import numpy as np
+
+from embedding_store import BFLOAT16, INT8, EmbeddingTableStore, quantize_store
+from grok import TransformerConfig
+from recsys_model import HashConfig, PhoenixModelConfig, RecsysBatch
+from recsys_retrieval_model import PhoenixRetrievalModelConfig
+from runners import (
+    ACTIONS,
+    ModelRunner,
+    RecsysInferenceRunner,
+    RecsysRetrievalInferenceRunner,
+    RetrievalModelRunner,
+    create_example_batch,
+)
+
+
+def corpus_batch(post_hashes: np.ndarray, author_hashes: np.ndarray, template: RecsysBatch):
+    """Wrap corpus post/author hashes [N, H] as the candidates of a single-user batch."""
+    n = post_hashes.shape[0]
+    return template._replace(
+        candidate_post_hashes=post_hashes[None],
+        candidate_author_hashes=author_hashes[None],
+        candidate_product_surface=np.zeros((1, n), dtype=np.int32),
+    )
+
+
+def randomize_zero_init_params(params, seed: int = 0):
+    """Replace zero-initialized weights with random ones so embeddings reach the outputs.
+
+    The transformer linears and norm scales are initialized to zero, which makes a
+    freshly initialized ranker emit constant logits regardless of its inputs.
+    Norm scales are set to 1 and linear weights drawn from N(0, 1 / fan_in).
+    """
+    rng = np.random.default_rng(seed)
+
+    def randomize(path, value):
+        name = jax.tree_util.keystr(path)
+        value = np.asarray(value)
+        if "scale" in name:
+            return np.ones_like(value)
+        if name.endswith("['w']"):
+            return (rng.normal(size=value.shape) / np.sqrt(value.shape[0])).astype(value.dtype)
+        return value
+
+    return jax.tree_util.tree_map_with_path(randomize, params)
+
+
+def main():
+    emb_size = 128
+    num_actions = len(ACTIONS)
+    history_seq_len = 32
+    candidate_seq_len = 8
+    num_rows = 20000
+    batch_size = 16
+    corpus_size = 2000
+    top_k = 100
+
+    hash_config = HashConfig(num_user_hashes=2, num_item_hashes=2, num_author_hashes=2)
+    transformer = TransformerConfig(
+        emb_size=emb_size,
+        widening_factor=2,
+        key_size=64,
+        num_q_heads=2,
+        num_kv_heads=2,
+        num_layers=2,
+        attn_output_multiplier=0.125,
+    )
+
+    ranker = RecsysInferenceRunner(
+        runner=ModelRunner(
+            model=PhoenixModelConfig(
+                emb_size=emb_size,
+                num_actions=num_actions,
+                history_seq_len=history_seq_len,
+                candidate_seq_len=candidate_seq_len,
+                hash_config=hash_config,
+                model=transformer,
+            ),
+            bs_per_device=0.125,
+        ),
+        name="ranker",
+    )
+    retriever = RecsysRetrievalInferenceRunner(
+        runner=RetrievalModelRunner(
+            model=PhoenixRetrievalModelConfig(
+                emb_size=emb_size,
+                history_seq_len=history_seq_len,
+                candidate_seq_len=candidate_seq_len,
+                hash_config=hash_config,
+                model=transformer,
+            ),
+            bs_per_device=0.125,
+        ),
+        name="retrieval",
+    )
+    ranker.initialize()
+    retriever.initialize()
+    ranker.params = randomize_zero_init_params(ranker.params, seed=0)
+    retriever.params = randomize_zero_init_params(retriever.params, seed=1)
+
+    batch, _ = create_example_batch(
+        batch_size=batch_size,
+        emb_size=emb_size,
+        history_len=history_seq_len,
+        num_candidates=candidate_seq_len,
+        num_actions=num_actions,
+        num_user_hashes=hash_config.num_user_hashes,
+        num_item_hashes=hash_config.num_item_hashes,
+        num_author_hashes=hash_config.num_author_hashes,
+        num_user_embeddings=num_rows,
+        num_post_embeddings=num_rows,
+        num_author_embeddings=num_rows,
+    )
+    rng = np.random.default_rng(0)
+    corpus_post_hashes = rng.integers(1, num_rows, size=(corpus_size, 2)).astype(np.int32)
+    corpus_author_hashes = rng.integers(1, num_rows, size=(corpus_size, 2)).astype(np.int32)
+    corpus = corpus_batch(corpus_post_hashes, corpus_author_hashes, batch)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fp32_dir = os.path.join(tmpdir, "fp32")
+        store = EmbeddingTableStore.create(
+            fp32_dir, hash_config, emb_size, num_rows, num_rows, num_rows
+        )
+        for table in (store.user_table, store.post_table, store.author_table):
+            table.table[:] = rng.normal(size=table.table.shape)  # type: ignore
+            table.table.flush()  # type: ignore
+
+        stores = {"float32": EmbeddingTableStore.open(fp32_dir, hash_config)}
+        for dtype in (BFLOAT16, INT8):
+            quantize_store(fp32_dir, os.path.join(tmpdir, dtype), dtype)
+            stores[dtype] = EmbeddingTableStore.open(os.path.join(tmpdir, dtype), hash_config)
+
+        results = {}
+        for name, table_store in stores.items():
+            embeddings = table_store.lookup(batch)
+            logits = ranker.runner.forward.apply(ranker.params, None, batch, embeddings).logits
+            user_rep = np.asarray(retriever.encode_user(batch, embeddings), dtype=np.float32)
+            corpus_rep = np.asarray(
+                retriever.encode_candidates(corpus, table_store.lookup(corpus))[0],
+                dtype=np.float32,
+            )
+            top = np.argsort(-(user_rep @ corpus_rep.T), axis=-1)[:, :top_k]
+            results[name] = (np.asarray(logits, dtype=np.float32), top)
+            table_store.close()
+
+    reference_logits, reference_top = results["float32"]
+    reference_probs = 1.0 / (1.0 + np.exp(-reference_logits))
+
+    print("=" * 70)
+    print("EMBEDDING TABLE QUANTIZATION QUALITY")
+    print("=" * 70)
+    print(f"{'Table dtype':<12} {'max |dlogit|':>14} {'mean |dlogit|':>14} {'max |dprob|':>12}"
+          f" {'recall@' + str(top_k):>11}")
+    for name, (logits, top) in results.items():
+        dlogit = np.abs(logits - reference_logits)
+        dprob = np.abs(1.0 / (1.0 + np.exp(-logits)) - reference_probs)
+        recall = np.mean(
+            [len(np.intersect1d(top[b], reference_top[b])) / top_k for b in range(batch_size)]
+        )
+        print(f"{name:<12} {dlogit.max():>14.5f} {dlogit.mean():>14.5f} {dprob.max():>12.5f}"
+              f" {recall:>11.4f}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,70 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure the recall lost by a truncated-dimension first retrieval pass.
+
+Encodes a corpus with the CandidateTower and, for each prefix dimension d' and
+shortlist oversampling m, compares the top-K of TruncatedCorpusIndex (first
+pass on the renormalized first d' dimensions, rescoring of K * m candidates at
+full D) with the exact top-K: recall@K, p50 single-query latency and the bytes
+read by the first pass. Choose the smallest d' whose recall is acceptable.
+"""
+
+import logging
+
+import numpy as np
+
+from corpus_index import ExactIndex, TruncatedCorpusIndex
+from run_corpus_index_benchmark import encode_example_corpus, latency_percentiles, make_retriever
+
+
+def main():
+    emb_size = 128
+    history_seq_len = 32
+    corpus_size = 20000
+    num_queries = 200
+    top_k = 100
+    prefix_dims = (8, 16, 32, 64, 128)
+    oversamples = (1, 2, 4, 8)
+
+    retriever = make_retriever(emb_size, history_seq_len)
+    corpus, _, queries = encode_example_corpus(retriever, corpus_size, num_queries)
+    exact, _ = ExactIndex(corpus).search(queries, top_k)
+
+    print("=" * 66)
+    print(f"TRUNCATED-DIMENSION FIRST PASS ({corpus_size} posts, D={emb_size}, K={top_k})")
+    print("=" * 66)
+    print(
+        f"{'d_prime':>8} {'oversample':>10} {'recall@' + str(top_k):>11} {'p50 ms':>8}"
+        f" {'scan MB':>8}"
+    )
+    for prefix_dim in prefix_dims:
+        index = TruncatedCorpusIndex(corpus, prefix_dim)
+        for oversample in oversamples:
+            results, p50, _ = latency_percentiles(
+                lambda q: index.search(q, top_k, oversample=oversample)[0], queries
+            )
+            results = np.concatenate(results)
+            recall = np.mean(
+                [len(np.intersect1d(r, e)) / top_k for r, e in zip(results, exact)]
+            )
+            print(
+                f"{prefix_dim:>8} {oversample:>10} {recall:>11.4f} {p50:>8.3f}"
+                f" {index.scan_nbytes / 2**20:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -15,24 +15,44 @@
 
 import functools
 import logging
+import math
+import os
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any, List, NamedTuple, Optional, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
 import haiku as hk
 import jax
 import jax.numpy as jnp
 import numpy as np
 
+from corpus_index import (
+    AuthorClusteredIndex,
+    CorpusIndex,
+    MemmapCorpusIndex,
+    QuantizedCorpusIndex,
+    TruncatedCorpusIndex,
+)
+from corpus_sharding import ShardedCorpus, make_sharded_top_k, shard_corpus
 from grok import TrainingState
-from recsys_retrieval_model import PhoenixRetrievalModelConfig
+from mutable_corpus import MutableCorpus, TimePartitionedCorpus
+from prefix_cache import PrefixCache
+from recsys_retrieval_model import (
+    CorpusExclusions,
+    PhoenixRetrievalModelConfig,
+    UserExtendOutput,
+    mmr_select,
+)
 from recsys_retrieval_model import RetrievalOutput as ModelRetrievalOutput
 
 from recsys_model import (
     PhoenixModelConfig,
+    PrefixExtendOutput,
     RecsysBatch,
     RecsysEmbeddings,
     RecsysModelOutput,
+    check_hash_ranges,
+    set_device_embedding_tables,
 )
 
 rank_logger = logging.getLogger("rank")
@@ -182,9 +202,14 @@ class BaseInferenceRunner(ABC):
             batch_size=batch_size,
         )
 
-    def create_dummy_embeddings(self, batch_size: int = 1) -> RecsysEmbeddings:
-        """Create dummy embeddings for initialization."""
+    def create_dummy_embeddings(self, batch_size: int = 1) -> Optional[RecsysEmbeddings]:
+        """Create dummy embeddings for initialization.
+
+        Returns None when the model gathers embeddings from device-resident tables.
+        """
         model_config = self.runner.model
+        if model_config.device_embeddings is not None:
+            return None
         return create_dummy_embeddings_from_config(
             hash_config=model_config.hash_config,
             emb_size=model_config.emb_size,
@@ -198,6 +223,36 @@ class BaseInferenceRunner(ABC):
         """Initialize the inference runner. Must be implemented by subclasses."""
         pass
 
+    def set_device_embedding_tables(
+        self,
+        user_table: Optional[Any] = None,
+        post_table: Optional[Any] = None,
+        author_table: Optional[Any] = None,
+    ):
+        """Load host embedding tables into the device-resident table parameters.
+
+        Only valid when the model config sets device_embeddings. Tables are
+        cast to the configured parameter dtype.
+
+        Args:
+            user_table: [num_user_embeddings, D] table, or None to keep the current one
+            post_table: [num_post_embeddings, D] table, or None to keep the current one
+            author_table: [num_author_embeddings, D] table, or None to keep the current one
+        """
+        if self.runner.model.device_embeddings is None:
+            raise ValueError(f"{self.name}: model has no device_embeddings configured")
+        self.params = set_device_embedding_tables(
+            self.params, user_table, post_table, author_table
+        )
+
+    def _check_hash_ranges(
+        self, batch: RecsysBatch, recsys_embeddings: Optional[RecsysEmbeddings]
+    ):
+        """Validate hashes on the host before they index the device tables."""
+        device_embeddings = self.runner.model.device_embeddings
+        if recsys_embeddings is None and device_embeddings is not None:
+            check_hash_ranges(batch, device_embeddings)
+
 
 ACTIONS: List[str] = [
     "favorite_score",
@@ -274,14 +329,14 @@ class ModelRunner(BaseModelRunner):
         return "ranking model"
 
     def make_forward_fn(self):  # type: ignore
-        def forward(batch: RecsysBatch, recsys_embeddings: RecsysEmbeddings):
+        def forward(batch: RecsysBatch, recsys_embeddings: Optional[RecsysEmbeddings]):
             out = self.model.make()(batch, recsys_embeddings)
             return out
 
         return hk.transform(forward)
 
     def init(
-        self, rng: jax.Array, data: RecsysBatch, embeddings: RecsysEmbeddings
+        self, rng: jax.Array, data: RecsysBatch, embeddings: Optional[RecsysEmbeddings]
     ) -> TrainingState:
         assert self.forward is not None
         rng, init_rng = jax.random.split(rng)
@@ -291,22 +346,62 @@ class ModelRunner(BaseModelRunner):
     def load_or_init(
         self,
         init_data: RecsysBatch,
-        init_embeddings: RecsysEmbeddings,
+        init_embeddings: Optional[RecsysEmbeddings],
     ):
         rng = jax.random.PRNGKey(self.rng_seed)
         state = self.init(rng, init_data, init_embeddings)
         return state
 
 
+def ranking_output_from_logits(logits: jax.Array) -> RankingOutput:
+    """Convert [B, C, num_actions] logits into a RankingOutput."""
+    probs = jax.nn.sigmoid(logits)
+
+    primary_scores = probs[:, :, 0]
+
+    ranked_indices = jnp.argsort(-primary_scores, axis=-1)
+
+    return RankingOutput(
+        scores=probs,
+        ranked_indices=ranked_indices,
+        p_favorite_score=probs[:, :, 0],
+        p_reply_score=probs[:, :, 1],
+        p_repost_score=probs[:, :, 2],
+        p_photo_expand_score=probs[:, :, 3],
+        p_click_score=probs[:, :, 4],
+        p_profile_click_score=probs[:, :, 5],
+        p_vqv_score=probs[:, :, 6],
+        p_share_score=probs[:, :, 7],
+        p_share_via_dm_score=probs[:, :, 8],
+        p_share_via_copy_link_score=probs[:, :, 9],
+        p_dwell_score=probs[:, :, 10],
+        p_quote_score=probs[:, :, 11],
+        p_quoted_click_score=probs[:, :, 12],
+        p_follow_author_score=probs[:, :, 13],
+        p_not_interested_score=probs[:, :, 14],
+        p_block_author_score=probs[:, :, 15],
+        p_mute_author_score=probs[:, :, 16],
+        p_report_score=probs[:, :, 17],
+        p_dwell_time=probs[:, :, 18],
+    )
+
+
 @dataclass
 class RecsysInferenceRunner(BaseInferenceRunner):
-    """Inference runner for the recommendation ranking model."""
+    """Inference runner for the recommendation ranking model.
+
+    Args:
+        runner: model runner holding the ranking model config
+        name: runner name used in logs
+        prefix_cache: optional cross-request cache of user+history keys/values
+    """
 
     _runner: ModelRunner
 
-    def __init__(self, runner: ModelRunner, name: str):
+    def __init__(self, runner: ModelRunner, name: str, prefix_cache: Optional[PrefixCache] = None):
         self.name = name
         self._runner = runner
+        self.prefix_cache = prefix_cache
 
     @property
     def runner(self) -> ModelRunner:
@@ -329,61 +424,78 @@ class RecsysInferenceRunner(BaseInferenceRunner):
             return runner.model.make()
 
         def hk_forward(
-            batch: RecsysBatch, recsys_embeddings: RecsysEmbeddings
+            batch: RecsysBatch, recsys_embeddings: Optional[RecsysEmbeddings]
         ) -> RecsysModelOutput:
             return model()(batch, recsys_embeddings)
 
         def hk_rank_candidates(
-            batch: RecsysBatch, recsys_embeddings: RecsysEmbeddings
+            batch: RecsysBatch, recsys_embeddings: Optional[RecsysEmbeddings]
         ) -> RankingOutput:
             """Rank candidates by their predicted engagement scores."""
             output = hk_forward(batch, recsys_embeddings)
-            logits = output.logits
-
-            probs = jax.nn.sigmoid(logits)
-
-            primary_scores = probs[:, :, 0]
-
-            ranked_indices = jnp.argsort(-primary_scores, axis=-1)
-
-            return RankingOutput(
-                scores=probs,
-                ranked_indices=ranked_indices,
-                p_favorite_score=probs[:, :, 0],
-                p_reply_score=probs[:, :, 1],
-                p_repost_score=probs[:, :, 2],
-                p_photo_expand_score=probs[:, :, 3],
-                p_click_score=probs[:, :, 4],
-                p_profile_click_score=probs[:, :, 5],
-                p_vqv_score=probs[:, :, 6],
-                p_share_score=probs[:, :, 7],
-                p_share_via_dm_score=probs[:, :, 8],
-                p_share_via_copy_link_score=probs[:, :, 9],
-                p_dwell_score=probs[:, :, 10],
-                p_quote_score=probs[:, :, 11],
-                p_quoted_click_score=probs[:, :, 12],
-                p_follow_author_score=probs[:, :, 13],
-                p_not_interested_score=probs[:, :, 14],
-                p_block_author_score=probs[:, :, 15],
-                p_mute_author_score=probs[:, :, 16],
-                p_report_score=probs[:, :, 17],
-                p_dwell_time=probs[:, :, 18],
+            return ranking_output_from_logits(output.logits)
+
+        def hk_extend(
+            batch: RecsysBatch,
+            recsys_embeddings: Optional[RecsysEmbeddings],
+            prefix_kv,
+            prefix_mask,
+            prefix_len,
+            num_new: int,
+        ) -> PrefixExtendOutput:
+            return model().extend(
+                batch, recsys_embeddings, prefix_kv, prefix_mask, prefix_len, num_new
             )
 
         rank_ = hk.without_apply_rng(hk.transform(hk_rank_candidates))
-        self.rank_candidates = rank_.apply
+        self.rank_candidates = jax.jit(rank_.apply)
 
-    def rank(self, batch: RecsysBatch, recsys_embeddings: RecsysEmbeddings) -> RankingOutput:
+        extend_ = hk.without_apply_rng(hk.transform(hk_extend))
+        # num_new is static; prefix_kv / prefix_mask are padded by the
+        # PrefixCache to bucketed widths, so history lengths within one bucket
+        # reuse one compilation.
+        self.extend_fn = jax.jit(extend_.apply, static_argnums=6)
+
+        if self.prefix_cache is not None:
+            self.prefix_cache.clear()
+
+    def set_device_embedding_tables(self, *args, **kwargs):
+        super().set_device_embedding_tables(*args, **kwargs)
+        if self.prefix_cache is not None:
+            self.prefix_cache.clear()
+
+    def rank(
+        self, batch: RecsysBatch, recsys_embeddings: Optional[RecsysEmbeddings] = None
+    ) -> RankingOutput:
         """Rank candidates for the given batch.
 
+        With a prefix_cache, the user+history keys/values of returning users are
+        reused and only their new history events and the candidates are computed.
+
         Args:
             batch: RecsysBatch containing hashes, actions, product surfaces
-            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings
+            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings,
+                or None when the model uses device-resident embedding tables
 
         Returns:
             RankingOutput with scores and ranked indices
         """
-        return self.rank_candidates(self.params, batch, recsys_embeddings)
+        self._check_hash_ranges(batch, recsys_embeddings)
+        if self.prefix_cache is None:
+            return self.rank_candidates(self.params, batch, recsys_embeddings)
+
+        plan = self.prefix_cache.prepare(batch)
+        output = self.extend_fn(
+            self.params,
+            batch,
+            recsys_embeddings,
+            plan.prefix_kv,
+            plan.prefix_mask,
+            plan.prefix_len,
+            plan.num_new,
+        )
+        self.prefix_cache.update(batch, plan, output)
+        return ranking_output_from_logits(output.logits)
 
 
 def create_example_batch(
@@ -499,6 +611,41 @@ class RetrievalOutput(NamedTuple):
 
     top_k_scores: jax.Array
 
+    # Post IDs of the top-k candidates (-1 for padding), when retrieving from
+    # the corpus set with set_corpus.
+    top_k_post_ids: Optional[np.ndarray] = None
+
+
+def lookup_post_ids(corpus_post_ids: np.ndarray, top_k_indices: jax.Array) -> np.ndarray:
+    """Map top-k corpus row indices [B, K] to post IDs, -1 for padding results."""
+    indices = np.asarray(top_k_indices)
+    valid = (indices >= 0) & (indices < corpus_post_ids.shape[0])
+    return np.where(valid, corpus_post_ids[np.where(valid, indices, 0)], -1)
+
+
+def pack_sorted_sets(sets: Sequence[np.ndarray]) -> np.ndarray:
+    """Pack per-user int sets into a sorted [B, W] int32 array left-padded with -1.
+
+    W is rounded up to a power of two so that jitted retrieval recompiles only
+    when the largest set doubles.
+    """
+    sets = [np.unique(np.asarray(values, dtype=np.int32)) for values in sets]
+    longest = max((values.shape[0] for values in sets), default=0)
+    width = 1 << (longest - 1).bit_length() if longest else 0
+    packed = np.full((len(sets), width), -1, dtype=np.int32)
+    for i, values in enumerate(sets):
+        packed[i, width - values.shape[0] :] = values
+    return packed
+
+
+def _lookup_sorted(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Positions of values in sorted_values, dropping values that are absent."""
+    values = np.asarray(values, dtype=sorted_values.dtype)
+    if not len(sorted_values):
+        return np.zeros(0, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return positions[sorted_values[positions] == values]
+
 
 @dataclass
 class RetrievalModelRunner(BaseModelRunner):
@@ -527,7 +674,7 @@ class RetrievalModelRunner(BaseModelRunner):
     def make_forward_fn(self):  # type: ignore
         def forward(
             batch: RecsysBatch,
-            recsys_embeddings: RecsysEmbeddings,
+            recsys_embeddings: Optional[RecsysEmbeddings],
             corpus_embeddings: jax.Array,
             top_k: int,
         ) -> ModelRetrievalOutput:
@@ -543,7 +690,7 @@ class RetrievalModelRunner(BaseModelRunner):
         self,
         rng: jax.Array,
         data: RecsysBatch,
-        embeddings: RecsysEmbeddings,
+        embeddings: Optional[RecsysEmbeddings],
         corpus_embeddings: jax.Array,
         top_k: int,
     ) -> TrainingState:
@@ -555,7 +702,7 @@ class RetrievalModelRunner(BaseModelRunner):
     def load_or_init(
         self,
         init_data: RecsysBatch,
-        init_embeddings: RecsysEmbeddings,
+        init_embeddings: Optional[RecsysEmbeddings],
         corpus_embeddings: jax.Array,
         top_k: int,
     ):
@@ -572,18 +719,39 @@ class RecsysRetrievalInferenceRunner(BaseInferenceRunner):
     1. Encoding users to get user representations
     2. Encoding candidates to get candidate embeddings
     3. Retrieving top-k candidates from a corpus
+
+    Args:
+        runner: model runner holding the retrieval model config
+        name: runner name used in logs
+        prefix_cache: optional cross-request cache of each user's user+history
+            keys/values and pooled output sum; user representations of returning
+            users are then updated incrementally as events are appended
     """
 
     _runner: RetrievalModelRunner = None  # type: ignore
 
     corpus_embeddings: jax.Array | None = None
-    corpus_post_ids: jax.Array | None = None
+    corpus_post_ids: np.ndarray | None = None
+    corpus_index: CorpusIndex | None = None
+    sharded_corpus: ShardedCorpus | None = None
+    mutable_corpus: MutableCorpus | TimePartitionedCorpus | None = None
 
-    def __init__(self, runner: RetrievalModelRunner, name: str):
+    def __init__(
+        self,
+        runner: RetrievalModelRunner,
+        name: str,
+        prefix_cache: Optional[PrefixCache] = None,
+    ):
         self.name = name
         self._runner = runner
+        self.prefix_cache = prefix_cache
         self.corpus_embeddings = None
         self.corpus_post_ids = None
+        self.corpus_index = None
+        self.sharded_corpus = None
+        self.mutable_corpus = None
+        self.corpus_author_ids = None
+        self._post_id_order = None
 
     @property
     def runner(self) -> RetrievalModelRunner:
@@ -607,14 +775,16 @@ class RecsysRetrievalInferenceRunner(BaseInferenceRunner):
         def model():
             return runner.model.make()
 
-        def hk_encode_user(batch: RecsysBatch, recsys_embeddings: RecsysEmbeddings) -> jax.Array:
+        def hk_encode_user(
+            batch: RecsysBatch, recsys_embeddings: Optional[RecsysEmbeddings]
+        ) -> jax.Array:
             """Encode user to get user representation."""
             m = model()
             user_rep, _ = m.build_user_representation(batch, recsys_embeddings)
             return user_rep
 
         def hk_encode_candidates(
-            batch: RecsysBatch, recsys_embeddings: RecsysEmbeddings
+            batch: RecsysBatch, recsys_embeddings: Optional[RecsysEmbeddings]
         ) -> jax.Array:
             """Encode candidates to get candidate representations."""
             m = model()
@@ -623,84 +793,476 @@ class RecsysRetrievalInferenceRunner(BaseInferenceRunner):
 
         def hk_retrieve(
             batch: RecsysBatch,
-            recsys_embeddings: RecsysEmbeddings,
+            recsys_embeddings: Optional[RecsysEmbeddings],
             corpus_embeddings: jax.Array,
             top_k: int,
+            exclusions: Optional[CorpusExclusions] = None,
         ) -> "RetrievalOutput":
             """Retrieve top-k candidates from corpus."""
             m = model()
-            return m(batch, recsys_embeddings, corpus_embeddings, top_k)
+            return m(batch, recsys_embeddings, corpus_embeddings, top_k, exclusions=exclusions)
+
+        def hk_extend_user(
+            batch: RecsysBatch,
+            recsys_embeddings: Optional[RecsysEmbeddings],
+            prefix_kv,
+            prefix_mask,
+            prefix_len,
+            num_new: int,
+            prefix_output_sum,
+        ) -> UserExtendOutput:
+            """Update user representations from cached user+history prefixes."""
+            return model().extend_user_representation(
+                batch,
+                recsys_embeddings,
+                prefix_kv,
+                prefix_mask,
+                prefix_len,
+                num_new,
+                prefix_output_sum,
+            )
+
+        def hk_retrieve_for_users(
+            user_representation: jax.Array,
+            corpus_embeddings: jax.Array,
+            top_k: int,
+            corpus_mask: Optional[jax.Array] = None,
+            exclusions: Optional[CorpusExclusions] = None,
+        ) -> Tuple[jax.Array, jax.Array]:
+            """Retrieve top-k candidates for precomputed user representations."""
+            return model()._retrieve_top_k(
+                user_representation, corpus_embeddings, top_k, corpus_mask, exclusions
+            )
 
         encode_user_ = hk.without_apply_rng(hk.transform(hk_encode_user))
         encode_candidates_ = hk.without_apply_rng(hk.transform(hk_encode_candidates))
         retrieve_ = hk.without_apply_rng(hk.transform(hk_retrieve))
+        extend_user_ = hk.without_apply_rng(hk.transform(hk_extend_user))
+        retrieve_for_users_ = hk.without_apply_rng(hk.transform(hk_retrieve_for_users))
 
         self.encode_user_fn = encode_user_.apply
         self.encode_candidates_fn = encode_candidates_.apply
-        self.retrieve_fn = retrieve_.apply
+        # top_k is static; exclusion arrays are traced, so exclusion sets
+        # padded to the same power-of-two width reuse one compilation.
+        self.retrieve_fn = jax.jit(retrieve_.apply, static_argnums=4)
+        # num_new is static; the PrefixCache pads prefixes to bucketed widths.
+        self.extend_user_fn = jax.jit(extend_user_.apply, static_argnums=6)
+        self.retrieve_for_users_fn = jax.jit(retrieve_for_users_.apply, static_argnums=3)
+
+        if self.prefix_cache is not None:
+            self.prefix_cache.clear()
+
+    def set_device_embedding_tables(self, *args, **kwargs):
+        super().set_device_embedding_tables(*args, **kwargs)
+        if self.prefix_cache is not None:
+            self.prefix_cache.clear()
+
+    def _encode_user_incremental(
+        self, batch: RecsysBatch, recsys_embeddings: Optional[RecsysEmbeddings]
+    ) -> jax.Array:
+        assert self.prefix_cache is not None
+        plan = self.prefix_cache.prepare(batch)
+        output = self.extend_user_fn(
+            self.params,
+            batch,
+            recsys_embeddings,
+            plan.prefix_kv,
+            plan.prefix_mask,
+            plan.prefix_len,
+            plan.num_new,
+            plan.prefix_output_sum,
+        )
+        self.prefix_cache.update(batch, plan, output)
+        return output.user_representation
 
-    def encode_user(self, batch: RecsysBatch, recsys_embeddings: RecsysEmbeddings) -> jax.Array:
+    def encode_user(
+        self, batch: RecsysBatch, recsys_embeddings: Optional[RecsysEmbeddings] = None
+    ) -> jax.Array:
         """Encode users to get user representations.
 
+        With a prefix_cache, returning users' representations are updated from
+        their cached output sum and keys/values; only new history events are
+        run through the transformer.
+
         Args:
             batch: RecsysBatch containing user and history information
-            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings
+            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings,
+                or None when the model uses device-resident embedding tables
 
         Returns:
             User representations [B, D]
         """
+        self._check_hash_ranges(batch, recsys_embeddings)
+        if self.prefix_cache is not None:
+            return self._encode_user_incremental(batch, recsys_embeddings)
         return self.encode_user_fn(self.params, batch, recsys_embeddings)
 
     def encode_candidates(
-        self, batch: RecsysBatch, recsys_embeddings: RecsysEmbeddings
+        self, batch: RecsysBatch, recsys_embeddings: Optional[RecsysEmbeddings] = None
     ) -> jax.Array:
         """Encode candidates to get candidate representations.
 
         Args:
             batch: RecsysBatch containing candidate information
-            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings
+            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings,
+                or None when the model uses device-resident embedding tables
 
         Returns:
             Candidate representations [B, C, D]
         """
+        self._check_hash_ranges(batch, recsys_embeddings)
         return self.encode_candidates_fn(self.params, batch, recsys_embeddings)
 
     def set_corpus(
         self,
-        corpus_embeddings: jax.Array,
-        corpus_post_ids: jax.Array,
+        corpus_embeddings: jax.Array | str | os.PathLike | MutableCorpus | TimePartitionedCorpus,
+        corpus_post_ids: jax.Array | str | os.PathLike | None,
+        index: Optional[CorpusIndex] = None,
+        corpus_dtype: Optional[str] = None,
+        shard_across_devices: bool = False,
+        corpus_author_ids: Optional[np.ndarray] = None,
+        cluster_by_author: bool = False,
+        corpus_prefix_dim: Optional[int] = None,
     ):
         """Set the corpus embeddings for retrieval.
 
         Args:
-            corpus_embeddings: Pre-computed candidate embeddings [N, D]
-            corpus_post_ids: Optional post IDs corresponding to embeddings [N]
+            corpus_embeddings: Pre-computed candidate embeddings [N, D], or the
+                path of an [N, D] .npy file to memory-map; retrieve() then
+                streams the file from disk (MemmapCorpusIndex, tuned with
+                index_params={"chunk_rows": n}). A MutableCorpus or
+                TimePartitionedCorpus (with corpus_post_ids None) is served from
+                a fresh snapshot per retrieve() call, so appends and deletes
+                apply while serving
+            corpus_post_ids: Optional post IDs corresponding to embeddings [N],
+                or the path of an [N] .npy file to memory-map
+            index: Optional approximate nearest neighbor index built over
+                corpus_embeddings (e.g. IVFPQIndex); retrieve() then searches the
+                index instead of scoring the full corpus
+            corpus_dtype: Optional "int8" or "bfloat16"; scan a low-precision
+                copy of the corpus and rescore an oversampled shortlist exactly
+                (QuantizedCorpusIndex, tuned with index_params={"oversample": m})
+            shard_across_devices: Partition the corpus along N across all local
+                devices; each device retrieves a local top-k from its shard and
+                the shards' candidates are merged into the global top-k
+            corpus_author_ids: Optional author ID of each corpus entry [N], needed
+                to exclude authors in retrieve()
+            cluster_by_author: Group the corpus by corpus_author_ids; retrieve()
+                then scores author centroids, shortlists the best authors and
+                scores only their posts (AuthorClusteredIndex, tuned with
+                index_params={"num_authors": A})
+            corpus_prefix_dim: Optional number of leading dimensions d' to score
+                the renormalized corpus with first; an oversampled shortlist is
+                rescored at full D (TruncatedCorpusIndex, tuned with
+                index_params={"oversample": m})
         """
-        self.corpus_embeddings = corpus_embeddings
-        self.corpus_post_ids = corpus_post_ids
+        if isinstance(corpus_embeddings, (MutableCorpus, TimePartitionedCorpus)):
+            if (
+                corpus_post_ids is not None
+                or index is not None
+                or corpus_dtype is not None
+                or corpus_prefix_dim is not None
+                or cluster_by_author
+            ):
+                raise ValueError("A MutableCorpus holds its own post IDs and index")
+            if shard_across_devices:
+                raise ValueError("A MutableCorpus cannot be sharded")
+            self.corpus_embeddings = None
+            self.corpus_post_ids = None
+            self.corpus_index = None
+            self.sharded_corpus = None
+            self.corpus_author_ids = None
+            self.mutable_corpus = corpus_embeddings
+            return
+        self.mutable_corpus = None
+
+        if isinstance(corpus_embeddings, (str, os.PathLike)):
+            if (
+                index is not None
+                or corpus_dtype is not None
+                or corpus_prefix_dim is not None
+                or cluster_by_author
+                or shard_across_devices
+            ):
+                raise ValueError("A memory-mapped corpus is always scanned from disk")
+            index = MemmapCorpusIndex(corpus_embeddings)
+            corpus_embeddings = None
+        if isinstance(corpus_post_ids, (str, os.PathLike)):
+            corpus_post_ids = np.load(corpus_post_ids, mmap_mode="r")
+
+        if corpus_dtype is not None:
+            if index is not None:
+                raise ValueError("Pass either index or corpus_dtype, not both")
+            index = QuantizedCorpusIndex(np.asarray(corpus_embeddings), corpus_dtype)
+        if cluster_by_author:
+            if index is not None:
+                raise ValueError("cluster_by_author cannot be combined with another index")
+            if corpus_author_ids is None:
+                raise ValueError("cluster_by_author needs corpus_author_ids")
+            index = AuthorClusteredIndex.build(np.asarray(corpus_embeddings), corpus_author_ids)
+        if corpus_prefix_dim is not None:
+            if index is not None:
+                raise ValueError("corpus_prefix_dim cannot be combined with another index")
+            index = TruncatedCorpusIndex(np.asarray(corpus_embeddings), corpus_prefix_dim)
+        corpus_size = index.size if corpus_embeddings is None else corpus_embeddings.shape[0]
+        if index is not None and index.size != corpus_size:
+            raise ValueError(f"Index size ({index.size}) does not match the corpus ({corpus_size})")
+        if shard_across_devices and index is not None:
+            raise ValueError("A sharded corpus cannot be combined with an index")
+        if corpus_post_ids is not None and len(corpus_post_ids) != corpus_size:
+            raise ValueError(
+                f"Number of post IDs ({len(corpus_post_ids)}) does not match the corpus "
+                f"({corpus_size})"
+            )
+        if corpus_author_ids is not None and len(corpus_author_ids) != corpus_size:
+            raise ValueError(
+                f"Number of author IDs ({len(corpus_author_ids)}) does not match the corpus "
+                f"({corpus_size})"
+            )
+        # np.asarray keeps a memory-mapped ids file on disk.
+        self.corpus_post_ids = None if corpus_post_ids is None else np.asarray(corpus_post_ids)
+        self.corpus_author_ids = None
+        if corpus_author_ids is not None:
+            # Author IDs are coded densely as int32 for the device-side author column.
+            self.corpus_author_ids = np.asarray(corpus_author_ids)
+            self._author_vocab, author_codes = np.unique(
+                self.corpus_author_ids, return_inverse=True
+            )
+            self._corpus_author_codes = jnp.asarray(author_codes.astype(np.int32))
+        self._post_id_order = None
+        self.corpus_index = index
+        if shard_across_devices:
+            # The shards replace the monolithic copy on the default device.
+            self.corpus_embeddings = None
+            self.sharded_corpus = shard_corpus(corpus_embeddings)
+            self._sharded_top_k_fn = make_sharded_top_k(
+                self.retrieve_for_users_fn, self.sharded_corpus.mesh
+            )
+        else:
+            self.corpus_embeddings = corpus_embeddings
+            self.sharded_corpus = None
 
     def retrieve(
         self,
         batch: RecsysBatch,
-        recsys_embeddings: RecsysEmbeddings,
+        recsys_embeddings: Optional[RecsysEmbeddings] = None,
         top_k: int = 100,
         corpus_embeddings: Optional[jax.Array] = None,
+        index_params: Optional[Dict[str, Any]] = None,
+        max_age: Optional[float] = None,
+        excluded_post_ids: Optional[Sequence[np.ndarray]] = None,
+        excluded_author_ids: Optional[Sequence[np.ndarray]] = None,
+        mmr_lambda: Optional[float] = None,
+        mmr_oversample: float = 4.0,
     ) -> RetrievalOutput:
         """Retrieve top-k candidates for users.
 
         Args:
             batch: RecsysBatch containing user and history information
-            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings
+            recsys_embeddings: RecsysEmbeddings containing pre-looked-up embeddings,
+                or None when the model uses device-resident embedding tables
             top_k: Number of candidates to retrieve per user
             corpus_embeddings: Optional corpus embeddings (uses set_corpus if not provided)
+            index_params: Search parameters of the corpus index set with set_corpus
+                (e.g. {"nprobe": 16} or {"num_authors": 128}); ignored when
+                corpus_embeddings is given
+            max_age: Optional maximum post age in seconds, applied while scoring
+                a MutableCorpus or TimePartitionedCorpus: segments of older posts
+                are skipped and segments straddling the cutoff are masked
+            excluded_post_ids: Optional per-user post IDs (e.g. already seen) to
+                leave out of the top-k, one array per user
+            excluded_author_ids: Optional per-user author IDs (e.g. the user
+                itself, muted and blocked authors) whose posts are left out; needs
+                corpus_author_ids in set_corpus. Exclusions are masked inside the
+                top-k of the dense set_corpus corpus, so no oversampling is needed
+            mmr_lambda: Optional maximal marginal relevance trade-off; the top
+                ceil(top_k * mmr_oversample) candidates are retrieved and top_k of
+                them picked on device by mmr_select, returned in pick order with
+                their retrieval scores. 1.0 keeps the relevance order; lower
+                values favor candidates unlike those already picked. Dense
+                corpora only
+            mmr_oversample: Candidate pool size for mmr_lambda as a multiple of top_k
 
         Returns:
-            RetrievalOutput with user representations and top-k candidates
+            RetrievalOutput with user representations and top-k candidates; the
+            top-k post IDs are filled in when retrieving from the set_corpus corpus
         """
-        if corpus_embeddings is None:
-            corpus_embeddings = self.corpus_embeddings
+        if max_age is not None and (corpus_embeddings is not None or self.mutable_corpus is None):
+            raise ValueError("max_age requires a MutableCorpus or TimePartitionedCorpus")
+        exclusions = None
+        if excluded_post_ids is not None or excluded_author_ids is not None:
+            if (
+                corpus_embeddings is not None
+                or self.corpus_embeddings is None
+                or self.corpus_index is not None
+            ):
+                raise ValueError("Exclusions are applied to the dense set_corpus corpus only")
+            exclusions = self._corpus_exclusions(
+                batch.user_hashes.shape[0], excluded_post_ids, excluded_author_ids
+            )
+        if mmr_lambda is not None and corpus_embeddings is None and (
+            self.corpus_embeddings is None or self.corpus_index is not None
+        ):
+            raise ValueError("mmr_lambda is applied to dense corpora only")
+        if corpus_embeddings is not None:
+            return self._retrieve_dense(
+                batch,
+                recsys_embeddings,
+                corpus_embeddings,
+                top_k,
+                mmr_lambda=mmr_lambda,
+                mmr_oversample=mmr_oversample,
+            )
 
-        return self.retrieve_fn(self.params, batch, recsys_embeddings, corpus_embeddings, top_k)
+        if self.mutable_corpus is not None:
+            user_representation = self.encode_user(batch, recsys_embeddings)
+            min_created_at = None
+            if max_age is not None:
+                min_created_at = int(math.ceil(self.mutable_corpus.clock() - max_age))
+            top_k_indices, top_k_scores, top_k_post_ids = self.mutable_corpus.snapshot().search(
+                np.asarray(user_representation, dtype=np.float32),
+                top_k,
+                lambda embeddings, k, mask: self.retrieve_for_users_fn(
+                    self.params, user_representation, embeddings, k, mask
+                ),
+                min_created_at,
+                **(index_params or {}),
+            )
+            return RetrievalOutput(
+                user_representation=user_representation,
+                top_k_indices=jnp.asarray(top_k_indices),
+                top_k_scores=jnp.asarray(top_k_scores),
+                top_k_post_ids=top_k_post_ids,
+            )
+
+        if self.corpus_index is not None:
+            user_representation = self.encode_user(batch, recsys_embeddings)
+            top_k_indices, top_k_scores = self.corpus_index.search(
+                np.asarray(user_representation, dtype=np.float32), top_k, **(index_params or {})
+            )
+            output = RetrievalOutput(
+                user_representation=user_representation,
+                top_k_indices=jnp.asarray(top_k_indices),
+                top_k_scores=jnp.asarray(top_k_scores),
+            )
+        elif self.sharded_corpus is not None:
+            user_representation = self.encode_user(batch, recsys_embeddings)
+            top_k_indices, top_k_scores = self._sharded_top_k_fn(
+                self.params,
+                user_representation,
+                self.sharded_corpus.embeddings,
+                self.sharded_corpus.mask,
+                top_k,
+            )
+            output = RetrievalOutput(
+                user_representation=user_representation,
+                top_k_indices=top_k_indices,
+                top_k_scores=top_k_scores,
+            )
+        else:
+            output = self._retrieve_dense(
+                batch,
+                recsys_embeddings,
+                self.corpus_embeddings,
+                top_k,
+                exclusions,
+                mmr_lambda,
+                mmr_oversample,
+            )
+
+        if self.corpus_post_ids is None:
+            return output
+        return output._replace(
+            top_k_post_ids=lookup_post_ids(self.corpus_post_ids, output.top_k_indices)
+        )
+
+    def _retrieve_dense(
+        self,
+        batch: RecsysBatch,
+        recsys_embeddings: Optional[RecsysEmbeddings],
+        corpus_embeddings: jax.Array,
+        top_k: int,
+        exclusions: Optional[CorpusExclusions] = None,
+        mmr_lambda: Optional[float] = None,
+        mmr_oversample: float = 4.0,
+    ) -> RetrievalOutput:
+        self._check_hash_ranges(batch, recsys_embeddings)
+        pool_size = top_k
+        if mmr_lambda is not None:
+            pool_size = min(
+                corpus_embeddings.shape[0], max(top_k, math.ceil(top_k * mmr_oversample))
+            )
+
+        if self.prefix_cache is not None:
+            user_representation = self._encode_user_incremental(batch, recsys_embeddings)
+            top_k_indices, top_k_scores = self.retrieve_for_users_fn(
+                self.params, user_representation, corpus_embeddings, pool_size, None, exclusions
+            )
+            output = RetrievalOutput(
+                user_representation=user_representation,
+                top_k_indices=top_k_indices,
+                top_k_scores=top_k_scores,
+            )
+        else:
+            output = RetrievalOutput(
+                *self.retrieve_fn(
+                    self.params, batch, recsys_embeddings, corpus_embeddings, pool_size, exclusions
+                )
+            )
+        if mmr_lambda is None:
+            return output
+
+        picks = mmr_select(
+            jnp.asarray(corpus_embeddings)[output.top_k_indices],
+            output.top_k_scores,
+            min(top_k, pool_size),
+            mmr_lambda,
+        )
+        return output._replace(
+            top_k_indices=jnp.take_along_axis(output.top_k_indices, picks, axis=1),
+            top_k_scores=jnp.take_along_axis(output.top_k_scores, picks, axis=1),
+        )
+
+    def _corpus_exclusions(
+        self,
+        batch_size: int,
+        excluded_post_ids: Optional[Sequence[np.ndarray]],
+        excluded_author_ids: Optional[Sequence[np.ndarray]],
+    ) -> CorpusExclusions:
+        """Map per-user excluded post and author IDs to sorted corpus rows and author codes."""
+        empty = [np.zeros(0, dtype=np.int32)] * batch_size
+        excluded_rows = empty
+        if excluded_post_ids is not None:
+            if self.corpus_post_ids is None:
+                raise ValueError("Excluding posts needs corpus_post_ids in set_corpus")
+            if self._post_id_order is None:
+                self._post_id_order = np.argsort(self.corpus_post_ids, kind="stable")
+                self._sorted_post_ids = self.corpus_post_ids[self._post_id_order]
+            excluded_rows = [
+                self._post_id_order[_lookup_sorted(self._sorted_post_ids, post_ids)]
+                for post_ids in excluded_post_ids
+            ]
+
+        excluded_authors = empty
+        if excluded_author_ids is not None:
+            if self.corpus_author_ids is None:
+                raise ValueError("Excluding authors needs corpus_author_ids in set_corpus")
+            excluded_authors = [
+                _lookup_sorted(self._author_vocab, author_ids) for author_ids in excluded_author_ids
+            ]
+
+        if len(excluded_rows) != batch_size or len(excluded_authors) != batch_size:
+            raise ValueError(f"Expected one exclusion set per user ({batch_size})")
+        corpus_authors = (
+            self._corpus_author_codes
+            if self.corpus_author_ids is not None
+            else jnp.zeros(self.corpus_embeddings.shape[0], dtype=jnp.int32)
+        )
+        return CorpusExclusions(
+            excluded_rows=jnp.asarray(pack_sorted_sets(excluded_rows)),
+            excluded_authors=jnp.asarray(pack_sorted_sets(excluded_authors)),
+            corpus_authors=corpus_authors,
+        )
 
 
 def create_example_corpus(
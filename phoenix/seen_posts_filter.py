@@ -0,0 +1,271 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Split block Bloom filter: a post sets one bit in each of the 8 uint32 words
+# of a single 256-bit block, so a membership test reads 32 contiguous bytes.
+WORDS_PER_BLOCK = 8
+_WORD_BITS = 32
+
+# Candidates tested per chunk in contains().
+_CHUNK_CANDIDATES = 1 << 15
+
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+# Odd multipliers deriving the bit of each word from the low 32 hash bits.
+_SALTS = np.array(
+    [
+        0x47B6137B,
+        0x44974D91,
+        0x8824AD5B,
+        0xA2B7289D,
+        0x705495C7,
+        0x2DF1424B,
+        0x9EFC4947,
+        0x5C6BFB31,
+    ],
+    dtype=np.uint32,
+)
+
+
+def _mix64(ids: np.ndarray, seed: int) -> np.ndarray:
+    """splitmix64 finalizer of (id + (seed + 1) * gamma), elementwise over uint64."""
+    with np.errstate(over="ignore"):
+        z = ids.astype(np.uint64) + _GOLDEN_GAMMA * np.uint64(seed + 1)
+        z = (z ^ (z >> np.uint64(30))) * _MIX_1
+        z = (z ^ (z >> np.uint64(27))) * _MIX_2
+        return z ^ (z >> np.uint64(31))
+
+
+def expected_false_positive_rate(num_items: int, num_blocks: int) -> float:
+    """Expected false-positive rate of a split block Bloom filter holding num_items.
+
+    Block loads are Poisson with mean num_items / num_blocks; a block holding i
+    posts gives a false positive when all 8 of the probed bits are set.
+    """
+    load = num_items / num_blocks
+    i = np.arange(int(load + 12 * math.sqrt(load + 1) + 12))
+    log_pmf = i * math.log(max(load, 1e-300)) - load - np.array([math.lgamma(x + 1) for x in i])
+    word_fpr = 1.0 - (1.0 - 1.0 / _WORD_BITS) ** i
+    return float(np.sum(np.exp(log_pmf) * word_fpr**WORDS_PER_BLOCK))
+
+
+def num_blocks_for(num_items: int, target_false_positive_rate: float) -> int:
+    """Fewest 256-bit blocks holding num_items at target_false_positive_rate."""
+    if not 0.0 < target_false_positive_rate < 1.0:
+        raise ValueError(
+            f"false_positive_rate must be in (0, 1), got {target_false_positive_rate}"
+        )
+    lo, hi = 1, 1
+    while expected_false_positive_rate(num_items, hi) > target_false_positive_rate:
+        lo, hi = hi, hi * 2
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if expected_false_positive_rate(num_items, mid) > target_false_positive_rate:
+            lo = mid + 1
+        else:
+            hi = mid
+    return hi
+
+
+class SeenPostsFilter:
+    """Per-user Bloom filters of seen (or served) posts in one byte arena.
+
+    Every user owns a split block Bloom filter of num_blocks 256-bit blocks,
+    stored as a row of one [generations, users, blocks, 8] uint32 arena. A post
+    sets one bit in each word of a single block chosen by its hash, so testing
+    it reads one 32-byte block. add() and contains() are vectorized over whole
+    request matrices; no per-post Python objects exist.
+
+    Filters are sized for expected_posts_per_user posts per generation at
+    false_positive_rate; users who see more posts get a higher rate. With
+    rotation_seconds, posts are kept in two generations: every
+    rotation_seconds the older generation is cleared and becomes the current
+    one, so a post is remembered for between one and two rotation periods.
+    Rotation frees the arena rows of users with no post left in any
+    generation; new users reuse them before the arena grows.
+
+    Args:
+        expected_posts_per_user: posts per user a filter generation is sized for
+        false_positive_rate: target probability that an unseen post tests as seen
+        rotation_seconds: optional period of generation rotation
+        initial_users: initial user capacity of the arena; it doubles as needed
+        clock: current time in seconds
+        seed: seed of the post hash
+    """
+
+    def __init__(
+        self,
+        expected_posts_per_user: int = 1000,
+        false_positive_rate: float = 0.01,
+        rotation_seconds: Optional[float] = None,
+        initial_users: int = 1024,
+        clock: Callable[[], float] = time.time,
+        seed: int = 0,
+    ):
+        self.num_blocks = num_blocks_for(expected_posts_per_user, false_positive_rate)
+        self.false_positive_rate = false_positive_rate
+        self.rotation_seconds = rotation_seconds
+        self.clock = clock
+        self.seed = seed
+
+        self._lock = threading.Lock()
+        num_generations = 1 if rotation_seconds is None else 2
+        self._arena = np.zeros(
+            (num_generations, max(initial_users, 1), self.num_blocks, WORDS_PER_BLOCK),
+            dtype=np.uint32,
+        )
+        self._current = 0
+        self._user_slots: Dict[int, int] = {}
+        self._free_slots: List[int] = []
+        self._num_slots = 0
+        self._last_rotation = clock()
+
+    @property
+    def num_users(self) -> int:
+        return len(self._user_slots)
+
+    @property
+    def bytes_per_user(self) -> int:
+        """Bytes of filter storage per user, over all generations."""
+        return self._arena[:, 0].nbytes
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the arena, including unused user capacity."""
+        return self._arena.nbytes
+
+    def _slots(self, user_ids: np.ndarray, create: bool) -> np.ndarray:
+        """Arena rows of user_ids [n]; -1 for unknown users unless create."""
+        slots = np.empty(user_ids.shape[0], dtype=np.int64)
+        for i, user_id in enumerate(user_ids.tolist()):
+            slot = self._user_slots.get(user_id, -1)
+            if slot < 0 and create:
+                if self._free_slots:
+                    slot = self._free_slots.pop()
+                else:
+                    slot = self._num_slots
+                    self._num_slots += 1
+                self._user_slots[user_id] = slot
+            slots[i] = slot
+        capacity = self._arena.shape[1]
+        if self._num_slots > capacity:
+            while capacity < self._num_slots:
+                capacity *= 2
+            grown = np.zeros((self._arena.shape[0], capacity) + self._arena.shape[2:], np.uint32)
+            grown[:, : self._arena.shape[1]] = self._arena
+            self._arena = grown
+        return slots
+
+    def _hash(self, post_ids: np.ndarray):
+        """Block index [...] and 8-word bit mask [..., 8] of each post."""
+        h = _mix64(post_ids, self.seed)
+        # High 32 bits pick the block (multiply-shift), low 32 bits the bits.
+        block = ((h >> np.uint64(32)) * np.uint64(self.num_blocks)) >> np.uint64(32)
+        low = (h & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+        with np.errstate(over="ignore"):
+            bit = low[..., None] * _SALTS
+        bit >>= np.uint32(27)
+        return block.astype(np.int64), np.left_shift(np.uint32(1), bit)
+
+    def maybe_rotate(self):
+        """Rotate generations once per rotation_seconds passed since the last rotation."""
+        if self.rotation_seconds is None:
+            return
+        with self._lock:
+            # Checked under the lock: concurrent callers rotate only once.
+            now = self.clock()
+            periods = (now - self._last_rotation) // self.rotation_seconds
+            if periods < 1:
+                return
+            # After an idle gap of a full window every generation has expired.
+            num_rotations = int(min(periods, self._arena.shape[0]))
+            num_freed = self._rotate_locked(now, num_rotations)
+        logger.info(f"Rotated seen-posts filters, freeing {num_freed} of {self.num_users} users")
+
+    def rotate(self, now: Optional[float] = None):
+        """Forget the older generation and start writing to it."""
+        with self._lock:
+            num_freed = self._rotate_locked(now if now is not None else self.clock())
+        logger.info(f"Rotated seen-posts filters, freeing {num_freed} of {self.num_users} users")
+
+    def _rotate_locked(self, now: float, num_rotations: int = 1) -> int:
+        """Rotate and free the slots of users without posts; returns the number freed."""
+        for _ in range(num_rotations):
+            self._current = (self._current + 1) % self._arena.shape[0]
+            self._arena[self._current] = 0
+        self._last_rotation = now
+        occupied = self._arena[:, : self._num_slots].any(axis=(0, 2, 3))
+        freed = [user for user, slot in self._user_slots.items() if not occupied[slot]]
+        for user_id in freed:
+            self._free_slots.append(self._user_slots.pop(user_id))
+        return len(freed)
+
+    def add(self, user_ids: np.ndarray, post_ids: np.ndarray):
+        """Record that user_ids[i] saw post_ids[i] (post_ids may be [n] or [n, C]).
+
+        Post ID 0 is padding and is ignored.
+        """
+        self.maybe_rotate()
+        user_ids = np.asarray(user_ids, dtype=np.int64).reshape(-1)
+        post_ids = np.asarray(post_ids, dtype=np.int64).reshape(user_ids.shape[0], -1)
+        valid = post_ids != 0
+        blocks, masks = self._hash(post_ids[valid])
+        with self._lock:
+            slots = self._slots(user_ids, create=True)
+            rows = np.broadcast_to(slots[:, None], post_ids.shape)[valid]
+            np.bitwise_or.at(self._arena[self._current], (rows, blocks), masks)
+
+    def contains(self, user_ids: np.ndarray, post_ids: np.ndarray) -> np.ndarray:
+        """Whether each user [B] has (probably) seen each candidate post [B, C].
+
+        Returns a [B, C] bool array; False is exact, True is wrong with
+        probability about false_positive_rate. Unknown users and post ID 0
+        (padding) are never seen.
+        """
+        self.maybe_rotate()
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        post_ids = np.asarray(post_ids, dtype=np.int64)
+        seen = np.empty(post_ids.shape, dtype=bool)
+        # Rows are tested in chunks whose [rows, C, 8] temporaries stay in cache.
+        chunk_rows = max(1, _CHUNK_CANDIDATES // max(post_ids.shape[1], 1))
+        with self._lock:
+            slots = self._slots(user_ids, create=False)
+            for start in range(0, post_ids.shape[0], chunk_rows):
+                chunk = slice(start, start + chunk_rows)
+                seen[chunk] = self._contains_chunk(slots[chunk], post_ids[chunk])
+        return seen & (slots >= 0)[:, None] & (post_ids != 0)
+
+    def _contains_chunk(self, slots: np.ndarray, post_ids: np.ndarray) -> np.ndarray:
+        blocks, masks = self._hash(post_ids)
+        rows = np.maximum(slots, 0)[:, None]
+        missing = np.full(post_ids.shape, np.uint64(0xFFFFFFFFFFFFFFFF))
+        for generation in self._arena:
+            # A post is in a generation iff none of its mask bits is clear.
+            clear = np.invert(generation[rows, blocks])
+            clear &= masks
+            lanes = clear.view(np.uint64)
+            missing &= lanes[..., 0] | lanes[..., 1] | lanes[..., 2] | lanes[..., 3]
+        return missing == 0
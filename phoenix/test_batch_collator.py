@@ -0,0 +1,178 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the ragged to padded batch collator."""
+
+import unittest
+
+import numpy as np
+
+from batch_collator import RaggedBatchCollator, ragged_from_lists
+from recsys_model import HashConfig
+
+
+def _random_user_features(rng, history_len, num_candidates, num_actions):
+    history = {
+        "post_hashes": rng.integers(1, 1000, size=(history_len, 2)).astype(np.int32),
+        "author_hashes": rng.integers(1, 1000, size=(history_len, 2)).astype(np.int32),
+        "actions": (rng.random(size=(history_len, num_actions)) > 0.7).astype(np.float32),
+        "product_surface": rng.integers(0, 16, size=(history_len,)).astype(np.int32),
+    }
+    candidates = {
+        "post_hashes": rng.integers(1, 1000, size=(num_candidates, 2)).astype(np.int32),
+        "author_hashes": rng.integers(1, 1000, size=(num_candidates, 2)).astype(np.int32),
+        "product_surface": rng.integers(0, 16, size=(num_candidates,)).astype(np.int32),
+    }
+    return history, candidates
+
+
+class TestRaggedBatchCollator(unittest.TestCase):
+    """Tests for RaggedBatchCollator."""
+
+    def setUp(self):
+        self.num_actions = 19
+        self.rng = np.random.default_rng(0)
+        self.collator = RaggedBatchCollator(
+            hash_config=HashConfig(),
+            num_actions=self.num_actions,
+            history_buckets=(8, 16),
+            candidate_buckets=(4, 8),
+            batch_buckets=(2, 4),
+        )
+
+    def _make_ragged(self, history_lens, candidate_lens):
+        users = [
+            _random_user_features(self.rng, h, c, self.num_actions)
+            for h, c in zip(history_lens, candidate_lens)
+        ]
+        user_hashes = self.rng.integers(1, 1000, size=(len(users), 2)).astype(np.int32)
+        return ragged_from_lists(user_hashes, [u[0] for u in users], [u[1] for u in users])
+
+    def _assert_matches(self, ragged, batch, keep_latest_history=True):
+        num_users = ragged.user_hashes.shape[0]
+        S = batch.history_post_hashes.shape[1]
+        C = batch.candidate_post_hashes.shape[1]
+        np.testing.assert_array_equal(batch.user_hashes[:num_users], ragged.user_hashes)
+        np.testing.assert_array_equal(batch.user_hashes[num_users:], 0)
+        for b in range(num_users):
+            lo, hi = ragged.history_offsets[b], ragged.history_offsets[b + 1]
+            n = min(hi - lo, S)
+            if keep_latest_history:
+                lo = hi - n
+            np.testing.assert_array_equal(
+                batch.history_post_hashes[b, :n], ragged.history_post_hashes[lo : lo + n]
+            )
+            np.testing.assert_array_equal(
+                batch.history_actions[b, :n], ragged.history_actions[lo : lo + n]
+            )
+            np.testing.assert_array_equal(batch.history_post_hashes[b, n:], 0)
+            np.testing.assert_array_equal(batch.history_actions[b, n:], 0)
+
+            lo, hi = ragged.candidate_offsets[b], ragged.candidate_offsets[b + 1]
+            n = min(hi - lo, C)
+            np.testing.assert_array_equal(
+                batch.candidate_author_hashes[b, :n], ragged.candidate_author_hashes[lo : lo + n]
+            )
+            np.testing.assert_array_equal(
+                batch.candidate_product_surface[b, :n],
+                ragged.candidate_product_surface[lo : lo + n],
+            )
+            np.testing.assert_array_equal(batch.candidate_post_hashes[b, n:], 0)
+
+    def test_collate_pads_to_bucket(self):
+        """Test that ragged features land in the smallest fitting bucket with zero padding."""
+        ragged = self._make_ragged([3, 7, 5], [2, 6, 1])
+        batch = self.collator.collate(ragged)
+
+        self.assertEqual(batch.history_post_hashes.shape, (4, 8, 2))
+        self.assertEqual(batch.history_actions.shape, (4, 8, self.num_actions))
+        self.assertEqual(batch.candidate_post_hashes.shape, (4, 8, 2))
+        self.assertEqual(batch.history_actions.dtype, np.float32)
+        self.assertEqual(batch.history_product_surface.dtype, np.int32)
+        self._assert_matches(ragged, batch)
+
+    def test_buffers_are_reused_and_cleared(self):
+        """Test that buffers are reused across calls and stale values are cleared."""
+        collator = RaggedBatchCollator(
+            hash_config=HashConfig(),
+            num_actions=self.num_actions,
+            history_buckets=(8,),
+            candidate_buckets=(4,),
+            batch_buckets=(2,),
+            num_slots=1,
+        )
+        first = collator.collate(self._make_ragged([8, 8], [4, 4]))
+        second_ragged = self._make_ragged([2], [1])
+        second = collator.collate(second_ragged)
+
+        self.assertIs(first.history_post_hashes, second.history_post_hashes)
+        self._assert_matches(second_ragged, second)
+
+    def test_slots_rotate(self):
+        """Test that consecutive batches use independent buffers when num_slots > 1."""
+        first = self.collator.collate(self._make_ragged([3], [2]))
+        second = self.collator.collate(self._make_ragged([3], [2]))
+
+        self.assertIsNot(first.history_post_hashes, second.history_post_hashes)
+
+    def test_truncates_long_sequences(self):
+        """Test that long histories keep their latest events and candidates their first."""
+        ragged = self._make_ragged([20, 1, 17], [10, 3, 2])
+        batch = self.collator.collate(ragged)
+
+        self.assertEqual(batch.history_post_hashes.shape[1], 16)
+        self.assertEqual(batch.candidate_post_hashes.shape[1], 8)
+        np.testing.assert_array_equal(
+            batch.history_post_hashes[0, -1], ragged.history_post_hashes[19]
+        )
+        self._assert_matches(ragged, batch)
+
+    def test_truncates_earliest_history(self):
+        collator = RaggedBatchCollator(
+            hash_config=HashConfig(),
+            num_actions=self.num_actions,
+            history_buckets=(8,),
+            candidate_buckets=(4,),
+            batch_buckets=(2,),
+            history_truncation="earliest",
+        )
+        ragged = self._make_ragged([12, 3], [2, 2])
+
+        self._assert_matches(ragged, collator.collate(ragged), keep_latest_history=False)
+        with self.assertRaises(ValueError):
+            RaggedBatchCollator(hash_config=HashConfig(), num_actions=1, history_truncation="x")
+
+    def test_sliced_offsets(self):
+        """Test offsets that start past 0, as in a slice of a larger CSR batch."""
+        ragged = self._make_ragged([3, 5, 20], [2, 3, 1])
+        sliced = ragged._replace(
+            user_hashes=ragged.user_hashes[1:],
+            history_offsets=ragged.history_offsets[1:],
+            candidate_offsets=ragged.candidate_offsets[1:],
+        )
+        batch = self.collator.collate(sliced)
+
+        self._assert_matches(sliced, batch)
+        with self.assertRaises(ValueError):
+            self.collator.collate(sliced._replace(history_offsets=np.array([4, 2, 9])))
+
+    def test_batch_too_large_raises(self):
+        """Test that more users than the largest batch bucket is rejected."""
+        ragged = self._make_ragged([1] * 5, [1] * 5)
+        with self.assertRaises(ValueError):
+            self.collator.collate(ragged)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,561 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the approximate nearest neighbor corpus indexes."""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import corpus_index
+from corpus_index import (
+    INVALID_SCORE,
+    AuthorClusteredIndex,
+    ExactIndex,
+    HNSWIndex,
+    IVFPQIndex,
+    MemmapCorpusIndex,
+    QuantizedCorpusIndex,
+    TruncatedCorpusIndex,
+    assign_to_centroids,
+    kmeans,
+    top_k_by_score,
+)
+from embedding_store import BFLOAT16, INT8
+from grok import TransformerConfig
+from recsys_model import HashConfig
+from recsys_retrieval_model import PhoenixRetrievalModelConfig
+from runners import RecsysRetrievalInferenceRunner, RetrievalModelRunner, create_example_batch
+
+
+def clustered_corpus(num_points, dim, num_clusters, seed=0):
+    """L2-normalized points scattered around random cluster centers."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim))
+    points = centers[rng.integers(0, num_clusters, size=num_points)]
+    points = points + 0.3 * rng.normal(size=points.shape)
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+
+def recall(indices, reference):
+    return np.mean([len(np.intersect1d(a, r)) / len(r) for a, r in zip(indices, reference)])
+
+
+class TestKMeans(unittest.TestCase):
+    """Tests for the k-means trainer."""
+
+    def test_lowers_quantization_error(self):
+        """Test that Lloyd iterations reduce the error of the initial centroids."""
+        points = clustered_corpus(1000, 8, num_clusters=16)
+
+        def error(centroids):
+            return np.sum((points - centroids[assign_to_centroids(points, centroids)]) ** 2)
+
+        initial = kmeans(points, 16, num_iters=0)
+        trained = kmeans(points, 16, num_iters=10)
+
+        self.assertLess(error(trained), error(initial))
+
+    def test_too_many_clusters(self):
+        with self.assertRaises(ValueError):
+            kmeans(np.zeros((3, 2), dtype=np.float32), 4)
+
+
+class TestTopKByScore(unittest.TestCase):
+    """Tests for top_k_by_score."""
+
+    def test_sorted_and_padded(self):
+        scores = np.array([[0.1, 0.9, 0.5]], dtype=np.float32)
+
+        indices, values = top_k_by_score(scores, 5)
+
+        np.testing.assert_array_equal(indices[0], [1, 2, 0, -1, -1])
+        np.testing.assert_allclose(values[0, :3], [0.9, 0.5, 0.1])
+        self.assertTrue(np.all(values[0, 3:] == INVALID_SCORE))
+
+
+class TestIVFPQIndex(unittest.TestCase):
+    """Tests for IVFPQIndex."""
+
+    def setUp(self):
+        self.dim = 32
+        self.corpus = clustered_corpus(4000, self.dim, num_clusters=40)
+        self.queries = clustered_corpus(16, self.dim, num_clusters=40, seed=1)
+        self.index = IVFPQIndex.build(
+            self.corpus, num_lists=32, num_subspaces=16, num_codes=64, nprobe=4, num_iters=10
+        )
+        self.reference, _ = ExactIndex(self.corpus).search(self.queries, 20)
+
+    def test_inverted_lists_cover_corpus(self):
+        """Test that every corpus row is in exactly one inverted list."""
+        self.assertEqual(self.index.size, 4000)
+        np.testing.assert_array_equal(np.sort(self.index.list_ids), np.arange(4000))
+        self.assertEqual(self.index.list_offsets[-1], 4000)
+        self.assertEqual(self.index.codes.dtype, np.uint8)
+        self.assertLess(self.index.nbytes, self.corpus.nbytes)
+
+    def test_recall_improves_with_nprobe(self):
+        """Test that probing more lists finds more of the exact top-k."""
+        low, _ = self.index.search(self.queries, 20, nprobe=1)
+        high, _ = self.index.search(self.queries, 20, nprobe=32)
+
+        self.assertGreaterEqual(recall(high, self.reference), recall(low, self.reference))
+        self.assertGreater(recall(high, self.reference), 0.7)
+
+    def test_scores_approximate_inner_products(self):
+        """Test that ADC scores are close to exact inner products of the results."""
+        indices, scores = self.index.search(self.queries, 10, nprobe=32)
+
+        exact = np.einsum("bd,bkd->bk", self.queries, self.corpus[indices])
+        self.assertLess(np.abs(scores - exact).mean(), 0.1)
+        self.assertTrue(np.all(np.diff(scores, axis=1) <= 0))
+
+    def test_batched_search_matches_per_query_adc(self):
+        """Test the batched scan, with padded probed lists, against per-query ADC scoring."""
+        index = self.index
+        M, _, sub_dim = index.codebooks.shape
+        for q, query in enumerate(self.queries[:4]):
+            lists = np.argsort(-(index.centroids @ query), kind="stable")[:8]
+            positions = np.concatenate(
+                [np.arange(index.list_offsets[i], index.list_offsets[i + 1]) for i in lists]
+            )
+            owner = np.repeat(lists, np.diff(index.list_offsets)[lists])
+            lut = np.einsum("md,mkd->mk", query.reshape(M, sub_dim), index.codebooks)
+            adc = index.centroids[owner] @ query + lut[np.arange(M), index.codes[positions]].sum(1)
+            order = np.argsort(-adc, kind="stable")[:20]
+
+            for block_entries in (corpus_index._ADC_BLOCK_ENTRIES, 1):
+                with mock.patch.object(corpus_index, "_ADC_BLOCK_ENTRIES", block_entries):
+                    indices, scores = index.search(self.queries, 20, nprobe=8)
+                np.testing.assert_array_equal(indices[q], index.list_ids[positions[order]])
+                np.testing.assert_allclose(scores[q], adc[order], rtol=1e-5, atol=1e-6)
+
+    def test_fewer_entries_than_top_k(self):
+        """Test that results are padded when the probed lists are small."""
+        index = IVFPQIndex.build(self.corpus[:40], num_lists=8, num_subspaces=4, num_codes=8)
+
+        indices, scores = index.search(self.queries, 50, nprobe=1)
+
+        self.assertTrue(np.all(indices[:, -1] == -1))
+        self.assertTrue(np.all(scores[:, -1] == INVALID_SCORE))
+
+    def test_subspaces_must_divide_dim(self):
+        with self.assertRaises(ValueError):
+            IVFPQIndex.build(self.corpus, num_lists=4, num_subspaces=5)
+
+
+class TestAuthorClusteredIndex(unittest.TestCase):
+    """Tests for AuthorClusteredIndex."""
+
+    def setUp(self):
+        self.dim = 32
+        rng = np.random.default_rng(0)
+        # 100 authors posting around their own topic, in shuffled corpus order.
+        self.corpus_authors = rng.integers(0, 100, size=3000) * 7 + 10**12
+        self.corpus = clustered_corpus(100, self.dim, num_clusters=20)[
+            (self.corpus_authors - 10**12) // 7
+        ]
+        self.corpus += 0.1 * rng.normal(size=self.corpus.shape).astype(np.float32)
+        self.corpus /= np.linalg.norm(self.corpus, axis=1, keepdims=True)
+        self.queries = clustered_corpus(16, self.dim, num_clusters=20, seed=1)
+        self.index = AuthorClusteredIndex.build(self.corpus, self.corpus_authors)
+        self.reference, self.reference_scores = ExactIndex(self.corpus).search(self.queries, 20)
+
+    def test_author_ranges_cover_corpus(self):
+        """Test that every corpus row is in its author's range exactly once."""
+        self.assertEqual(self.index.size, 3000)
+        np.testing.assert_array_equal(np.sort(self.index.post_rows), np.arange(3000))
+        for a in (0, 17, len(self.index.author_ids) - 1):
+            start, end = self.index.author_offsets[a], self.index.author_offsets[a + 1]
+            rows = self.index.post_rows[start:end]
+            np.testing.assert_array_equal(self.corpus_authors[rows], self.index.author_ids[a])
+            np.testing.assert_allclose(
+                self.index.centroids[a], self.corpus[rows].mean(axis=0), atol=1e-6
+            )
+
+    def test_all_authors_is_exact(self):
+        indices, scores = self.index.search(self.queries, 20, num_authors=100)
+
+        np.testing.assert_array_equal(indices, self.reference)
+        np.testing.assert_allclose(scores, self.reference_scores, rtol=1e-5)
+
+    def test_recall_improves_with_num_authors(self):
+        few, _ = self.index.search(self.queries, 20, num_authors=2)
+        many, _ = self.index.search(self.queries, 20, num_authors=20)
+
+        self.assertLess(recall(few, self.reference), recall(many, self.reference))
+        self.assertGreater(recall(many, self.reference), 0.9)
+
+    def test_batched_search_matches_single_queries(self):
+        """Test that padding queries' posts to a common width does not change results."""
+        expected = [self.index.search(query[None], 20, num_authors=5) for query in self.queries]
+
+        for block_floats in (corpus_index._AUTHOR_BLOCK_FLOATS, 1):
+            with mock.patch.object(corpus_index, "_AUTHOR_BLOCK_FLOATS", block_floats):
+                indices, scores = self.index.search(self.queries, 20, num_authors=5)
+            np.testing.assert_array_equal(indices, np.concatenate([e[0] for e in expected]))
+            np.testing.assert_allclose(scores, np.concatenate([e[1] for e in expected]), rtol=1e-5)
+
+    def test_fewer_posts_than_top_k(self):
+        indices, scores = self.index.search(self.queries[:2], 500, num_authors=1)
+
+        for row, row_scores in zip(indices, scores):
+            valid = row >= 0
+            self.assertGreater(valid.sum(), 0)
+            self.assertEqual(len(np.unique(self.corpus_authors[row[valid]])), 1)
+            self.assertTrue(np.all(row_scores[~valid] == INVALID_SCORE))
+
+
+class TestHNSWIndex(unittest.TestCase):
+    """Tests for HNSWIndex."""
+
+    def setUp(self):
+        self.corpus = clustered_corpus(2000, 32, num_clusters=40)
+        self.queries = clustered_corpus(16, 32, num_clusters=40, seed=1)
+        self.index = HNSWIndex.build(self.corpus, max_neighbors=8, ef_construction=48)
+        self.reference, self.reference_scores = ExactIndex(self.corpus).search(self.queries, 20)
+
+    def test_array_backed_graph(self):
+        """Test that adjacency is stored as -1 padded int32 arrays without self loops."""
+        self.assertEqual(self.index.size, 2000)
+        layer0 = self.index.layers[0][:2000]
+        self.assertEqual(layer0.dtype, np.int32)
+        self.assertEqual(layer0.shape[1], 16)
+        self.assertTrue(np.all(layer0 < 2000))
+        self.assertFalse(np.any(layer0 == np.arange(2000)[:, None]))
+        self.assertTrue(np.all((layer0 >= 0).sum(axis=1) > 0))
+        for level, layer in enumerate(self.index.layers[1:], start=1):
+            below = self.index.levels[:2000] < level
+            self.assertTrue(np.all(layer[:2000][below] == -1))
+
+    def test_recall_and_exact_scores(self):
+        """Test that a wide beam finds the exact top-k with exact scores."""
+        indices, scores = self.index.search(self.queries, 20, ef_search=100)
+
+        self.assertGreater(recall(indices, self.reference), 0.95)
+        expected = np.einsum("bd,bkd->bk", self.queries, self.corpus[indices])
+        np.testing.assert_allclose(scores, expected, rtol=1e-5, atol=1e-5)
+        self.assertTrue(np.all(np.diff(scores, axis=1) <= 0))
+
+    def test_incremental_insertion(self):
+        """Test that entries added to a built index are found by search."""
+        index = HNSWIndex.build(self.corpus[:1000], max_neighbors=8, ef_construction=48)
+
+        rows = index.add(self.corpus[1000:])
+
+        np.testing.assert_array_equal(rows, np.arange(1000, 2000))
+        indices, _ = index.search(self.corpus[1500:1510], 1, ef_search=64)
+        np.testing.assert_array_equal(indices[:, 0], np.arange(1500, 1510))
+
+    def test_empty_and_small_index(self):
+        """Test that results are padded when the index has fewer than top_k entries."""
+        index = HNSWIndex(dim=32)
+        indices, scores = index.search(self.queries, 3)
+        self.assertTrue(np.all(indices == -1))
+
+        index.add(self.corpus[:2])
+        indices, scores = index.search(self.queries, 3)
+        self.assertTrue(np.all(np.sort(indices[:, :2], axis=1) == [0, 1]))
+        self.assertTrue(np.all(indices[:, 2] == -1))
+        self.assertTrue(np.all(scores[:, 2] == INVALID_SCORE))
+
+
+class TestQuantizedCorpusIndex(unittest.TestCase):
+    """Tests for QuantizedCorpusIndex."""
+
+    def setUp(self):
+        self.corpus = clustered_corpus(3000, 32, num_clusters=40)
+        self.queries = clustered_corpus(16, 32, num_clusters=40, seed=1)
+        self.reference, self.reference_scores = ExactIndex(self.corpus).search(self.queries, 50)
+
+    def test_exact_after_rescoring(self):
+        """Test that rescoring the shortlist recovers the exact top-k and scores."""
+        for dtype in (INT8, BFLOAT16):
+            index = QuantizedCorpusIndex(self.corpus, dtype)
+
+            indices, scores = index.search(self.queries, 50)
+
+            np.testing.assert_array_equal(indices, self.reference)
+            np.testing.assert_allclose(scores, self.reference_scores, rtol=1e-5, atol=1e-6)
+
+    def test_scan_bytes(self):
+        """Test that the scanned copy is a quarter (int8) or half (bfloat16) of float32."""
+        int8 = QuantizedCorpusIndex(self.corpus, INT8)
+        bf16 = QuantizedCorpusIndex(self.corpus, BFLOAT16)
+
+        self.assertEqual(int8.codes.dtype, np.int8)
+        self.assertEqual(int8.scan_nbytes, self.corpus.nbytes // 4 + 3000 * 4)
+        self.assertEqual(bf16.scan_nbytes, self.corpus.nbytes // 2)
+
+    def test_shortlist_capped_at_corpus(self):
+        index = QuantizedCorpusIndex(self.corpus[:10], INT8, oversample=8)
+
+        indices, scores = index.search(self.queries, 20)
+
+        np.testing.assert_array_equal(
+            np.sort(indices[:, :10], axis=1), np.tile(np.arange(10), (16, 1))
+        )
+        self.assertTrue(np.all(indices[:, 10:] == -1))
+        self.assertTrue(np.all(scores[:, 10:] == INVALID_SCORE))
+
+    def test_unsupported_dtype(self):
+        with self.assertRaises(ValueError):
+            QuantizedCorpusIndex(self.corpus, "float8")
+
+
+class TestTruncatedCorpusIndex(unittest.TestCase):
+    """Tests for TruncatedCorpusIndex."""
+
+    def setUp(self):
+        # Decaying per-dimension scales put most of the signal in the leading
+        # dimensions, like Matryoshka-trained embeddings.
+        decay = 0.9 ** np.arange(32, dtype=np.float32)
+        self.corpus = clustered_corpus(3000, 32, num_clusters=40) * decay
+        self.corpus /= np.linalg.norm(self.corpus, axis=1, keepdims=True)
+        self.queries = clustered_corpus(16, 32, num_clusters=40, seed=1) * decay
+        self.reference, self.reference_scores = ExactIndex(self.corpus).search(self.queries, 50)
+
+    def test_full_prefix_is_exact(self):
+        index = TruncatedCorpusIndex(self.corpus, prefix_dim=32, oversample=1)
+
+        indices, scores = index.search(self.queries, 50)
+
+        np.testing.assert_array_equal(indices, self.reference)
+        np.testing.assert_allclose(scores, self.reference_scores, rtol=1e-5, atol=1e-6)
+
+    def test_rescored_prefix_search(self):
+        """Test that a truncated first pass with rescoring keeps recall and exact scores."""
+        index = TruncatedCorpusIndex(self.corpus, prefix_dim=16)
+
+        indices, scores = index.search(self.queries, 50, oversample=4)
+        narrow, _ = index.search(self.queries, 50, oversample=1)
+
+        self.assertGreater(recall(indices, self.reference), 0.95)
+        self.assertLessEqual(recall(narrow, self.reference), recall(indices, self.reference))
+        np.testing.assert_allclose(
+            scores, np.einsum("bd,bkd->bk", self.queries, self.corpus[indices]), rtol=1e-5
+        )
+
+    def test_scan_bytes(self):
+        index = TruncatedCorpusIndex(self.corpus, prefix_dim=8)
+
+        self.assertEqual(index.scan_nbytes, self.corpus.nbytes // 4)
+        np.testing.assert_allclose(np.linalg.norm(index.prefixes, axis=1), 1.0, rtol=1e-5)
+
+    def test_invalid_prefix_dim(self):
+        with self.assertRaises(ValueError):
+            TruncatedCorpusIndex(self.corpus, prefix_dim=64)
+
+
+class TestMemmapCorpusIndex(unittest.TestCase):
+    """Tests for MemmapCorpusIndex."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "corpus.npy")
+        self.corpus = clustered_corpus(1000, 16, num_clusters=10)
+        np.save(self.path, self.corpus)
+        self.queries = clustered_corpus(4, 16, num_clusters=2, seed=1)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_matches_exact_search(self):
+        """Test that streaming in chunks (with a partial last chunk) is exact."""
+        index = MemmapCorpusIndex(self.path, peak_bandwidth=2**30)
+        expected_indices, expected_scores = ExactIndex(self.corpus).search(self.queries, 10)
+
+        indices, scores = index.search(self.queries, 10, chunk_rows=96)
+
+        np.testing.assert_array_equal(indices, expected_indices)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+        stats = index.last_scan_stats
+        self.assertEqual(stats.bytes_read, self.corpus.nbytes)
+        self.assertGreater(stats.bandwidth, 0)
+        self.assertAlmostEqual(stats.bandwidth, stats.bytes_read / stats.read_seconds)
+        self.assertAlmostEqual(stats.scan_throughput, stats.bytes_read / stats.seconds)
+        self.assertLessEqual(stats.read_seconds, stats.seconds)
+        self.assertAlmostEqual(stats.peak_fraction, stats.bandwidth / 2**30)
+
+    def test_chunk_bytes(self):
+        index = MemmapCorpusIndex(self.path, chunk_bytes=16 * 4 * 100)
+        self.assertEqual(index.chunk_rows, 100)
+        self.assertEqual(index.size, 1000)
+        self.assertIsNone(index.last_scan_stats)
+
+    def test_fewer_entries_than_top_k(self):
+        np.save(self.path, self.corpus[:3])
+        indices, scores = MemmapCorpusIndex(self.path).search(self.queries, 5)
+
+        np.testing.assert_array_equal(indices[:, 3:], -1)
+        self.assertTrue(np.all(scores[:, 3:] == INVALID_SCORE))
+        np.testing.assert_array_equal(np.sort(indices[:, :3], axis=1), [[0, 1, 2]] * 4)
+
+
+class TestRunnerWithIndex(unittest.TestCase):
+    """Tests for RecsysRetrievalInferenceRunner.set_corpus with an index."""
+
+    def setUp(self):
+        config = PhoenixRetrievalModelConfig(
+            emb_size=32,
+            history_seq_len=8,
+            candidate_seq_len=4,
+            hash_config=HashConfig(),
+            model=TransformerConfig(
+                emb_size=32,
+                widening_factor=2,
+                key_size=16,
+                num_q_heads=2,
+                num_kv_heads=1,
+                num_layers=1,
+            ),
+        )
+        self.runner = RecsysRetrievalInferenceRunner(
+            RetrievalModelRunner(config, bs_per_device=0.125), "ann"
+        )
+        self.runner.initialize()
+        self.batch, self.embeddings = create_example_batch(
+            batch_size=2, emb_size=32, history_len=8, num_candidates=4, num_actions=19
+        )
+        self.corpus = clustered_corpus(500, 32, num_clusters=10)
+
+    def test_retrieve_with_index(self):
+        """Test that retrieve searches the index set with set_corpus."""
+        index = IVFPQIndex.build(self.corpus, num_lists=8, num_subspaces=4, num_codes=16)
+        self.runner.set_corpus(self.corpus, np.arange(500), index=index)
+
+        output = self.runner.retrieve(
+            self.batch, self.embeddings, top_k=5, index_params={"nprobe": 8}
+        )
+
+        user_rep = np.asarray(output.user_representation, dtype=np.float32)
+        expected, _ = index.search(user_rep, 5, nprobe=8)
+        np.testing.assert_array_equal(np.asarray(output.top_k_indices), expected)
+
+    def test_retrieve_with_hnsw_index(self):
+        """Test that a graph index with a wide beam matches exact retrieval."""
+        exact = self.runner.retrieve(
+            self.batch, self.embeddings, top_k=5, corpus_embeddings=self.corpus
+        )
+        self.runner.set_corpus(self.corpus, np.arange(500), index=HNSWIndex.build(self.corpus))
+
+        output = self.runner.retrieve(
+            self.batch, self.embeddings, top_k=5, index_params={"ef_search": 500}
+        )
+
+        np.testing.assert_array_equal(
+            np.asarray(output.top_k_indices), np.asarray(exact.top_k_indices)
+        )
+
+    def test_retrieve_with_corpus_dtype(self):
+        """Test that an int8 corpus with rescoring matches exact retrieval."""
+        exact = self.runner.retrieve(
+            self.batch, self.embeddings, top_k=5, corpus_embeddings=self.corpus
+        )
+        self.runner.set_corpus(self.corpus, np.arange(500), corpus_dtype=INT8)
+
+        output = self.runner.retrieve(self.batch, self.embeddings, top_k=5)
+
+        self.assertIsInstance(self.runner.corpus_index, QuantizedCorpusIndex)
+        np.testing.assert_array_equal(
+            np.asarray(output.top_k_indices), np.asarray(exact.top_k_indices)
+        )
+
+    def test_retrieve_from_memmapped_files(self):
+        """Test that a memory-mapped corpus and ids file match exact retrieval."""
+        exact = self.runner.retrieve(
+            self.batch, self.embeddings, top_k=5, corpus_embeddings=self.corpus
+        )
+        post_ids = np.arange(500, dtype=np.int64) + 10**12
+        with tempfile.TemporaryDirectory() as tmpdir:
+            np.save(os.path.join(tmpdir, "corpus.npy"), self.corpus)
+            np.save(os.path.join(tmpdir, "ids.npy"), post_ids)
+            self.runner.set_corpus(
+                os.path.join(tmpdir, "corpus.npy"), os.path.join(tmpdir, "ids.npy")
+            )
+
+            output = self.runner.retrieve(
+                self.batch, self.embeddings, top_k=5, index_params={"chunk_rows": 64}
+            )
+
+            self.assertIsInstance(self.runner.corpus_index, MemmapCorpusIndex)
+            np.testing.assert_array_equal(
+                np.asarray(output.top_k_indices), np.asarray(exact.top_k_indices)
+            )
+            np.testing.assert_array_equal(
+                output.top_k_post_ids, post_ids[np.asarray(exact.top_k_indices)]
+            )
+            with self.assertRaises(ValueError):
+                self.runner.set_corpus(
+                    os.path.join(tmpdir, "corpus.npy"),
+                    post_ids,
+                    corpus_author_ids=np.arange(500) % 25,
+                    cluster_by_author=True,
+                )
+
+    def test_retrieve_clustered_by_author(self):
+        """Test author-clustered retrieval, exact when every author is shortlisted."""
+        exact = self.runner.retrieve(
+            self.batch, self.embeddings, top_k=5, corpus_embeddings=self.corpus
+        )
+        author_ids = np.arange(500) % 25
+        self.runner.set_corpus(
+            self.corpus, np.arange(500), corpus_author_ids=author_ids, cluster_by_author=True
+        )
+
+        output = self.runner.retrieve(
+            self.batch, self.embeddings, top_k=5, index_params={"num_authors": 25}
+        )
+        shortlisted = self.runner.retrieve(
+            self.batch, self.embeddings, top_k=5, index_params={"num_authors": 1}
+        )
+
+        self.assertIsInstance(self.runner.corpus_index, AuthorClusteredIndex)
+        np.testing.assert_array_equal(
+            np.asarray(output.top_k_indices), np.asarray(exact.top_k_indices)
+        )
+        for row in np.asarray(shortlisted.top_k_indices):
+            self.assertEqual(len(np.unique(author_ids[row])), 1)
+
+    def test_retrieve_with_corpus_prefix_dim(self):
+        """Test that a full-dimension first pass matches exact retrieval."""
+        exact = self.runner.retrieve(
+            self.batch, self.embeddings, top_k=5, corpus_embeddings=self.corpus
+        )
+        self.runner.set_corpus(self.corpus, np.arange(500), corpus_prefix_dim=32)
+
+        output = self.runner.retrieve(
+            self.batch, self.embeddings, top_k=5, index_params={"oversample": 2}
+        )
+
+        self.assertIsInstance(self.runner.corpus_index, TruncatedCorpusIndex)
+        np.testing.assert_array_equal(
+            np.asarray(output.top_k_indices), np.asarray(exact.top_k_indices)
+        )
+
+    def test_cluster_by_author_needs_author_ids(self):
+        with self.assertRaises(ValueError):
+            self.runner.set_corpus(self.corpus, np.arange(500), cluster_by_author=True)
+
+    def test_index_size_mismatch(self):
+        index = ExactIndex(self.corpus[:10])
+        with self.assertRaises(ValueError):
+            self.runner.set_corpus(self.corpus, np.arange(500), index=index)
+
+
+if __name__ == "__main__":
+    unittest.main()
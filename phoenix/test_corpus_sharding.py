@@ -0,0 +1,139 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for retrieval over a corpus sharded across devices."""
+
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+from corpus_sharding import make_sharded_top_k, shard_corpus
+
+# Runs in a subprocess: XLA_FLAGS must be set before jax is imported.
+_MULTI_DEVICE_SCRIPT = textwrap.dedent(
+    """
+    import jax
+    import numpy as np
+
+    from grok import TransformerConfig
+    from recsys_model import HashConfig
+    from recsys_retrieval_model import PhoenixRetrievalModelConfig
+    from runners import (
+        RecsysRetrievalInferenceRunner,
+        RetrievalModelRunner,
+        create_example_batch,
+        create_example_corpus,
+    )
+
+    assert jax.local_device_count() == 4, jax.local_devices()
+    for tile_size in (None, 16):
+        config = PhoenixRetrievalModelConfig(
+            emb_size=32,
+            history_seq_len=8,
+            candidate_seq_len=4,
+            hash_config=HashConfig(),
+            corpus_tile_size=tile_size,
+            model=TransformerConfig(
+                emb_size=32,
+                widening_factor=2,
+                key_size=16,
+                num_q_heads=2,
+                num_kv_heads=1,
+                num_layers=1,
+            ),
+        )
+        runner = RecsysRetrievalInferenceRunner(
+            RetrievalModelRunner(config, bs_per_device=0.125), "sharded"
+        )
+        runner.initialize()
+        batch, embeddings = create_example_batch(
+            batch_size=3, emb_size=32, history_len=8, num_candidates=4, num_actions=19
+        )
+        corpus, _ = create_example_corpus(103, 32)
+        post_ids = np.arange(103, dtype=np.int64) + 10**12
+
+        runner.set_corpus(corpus, post_ids)
+        expected = runner.retrieve(batch, embeddings, top_k=10)
+        runner.set_corpus(corpus, post_ids, shard_across_devices=True)
+        actual = runner.retrieve(batch, embeddings, top_k=10)
+
+        assert runner.corpus_embeddings is None
+        assert len(runner.sharded_corpus.embeddings.sharding.device_set) == 4
+        np.testing.assert_array_equal(actual.top_k_indices, expected.top_k_indices)
+        np.testing.assert_allclose(actual.top_k_scores, expected.top_k_scores, rtol=1e-5)
+        np.testing.assert_array_equal(actual.top_k_post_ids, expected.top_k_post_ids)
+    print("OK")
+    """
+)
+
+
+def _local_top_k(params, user_representation, embeddings, top_k, mask):
+    scores = jnp.where(mask[None, :], user_representation @ embeddings.T, -1e12)
+    top_k_scores, top_k_indices = jax.lax.top_k(scores, top_k)
+    return top_k_indices, top_k_scores
+
+
+class TestShardedTopK(unittest.TestCase):
+    """Tests for make_sharded_top_k and shard_corpus."""
+
+    def test_matches_exact_top_k(self):
+        rng = np.random.default_rng(0)
+        corpus = rng.normal(size=(37, 8)).astype(np.float32)
+        users = rng.normal(size=(2, 8)).astype(np.float32)
+        sharded = shard_corpus(corpus)
+
+        fn = make_sharded_top_k(_local_top_k, sharded.mesh)
+        indices, scores = fn(None, users, sharded.embeddings, sharded.mask, 5)
+
+        exact = users @ corpus.T
+        expected = np.argsort(-exact, axis=1)[:, :5]
+        np.testing.assert_array_equal(np.asarray(indices), expected)
+        np.testing.assert_allclose(
+            np.asarray(scores), np.take_along_axis(exact, expected, axis=1), rtol=1e-5
+        )
+
+    def test_padding_is_masked(self):
+        corpus = np.ones((5, 4), dtype=np.float32)
+        sharded = shard_corpus(corpus)
+
+        self.assertEqual(sharded.size, 5)
+        self.assertEqual(sharded.embeddings.shape[0], sharded.num_shards * sharded.shard_size)
+        self.assertEqual(int(np.asarray(sharded.mask).sum()), 5)
+
+    def test_multi_device(self):
+        """Test sharded retrieval across 4 forced host devices."""
+        env = dict(os.environ)
+        env["XLA_FLAGS"] = (
+            env.get("XLA_FLAGS", "") + " --xla_force_host_platform_device_count=4"
+        ).strip()
+        env["JAX_PLATFORMS"] = "cpu"
+        result = subprocess.run(
+            [sys.executable, "-c", _MULTI_DEVICE_SCRIPT],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("OK", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
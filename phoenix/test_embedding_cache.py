@@ -0,0 +1,138 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the hot-ID embedding row cache."""
+
+import tempfile
+import unittest
+
+import numpy as np
+
+from embedding_cache import (
+    LFU,
+    LRU,
+    CachedEmbeddingTable,
+    add_embedding_caches,
+    cache_hit_rates,
+)
+from embedding_store import EmbeddingTableStore, MemmapEmbeddingTable
+from recsys_model import HashConfig
+from runners import create_example_batch
+
+
+class TestCachedEmbeddingTable(unittest.TestCase):
+    """Tests for CachedEmbeddingTable."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.num_rows = 5000
+        self.dim = 8
+        self.backing = MemmapEmbeddingTable.create(
+            f"{self.tmpdir.name}/post.npy", self.num_rows, self.dim
+        )
+        self.backing.table[:] = np.random.default_rng(0).normal(size=(self.num_rows, self.dim))
+        self.rng = np.random.default_rng(1)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _gather(self, table, rows):
+        out = np.empty((rows.shape[0], self.dim), dtype=np.float32)
+        table.gather(rows, out)
+        return out
+
+    def _zipf_rows(self, n):
+        return np.minimum(self.rng.zipf(1.3, size=n), self.num_rows - 1)
+
+    def test_values_match_backing(self):
+        """Test that cached gathers return exactly the backing rows, for both policies."""
+        for policy in (LRU, LFU):
+            cache = CachedEmbeddingTable(self.backing, capacity=64, policy=policy)
+            for _ in range(20):
+                rows = self._zipf_rows(300)
+                np.testing.assert_array_equal(
+                    self._gather(cache, rows), np.asarray(self.backing.table)[rows]
+                )
+
+    def test_capacity_is_bounded(self):
+        """Test that the cache never holds more rows than its capacity."""
+        cache = CachedEmbeddingTable(self.backing, capacity=100, ways=4)
+        for _ in range(10):
+            self._gather(cache, self.rng.integers(1, self.num_rows, size=500))
+
+        self.assertLessEqual(int((cache.keys >= 0).sum()), cache.capacity)
+        self.assertEqual(cache.slab.shape[0], cache.capacity)
+
+    def test_repeated_rows_hit(self):
+        """Test that a working set smaller than the cache is served from the cache."""
+        cache = CachedEmbeddingTable(self.backing, capacity=256, ways=16)
+        rows = np.arange(1, 33)
+        self._gather(cache, rows)
+        cache.stats.reset()
+
+        self._gather(cache, rows)
+
+        self.assertEqual(cache.stats.hits, rows.shape[0])
+        self.assertEqual(cache.stats.hit_rate, 1.0)
+
+    def test_lfu_resists_scans(self):
+        """Test that TinyLFU admission keeps hot rows through a one-off scan."""
+        hot = np.arange(1, 17)
+        lru = CachedEmbeddingTable(self.backing, capacity=32, policy=LRU, ways=32)
+        lfu = CachedEmbeddingTable(self.backing, capacity=32, policy=LFU, ways=32)
+        for cache in (lru, lfu):
+            for _ in range(10):
+                self._gather(cache, hot)
+            self._gather(cache, np.arange(1000, 1100))
+            cache.stats.reset()
+            self._gather(cache, hot)
+
+        self.assertEqual(lfu.stats.hit_rate, 1.0)
+        self.assertLess(lru.stats.hit_rate, 1.0)
+
+
+class TestStoreCaching(unittest.TestCase):
+    """Tests for caches in front of an EmbeddingTableStore."""
+
+    def test_cached_store_lookup(self):
+        """Test that a cached store returns identical embeddings and reports hit rates."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = EmbeddingTableStore.create(tmpdir, HashConfig(), 8, 1000, 1000, 1000)
+            store.post_table.table[:] = 1.0  # type: ignore
+            cached = add_embedding_caches(store, post_capacity=512, author_capacity=512)
+            batch, _ = create_example_batch(
+                batch_size=2,
+                emb_size=8,
+                history_len=10,
+                num_candidates=4,
+                num_actions=19,
+                num_user_embeddings=1000,
+                num_post_embeddings=1000,
+                num_author_embeddings=1000,
+            )
+
+            expected = store.lookup(batch)
+            cached.lookup(batch)
+            actual = cached.lookup(batch)
+
+            np.testing.assert_array_equal(
+                actual.history_post_embeddings, expected.history_post_embeddings
+            )
+            hit_rates = cache_hit_rates(cached)
+            self.assertEqual(set(hit_rates), {"post", "author"})
+            self.assertGreater(hit_rates["post"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,299 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the hash-embedding table store."""
+
+import tempfile
+import unittest
+
+import numpy as np
+
+from embedding_store import (
+    BFLOAT16,
+    INT8,
+    POST_TABLE,
+    PRODUCT,
+    SUM,
+    CompositionalEmbeddingTable,
+    EmbeddingTableStore,
+    QuantizedEmbeddingTable,
+    quantize_store,
+)
+from recsys_model import HashConfig
+from runners import create_example_batch
+
+
+class TestEmbeddingTableStore(unittest.TestCase):
+    """Tests for EmbeddingTableStore backed by memory-mapped tables."""
+
+    def setUp(self):
+        self.emb_size = 16
+        self.num_rows = 1000
+        self.hash_config = HashConfig()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+        store = EmbeddingTableStore.create(
+            self.tmpdir.name,
+            self.hash_config,
+            emb_size=self.emb_size,
+            num_user_embeddings=self.num_rows,
+            num_post_embeddings=self.num_rows,
+            num_author_embeddings=self.num_rows,
+        )
+        rng = np.random.default_rng(0)
+        for table in (store.user_table, store.post_table, store.author_table):
+            table.table[:] = rng.normal(size=table.table.shape)  # type: ignore
+            table.table.flush()  # type: ignore
+        self.store = EmbeddingTableStore.open(self.tmpdir.name, self.hash_config)
+
+        self.batch, _ = create_example_batch(
+            batch_size=3,
+            emb_size=self.emb_size,
+            history_len=12,
+            num_candidates=5,
+            num_actions=19,
+            num_user_embeddings=self.num_rows,
+            num_post_embeddings=self.num_rows,
+            num_author_embeddings=self.num_rows,
+        )
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def _expected(self, table, hashes):
+        expected = np.asarray(table.table)[hashes]
+        expected[hashes == 0] = 0
+        return expected
+
+    def test_lookup_shapes_and_values(self):
+        """Test that lookup gathers every embedding field from the right table."""
+        embeddings = self.store.lookup(self.batch)
+        store = self.store
+
+        self.assertEqual(embeddings.user_embeddings.shape, (3, 2, self.emb_size))
+        self.assertEqual(embeddings.history_post_embeddings.shape, (3, 12, 2, self.emb_size))
+        self.assertEqual(embeddings.candidate_author_embeddings.shape, (3, 5, 2, self.emb_size))
+        self.assertEqual(embeddings.history_post_embeddings.dtype, np.float32)
+
+        np.testing.assert_array_equal(
+            embeddings.user_embeddings, self._expected(store.user_table, self.batch.user_hashes)
+        )
+        np.testing.assert_array_equal(
+            embeddings.history_post_embeddings,
+            self._expected(store.post_table, self.batch.history_post_hashes),
+        )
+        np.testing.assert_array_equal(
+            embeddings.history_author_embeddings,
+            self._expected(store.author_table, self.batch.history_author_hashes),
+        )
+        np.testing.assert_array_equal(
+            embeddings.candidate_post_embeddings,
+            self._expected(store.post_table, self.batch.candidate_post_hashes),
+        )
+
+    def test_padding_hash_is_zero(self):
+        """Test that hash 0 yields a zero embedding even if row 0 is nonzero."""
+        self.assertTrue(np.any(np.asarray(self.store.post_table.table)[0] != 0))  # type: ignore
+        self.assertTrue(np.any(self.batch.history_post_hashes == 0))
+
+        embeddings = self.store.lookup(self.batch)
+        padded = self.batch.history_post_hashes == 0
+
+        np.testing.assert_array_equal(embeddings.history_post_embeddings[padded], 0)
+
+    def test_threaded_gather_matches_serial(self):
+        """Test that splitting a large gather across threads gives the same result."""
+        hashes = np.random.default_rng(1).integers(0, self.num_rows, size=(64, 50, 2))
+        serial = self.store.gather(self.store.post_table, hashes)
+
+        self.store.parallel_threshold = 16
+        self.store.num_threads = 4
+        threaded = self.store.gather(self.store.post_table, hashes)
+
+        np.testing.assert_array_equal(threaded, serial)
+
+    def test_dedup_matches_direct_gather(self):
+        """Test that deduplicated lookup returns the same embeddings as per-field gathers."""
+        self.store.dedup = False
+        direct = self.store.lookup(self.batch)
+        self.store.dedup = True
+        deduped = self.store.lookup(self.batch)
+
+        for name in direct.__dataclass_fields__:
+            np.testing.assert_array_equal(getattr(deduped, name), getattr(direct, name))
+
+    def test_unique_rate_reported(self):
+        """Test that the per-table unique rate reflects repeated hashes in the batch."""
+        batch = self.batch._replace(
+            history_author_hashes=np.full_like(self.batch.history_author_hashes, 7),
+            candidate_author_hashes=np.full_like(self.batch.candidate_author_hashes, 7),
+        )
+
+        self.store.lookup(batch)
+        author_stats = self.store.lookup_stats["author"]
+        total = batch.history_author_hashes.size + batch.candidate_author_hashes.size
+
+        self.assertEqual(author_stats.lookups, total)
+        self.assertEqual(author_stats.unique_lookups, 1)
+        self.assertAlmostEqual(author_stats.unique_rate, 1 / total)
+
+
+class TestQuantizedEmbeddingTables(unittest.TestCase):
+    """Tests for bfloat16 and int8 table storage."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.src = f"{self.tmpdir.name}/fp32"
+        store = EmbeddingTableStore.create(self.src, HashConfig(), 32, 200, 300, 400)
+        rng = np.random.default_rng(0)
+        for table in (store.user_table, store.post_table, store.author_table):
+            table.table[:] = rng.normal(size=table.table.shape)  # type: ignore
+            table.table.flush()  # type: ignore
+        self.fp32 = EmbeddingTableStore.open(self.src, HashConfig())
+        self.hashes = rng.integers(0, 300, size=(4, 10, 2))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _quantized_store(self, dtype):
+        dst = f"{self.tmpdir.name}/{dtype}"
+        quantize_store(self.src, dst, dtype, chunk_rows=64)
+        return EmbeddingTableStore.open(dst, HashConfig())
+
+    def test_bfloat16_gather(self):
+        """Test that bfloat16 tables dequantize to within bfloat16 precision."""
+        store = self._quantized_store(BFLOAT16)
+        self.assertIsInstance(store.post_table, QuantizedEmbeddingTable)
+        self.assertNotIsInstance(store.user_table, QuantizedEmbeddingTable)
+        self.assertEqual(store.post_table.table.nbytes * 2, self.fp32.post_table.table.nbytes)  # type: ignore
+
+        expected = self.fp32.gather(self.fp32.post_table, self.hashes)
+        actual = store.gather(store.post_table, self.hashes)
+
+        self.assertEqual(actual.dtype, np.float32)
+        np.testing.assert_allclose(actual, expected, rtol=2**-8, atol=0)
+
+    def test_int8_gather(self):
+        """Test that int8 tables with per-row scales dequantize within one quantization step."""
+        store = self._quantized_store(INT8)
+
+        expected = self.fp32.gather(self.fp32.author_table, self.hashes)
+        actual = store.gather(store.author_table, self.hashes)
+
+        row_max = np.abs(expected).max(axis=-1, keepdims=True)
+        self.assertTrue(np.all(np.abs(actual - expected) <= row_max / 127 * 0.51 + 1e-3))
+        np.testing.assert_array_equal(actual[self.hashes == 0], 0)
+
+    def test_lookup_from_quantized_store(self):
+        """Test that a quantized store produces RecsysEmbeddings close to float32."""
+        store = self._quantized_store(INT8)
+        batch, _ = create_example_batch(
+            batch_size=2,
+            emb_size=32,
+            history_len=6,
+            num_candidates=3,
+            num_actions=19,
+            num_user_embeddings=200,
+            num_post_embeddings=300,
+            num_author_embeddings=400,
+        )
+
+        expected = self.fp32.lookup(batch)
+        actual = store.lookup(batch)
+
+        np.testing.assert_array_equal(actual.user_embeddings, expected.user_embeddings)
+        np.testing.assert_allclose(
+            actual.candidate_post_embeddings, expected.candidate_post_embeddings, atol=0.05
+        )
+
+
+class TestCompositionalEmbeddingTable(unittest.TestCase):
+    """Tests for quotient-remainder compositional tables."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.num_rows = 10000
+        self.rng = np.random.default_rng(0)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _randomize(self, table):
+        for part in (table.quotient_table, table.remainder_table):
+            part.table[:] = self.rng.normal(size=part.table.shape)
+            part.table.flush()
+
+    def test_gather_composes_parts(self):
+        """Test that rows are the product (or sum) of their quotient and remainder rows."""
+        for combiner in (PRODUCT, SUM):
+            table = CompositionalEmbeddingTable.create(
+                self.tmpdir.name, f"post_{combiner}", self.num_rows, 8, combiner=combiner
+            )
+            self._randomize(table)
+            rows = self.rng.integers(0, self.num_rows, size=500)
+            out = np.empty((500, 8), dtype=np.float32)
+            table.gather(rows, out)
+
+            m = table.remainder_table.num_rows
+            quotient = np.asarray(table.quotient_table.table)[rows // m]  # type: ignore
+            remainder = np.asarray(table.remainder_table.table)[rows % m]  # type: ignore
+            expected = quotient * remainder if combiner == PRODUCT else quotient + remainder
+            np.testing.assert_allclose(out, expected, rtol=1e-6)
+
+    def test_rows_are_distinct_and_memory_is_small(self):
+        """Test that all logical rows differ while storage is far smaller than a full table."""
+        table = CompositionalEmbeddingTable.create(self.tmpdir.name, "post", self.num_rows, 8)
+        self._randomize(table)
+        out = np.empty((self.num_rows, 8), dtype=np.float32)
+        table.gather(np.arange(self.num_rows), out)
+
+        self.assertEqual(np.unique(out, axis=0).shape[0], self.num_rows)
+        self.assertLess(table.nbytes * 40, self.num_rows * 8 * 4)
+
+    def test_store_lookup_and_quantize(self):
+        """Test that a store with a compositional post table reopens, looks up and quantizes."""
+        src = f"{self.tmpdir.name}/fp32"
+        store = EmbeddingTableStore.create(
+            src, HashConfig(), 8, 100, self.num_rows, 100, compositional_tables=(POST_TABLE,)
+        )
+        self._randomize(store.post_table)
+        batch, _ = create_example_batch(
+            batch_size=2,
+            emb_size=8,
+            history_len=6,
+            num_candidates=3,
+            num_actions=19,
+            num_user_embeddings=100,
+            num_post_embeddings=self.num_rows,
+            num_author_embeddings=100,
+        )
+
+        reopened = EmbeddingTableStore.open(src, HashConfig())
+        self.assertIsInstance(reopened.post_table, CompositionalEmbeddingTable)
+        expected = reopened.lookup(batch)
+        self.assertEqual(expected.history_post_embeddings.shape, (2, 6, 2, 8))
+
+        quantize_store(src, f"{self.tmpdir.name}/bf16", BFLOAT16)
+        quantized = EmbeddingTableStore.open(f"{self.tmpdir.name}/bf16", HashConfig())
+        self.assertIsInstance(quantized.post_table.quotient_table, QuantizedEmbeddingTable)  # type: ignore
+        np.testing.assert_allclose(
+            quantized.lookup(batch).history_post_embeddings,
+            expected.history_post_embeddings,
+            rtol=2**-7,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for raw ID hashing."""
+
+import unittest
+
+import numpy as np
+
+from id_hashing import PADDING_ID, IdHasher, multi_hash
+from recsys_model import HashConfig
+from runners import create_dummy_batch_from_config
+
+
+class TestMultiHash(unittest.TestCase):
+    """Tests for multi_hash."""
+
+    def setUp(self):
+        self.ids = np.random.default_rng(0).integers(1, 2**62, size=(50000,), dtype=np.int64)
+
+    def test_range_and_shape(self):
+        """Test that valid IDs hash into [1, table_size) with the expected shape."""
+        hashes = multi_hash(self.ids.reshape(100, 500), num_hashes=3, table_size=1000)
+
+        self.assertEqual(hashes.shape, (100, 500, 3))
+        self.assertEqual(hashes.dtype, np.int32)
+        self.assertGreaterEqual(hashes.min(), 1)
+        self.assertLess(hashes.max(), 1000)
+
+    def test_never_zero_for_small_tables(self):
+        """Test that a valid ID never hashes to the padding row, even for tiny tables."""
+        hashes = multi_hash(np.arange(1, 10000), num_hashes=2, table_size=2)
+        np.testing.assert_array_equal(hashes, 1)
+
+    def test_padding_id_maps_to_zero(self):
+        """Test that PADDING_ID hashes to 0 in every slot."""
+        ids = np.array([[5, PADDING_ID], [PADDING_ID, 7]], dtype=np.int64)
+        hashes = multi_hash(ids, num_hashes=2, table_size=100)
+
+        np.testing.assert_array_equal(hashes[0, 1], 0)
+        np.testing.assert_array_equal(hashes[1, 0], 0)
+        self.assertTrue(np.all(hashes[0, 0] > 0))
+
+    def test_deterministic_and_seeded(self):
+        """Test that hashing is deterministic and differs across seeds and hash slots."""
+        a = multi_hash(self.ids, num_hashes=2, table_size=100000, seed=1)
+        b = multi_hash(self.ids, num_hashes=2, table_size=100000, seed=1)
+        c = multi_hash(self.ids, num_hashes=2, table_size=100000, seed=2)
+
+        np.testing.assert_array_equal(a, b)
+        self.assertLess(np.mean(a == c), 0.01)
+        self.assertLess(np.mean(a[:, 0] == a[:, 1]), 0.01)
+
+    def test_uniformity(self):
+        """Test that buckets are filled roughly uniformly."""
+        hashes = multi_hash(np.arange(1, 200001), num_hashes=1, table_size=101)
+        counts = np.bincount(hashes[:, 0], minlength=101)[1:]
+
+        self.assertLess(counts.std() / counts.mean(), 0.05)
+
+    def test_out_parameter(self):
+        """Test that a preallocated output buffer is filled in place."""
+        out = np.zeros((self.ids.shape[0], 2), dtype=np.int32)
+        result = multi_hash(self.ids, num_hashes=2, table_size=1000, out=out)
+
+        self.assertIs(result, out)
+        np.testing.assert_array_equal(out, multi_hash(self.ids, num_hashes=2, table_size=1000))
+
+    def test_strided_out(self):
+        """Test that a non-contiguous output view is filled in place."""
+        ids = self.ids[:12].reshape(3, 4)
+        buf = np.zeros((3, 8, 2), dtype=np.int32)
+        result = multi_hash(ids, num_hashes=2, table_size=1000, out=buf[:, :4])
+
+        np.testing.assert_array_equal(buf[:, :4], multi_hash(ids, num_hashes=2, table_size=1000))
+        np.testing.assert_array_equal(buf[:, 4:], 0)
+        self.assertTrue(np.shares_memory(result, buf))
+
+
+class TestIdHasher(unittest.TestCase):
+    """Tests for IdHasher."""
+
+    def test_fill_batch_hashes(self):
+        """Test that raw IDs are hashed directly into a RecsysBatch."""
+        hash_config = HashConfig(num_user_hashes=2, num_item_hashes=3, num_author_hashes=2)
+        hasher = IdHasher(hash_config, num_user_embeddings=50, num_post_embeddings=60)
+        batch = create_dummy_batch_from_config(
+            hash_config, history_len=4, num_candidates=3, num_actions=19, batch_size=2
+        )
+        rng = np.random.default_rng(0)
+        history_post_ids = rng.integers(1, 2**40, size=(2, 4))
+        history_post_ids[1, 2:] = PADDING_ID
+
+        hasher.fill_batch_hashes(
+            batch,
+            user_ids=np.array([11, 12]),
+            history_post_ids=history_post_ids,
+            history_author_ids=rng.integers(1, 2**40, size=(2, 4)),
+            candidate_post_ids=rng.integers(1, 2**40, size=(2, 3)),
+            candidate_author_ids=rng.integers(1, 2**40, size=(2, 3)),
+        )
+
+        np.testing.assert_array_equal(batch.user_hashes, hasher.hash_user_ids(np.array([11, 12])))
+        np.testing.assert_array_equal(
+            batch.history_post_hashes, hasher.hash_post_ids(history_post_ids)
+        )
+        self.assertTrue(np.all(batch.history_post_hashes[1, 2:] == 0))
+        self.assertTrue(np.all(batch.candidate_post_hashes > 0))
+        self.assertLess(batch.user_hashes.max(), 50)
+        self.assertLess(batch.candidate_post_hashes.max(), 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
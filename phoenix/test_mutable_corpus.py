@@ -0,0 +1,401 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the mutable retrieval corpus."""
+
+import threading
+import unittest
+from unittest import mock
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+from corpus_index import ExactIndex
+from grok import TransformerConfig
+from mutable_corpus import MutableCorpus, TimePartitionedCorpus
+from recsys_model import HashConfig
+from recsys_retrieval_model import PhoenixRetrievalModelConfig
+from runners import RecsysRetrievalInferenceRunner, RetrievalModelRunner, create_example_batch
+
+DIM = 16
+
+
+def random_posts(num_posts, seed, first_id=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(num_posts, DIM)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings, np.arange(first_id, first_id + num_posts, dtype=np.int64) * 7 + 3
+
+
+def exact_post_ids(live, queries, top_k):
+    """Top-k post IDs of queries over a {post_id: embedding} dict."""
+    post_ids = np.array(sorted(live))
+    scores = queries @ np.stack([live[p] for p in post_ids]).T
+    return post_ids[np.argsort(-scores, axis=1, kind="stable")[:, :top_k]]
+
+
+class TestMutableCorpus(unittest.TestCase):
+    """Tests for MutableCorpus and CorpusSnapshot."""
+
+    def setUp(self):
+        self.queries = random_posts(3, seed=100)[0]
+
+        def segment_top_k(embeddings, k, mask):
+            scores = jnp.where(mask[None, :], self.queries @ embeddings.T, -1e12)
+            top_k_scores, top_k_indices = jax.lax.top_k(scores, k)
+            return top_k_indices, top_k_scores
+
+        self.segment_top_k = segment_top_k
+
+    def search(self, corpus_or_snapshot, top_k=5, **params):
+        snapshot = corpus_or_snapshot
+        if isinstance(corpus_or_snapshot, MutableCorpus):
+            snapshot = corpus_or_snapshot.snapshot()
+        return snapshot.search(self.queries, top_k, self.segment_top_k, **params)
+
+    def test_append_delete_and_compact(self):
+        corpus = MutableCorpus(DIM, auto_compact=False, min_capacity=8)
+        embeddings, post_ids = random_posts(40, seed=0)
+        corpus.append(embeddings[:30], post_ids[:30])
+        corpus.compact()
+        corpus.append(embeddings[30:], post_ids[30:])
+        live = dict(zip(post_ids.tolist(), embeddings))
+
+        deleted = post_ids[[0, 5, 31]]
+        self.assertEqual(corpus.delete(deleted), 3)
+        self.assertEqual(corpus.delete(deleted), 0)
+        for post_id in deleted.tolist():
+            del live[post_id]
+
+        _, _, found = self.search(corpus)
+        np.testing.assert_array_equal(found, exact_post_ids(live, self.queries, 5))
+
+        corpus.compact()
+        snapshot = corpus.snapshot()
+        self.assertEqual(corpus.num_appended, 0)
+        self.assertEqual(snapshot.size, 37)
+        self.assertEqual(snapshot.num_live, 37)
+        np.testing.assert_array_equal(self.search(snapshot)[2], found)
+
+    def test_scores_and_indices(self):
+        corpus = MutableCorpus(DIM, auto_compact=False, min_capacity=8)
+        embeddings, post_ids = random_posts(20, seed=1)
+        corpus.append(embeddings, post_ids)
+
+        indices, scores, found = self.search(corpus)
+
+        np.testing.assert_array_equal(post_ids[indices], found)
+        np.testing.assert_allclose(
+            scores, np.einsum("bd,bkd->bk", self.queries, embeddings[indices]), rtol=1e-5
+        )
+
+    def test_snapshot_isolation(self):
+        corpus = MutableCorpus(DIM, auto_compact=False, min_capacity=8)
+        embeddings, post_ids = random_posts(20, seed=2)
+        corpus.append(embeddings[:10], post_ids[:10])
+        snapshot = corpus.snapshot()
+        before = self.search(snapshot)
+
+        corpus.delete(before[2][:, 0])
+        corpus.append(embeddings[10:], post_ids[10:])
+        corpus.compact()
+
+        self.assertIsNot(corpus.snapshot(), snapshot)
+        for old, new in zip(before, self.search(snapshot)):
+            np.testing.assert_array_equal(old, new)
+
+    def test_replace_existing_post(self):
+        corpus = MutableCorpus(DIM, auto_compact=False, min_capacity=8)
+        embeddings, post_ids = random_posts(10, seed=3)
+        corpus.append(embeddings, post_ids)
+        corpus.compact()
+
+        corpus.append(self.queries[:1], post_ids[:1])
+
+        _, scores, found = self.search(corpus, top_k=10)
+        self.assertEqual(found[0, 0], post_ids[0])
+        self.assertAlmostEqual(float(scores[0, 0]), 1.0, places=5)
+        self.assertEqual(np.sum(found[0] == post_ids[0]), 1)
+        self.assertEqual(corpus.snapshot().num_live, 10)
+
+    def test_writes_during_compaction_are_carried_over(self):
+        building, release = threading.Event(), threading.Event()
+
+        def slow_index_builder(rows):
+            building.set()
+            release.wait()
+            return ExactIndex(rows)
+
+        corpus = MutableCorpus(
+            DIM, index_builder=slow_index_builder, auto_compact=False, min_capacity=8
+        )
+        embeddings, post_ids = random_posts(30, seed=4)
+        corpus.append(embeddings[:20], post_ids[:20])
+        thread = corpus.compact_in_background()
+        building.wait()
+
+        # Readers and writers are not blocked while the index builds.
+        corpus.delete(post_ids[[1, 2]])
+        corpus.append(embeddings[20:], post_ids[20:])
+        self.assertEqual(self.search(corpus)[2].shape, (3, 5))
+        release.set()
+        thread.join()
+
+        live = dict(zip(post_ids.tolist(), embeddings))
+        del live[int(post_ids[1])], live[int(post_ids[2])]
+        snapshot = corpus.snapshot()
+        self.assertIsInstance(snapshot.segments[0].index, ExactIndex)
+        self.assertEqual(snapshot.num_live, 28)
+        self.assertEqual(corpus.num_appended, 10)
+        np.testing.assert_array_equal(
+            self.search(snapshot, top_k=28)[2], exact_post_ids(live, self.queries, 28)
+        )
+
+    def test_index_skips_deleted_rows(self):
+        corpus = MutableCorpus(DIM, index_builder=ExactIndex, auto_compact=False, min_capacity=8)
+        embeddings, post_ids = random_posts(20, seed=5)
+        corpus.append(embeddings, post_ids)
+        corpus.compact()
+        top = self.search(corpus)[2][:, 0]
+
+        corpus.delete(top)
+
+        found = self.search(corpus)[2]
+        self.assertFalse(np.isin(found, top).any())
+        self.assertTrue((found >= 0).all())
+
+    def test_mostly_deleted_indexed_segment(self):
+        """Test the capped index oversample and the exact scan of a mostly deleted segment."""
+        requested = []
+
+        class RecordingIndex(ExactIndex):
+            def search(self, queries, top_k, **params):
+                requested.append(top_k)
+                return super().search(queries, top_k, **params)
+
+        corpus = MutableCorpus(
+            DIM, index_builder=RecordingIndex, auto_compact=False, min_capacity=8
+        )
+        embeddings, post_ids = random_posts(200, seed=11)
+        corpus.append(embeddings, post_ids)
+        corpus.compact()
+        corpus.delete(post_ids[:20])
+
+        self.search(corpus)
+        self.assertEqual(requested, [5 * 2 + 20])
+
+        corpus.delete(post_ids[20:190])
+        _, _, found = self.search(corpus)
+
+        self.assertEqual(len(requested), 1)
+        live = dict(zip(post_ids[190:].tolist(), embeddings[190:]))
+        np.testing.assert_array_equal(found, exact_post_ids(live, self.queries, 5))
+
+    def test_auto_compaction(self):
+        corpus = MutableCorpus(DIM, max_append_rows=16, min_capacity=8)
+        embeddings, post_ids = random_posts(16, seed=6)
+
+        corpus.append(embeddings, post_ids)
+        corpus.compact_in_background().join()
+
+        self.assertEqual(corpus.num_appended, 0)
+        self.assertEqual(corpus.snapshot().segments[0].size, 16)
+
+    def test_empty_corpus_and_padding(self):
+        corpus = MutableCorpus(DIM, auto_compact=False, min_capacity=8)
+        indices, _, found = self.search(corpus)
+        self.assertTrue((indices == -1).all() and (found == -1).all())
+
+        embeddings, post_ids = random_posts(2, seed=7)
+        corpus.append(embeddings, post_ids)
+        _, _, found = self.search(corpus)
+        self.assertTrue((found[:, 2:] == -1).all())
+        self.assertTrue(np.isin(found[:, :2], post_ids).all())
+
+    def test_age_filter_with_index(self):
+        corpus = MutableCorpus(DIM, index_builder=ExactIndex, auto_compact=False, min_capacity=8)
+        embeddings, post_ids = random_posts(20, seed=10)
+        created_at = np.arange(20) * 100
+        corpus.append(embeddings, post_ids, created_at)
+        corpus.compact()
+
+        _, _, found = self.search(corpus, top_k=10, min_created_at=1000)
+
+        recent = created_at >= 1000
+        live = dict(zip(post_ids[recent].tolist(), embeddings[recent]))
+        np.testing.assert_array_equal(found, exact_post_ids(live, self.queries, 10))
+
+    def test_invalid_appends(self):
+        corpus = MutableCorpus(DIM)
+        embeddings, post_ids = random_posts(2, seed=8)
+        with self.assertRaises(ValueError):
+            corpus.append(embeddings[:, :4], post_ids)
+        with self.assertRaises(ValueError):
+            corpus.append(embeddings, post_ids[[0, 0]])
+
+
+class TestTimePartitionedCorpus(unittest.TestCase):
+    """Tests for TimePartitionedCorpus."""
+
+    def setUp(self):
+        self.now = 10 * 3600
+        self.queries = random_posts(3, seed=100)[0]
+        self.scored_rows = []
+
+        def segment_top_k(embeddings, k, mask):
+            self.scored_rows.append(int(np.asarray(mask).sum()))
+            scores = jnp.where(mask[None, :], self.queries @ embeddings.T, -1e12)
+            top_k_scores, top_k_indices = jax.lax.top_k(scores, k)
+            return top_k_indices, top_k_scores
+
+        self.segment_top_k = segment_top_k
+        self.corpus = TimePartitionedCorpus(
+            DIM,
+            partition_seconds=3600,
+            retention_seconds=6 * 3600,
+            clock=lambda: self.now,
+            auto_compact=False,
+            min_capacity=8,
+        )
+        # One post every 10 minutes over the last 5 hours.
+        self.embeddings, self.post_ids = random_posts(30, seed=11)
+        self.created_at = self.now - 5 * 3600 + np.arange(30) * 600
+        self.corpus.append(self.embeddings, self.post_ids, self.created_at)
+
+    def test_partitions_by_creation_time(self):
+        self.assertEqual(sorted(self.corpus.partitions), [5, 6, 7, 8, 9])
+        for segment in self.corpus.snapshot().segments:
+            self.assertEqual(segment.min_created_at // 3600, segment.max_created_at // 3600)
+
+    def test_age_filter_skips_and_masks_segments(self):
+        min_created_at = self.now - 2 * 3600 + 1200
+        _, _, found = self.corpus.snapshot().search(
+            self.queries, 8, self.segment_top_k, min_created_at
+        )
+
+        recent = self.created_at >= min_created_at
+        live = dict(zip(self.post_ids[recent].tolist(), self.embeddings[recent]))
+        np.testing.assert_array_equal(found, exact_post_ids(live, self.queries, 8))
+        # Only the straddling partition (8h) and the newer one (9h) are scored.
+        self.assertEqual(self.scored_rows, [4, 6])
+
+    def test_expired_partitions_are_dropped(self):
+        snapshot = self.corpus.snapshot()
+        self.now += 3 * 3600
+
+        self.assertEqual(self.corpus.expire(), 2)
+        self.assertEqual(sorted(self.corpus.partitions), [7, 8, 9])
+        self.assertEqual(self.corpus.snapshot().num_live, 18)
+        # Earlier snapshots still see the dropped partitions.
+        self.assertEqual(snapshot.num_live, 30)
+
+    def test_replace_is_one_snapshot_change(self):
+        """Test that a snapshot taken while a post moves partitions sees it exactly once."""
+        append = MutableCorpus.append
+        snapshots = []
+        reader = threading.Thread(target=lambda: snapshots.append(self.corpus.snapshot()))
+
+        def append_while_reading(partition, *args, **kwargs):
+            # The old row is already tombstoned when the new partition appends.
+            reader.start()
+            reader.join(timeout=0.2)
+            append(partition, *args, **kwargs)
+
+        with mock.patch.object(MutableCorpus, "append", append_while_reading):
+            self.corpus.append(self.queries[:1], self.post_ids[:1], created_at=self.now)
+        reader.join()
+
+        _, _, found = snapshots[0].search(self.queries, 1, self.segment_top_k, self.now)
+        self.assertEqual(found[0, 0], self.post_ids[0])
+        self.assertEqual(snapshots[0].num_live, 30)
+
+    def test_replace_moves_post_to_new_partition(self):
+        self.corpus.append(self.queries[:1], self.post_ids[:1], created_at=self.now)
+
+        snapshot = self.corpus.snapshot()
+        _, _, found = snapshot.search(self.queries, 1, self.segment_top_k, self.now)
+        self.assertEqual(found[0, 0], self.post_ids[0])
+        self.assertEqual(snapshot.num_live, 30)
+        self.assertEqual(self.corpus.delete(self.post_ids[:1]), 1)
+
+
+class TestRunnerWithMutableCorpus(unittest.TestCase):
+    """Tests for RecsysRetrievalInferenceRunner.set_corpus with a MutableCorpus."""
+
+    def test_matches_exact_retrieval(self):
+        config = PhoenixRetrievalModelConfig(
+            emb_size=DIM,
+            history_seq_len=8,
+            candidate_seq_len=4,
+            hash_config=HashConfig(),
+            model=TransformerConfig(
+                emb_size=DIM,
+                widening_factor=2,
+                key_size=8,
+                num_q_heads=2,
+                num_kv_heads=1,
+                num_layers=1,
+            ),
+        )
+        runner = RecsysRetrievalInferenceRunner(
+            RetrievalModelRunner(config, bs_per_device=0.125), "mutable"
+        )
+        runner.initialize()
+        batch, embeddings = create_example_batch(
+            batch_size=2, emb_size=DIM, history_len=8, num_candidates=4, num_actions=19
+        )
+        corpus_embeddings, post_ids = random_posts(100, seed=9)
+        corpus = MutableCorpus(DIM, auto_compact=False, min_capacity=8)
+        corpus.append(corpus_embeddings[:60], post_ids[:60])
+        corpus.compact()
+        corpus.append(corpus_embeddings[60:], post_ids[60:])
+        corpus.delete(post_ids[::10])
+        live = np.ones(100, dtype=bool)
+        live[::10] = False
+
+        runner.set_corpus(corpus, None)
+        output = runner.retrieve(batch, embeddings, top_k=5)
+
+        exact = runner.retrieve(
+            batch, embeddings, top_k=5, corpus_embeddings=corpus_embeddings[live]
+        )
+        np.testing.assert_array_equal(
+            output.top_k_post_ids, post_ids[live][np.asarray(exact.top_k_indices)]
+        )
+        np.testing.assert_allclose(
+            np.asarray(output.top_k_scores), np.asarray(exact.top_k_scores), rtol=1e-5
+        )
+
+        recent = np.zeros(100, dtype=bool)
+        recent[50:] = True
+        corpus = TimePartitionedCorpus(
+            DIM, partition_seconds=60, clock=lambda: 1000, min_capacity=8
+        )
+        corpus.append(corpus_embeddings, post_ids, np.where(recent, 990, 500))
+        runner.set_corpus(corpus, None)
+        output = runner.retrieve(batch, embeddings, top_k=5, max_age=100)
+
+        exact = runner.retrieve(
+            batch, embeddings, top_k=5, corpus_embeddings=corpus_embeddings[recent]
+        )
+        np.testing.assert_array_equal(
+            output.top_k_post_ids, post_ids[recent][np.asarray(exact.top_k_indices)]
+        )
+        with self.assertRaises(ValueError):
+            runner.retrieve(batch, embeddings, corpus_embeddings=corpus_embeddings, max_age=100)
+
+
+if __name__ == "__main__":
+    unittest.main()
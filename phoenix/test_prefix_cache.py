@@ -0,0 +1,285 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the cross-request user+history prefix cache."""
+
+import unittest
+
+import jax
+import numpy as np
+
+from grok import TransformerConfig
+from prefix_cache import PrefixCache, history_ends
+from recsys_model import HashConfig, PhoenixModelConfig
+from recsys_retrieval_model import PhoenixRetrievalModelConfig
+from runners import (
+    ModelRunner,
+    RecsysInferenceRunner,
+    RecsysRetrievalInferenceRunner,
+    RetrievalModelRunner,
+    create_example_batch,
+)
+
+
+def _randomize_params(params, seed=0):
+    # Transformer weights and norm scales are zero-initialized, which would make
+    # every position's output independent of the attended keys.
+    rng = np.random.default_rng(seed)
+
+    def randomize(path, value):
+        name = jax.tree_util.keystr(path)
+        if "scale" in name:
+            return np.ones_like(value)
+        if name.endswith("['w']"):
+            return (rng.normal(size=value.shape) / np.sqrt(value.shape[0])).astype(np.float32)
+        return value
+
+    return jax.tree_util.tree_map_with_path(randomize, params)
+
+
+def _with_history_len(rng, batch, length):
+    """Give every user exactly `length` events so later requests can append."""
+    hashes = rng.integers(1, 1000, size=np.shape(batch.history_post_hashes))
+    hashes[:, length:] = 0
+    return batch._replace(history_post_hashes=hashes.astype(np.int32))
+
+
+def _append(rng, batch, embeddings, k):
+    """Append k new events after each user's last valid event."""
+    ends = history_ends(batch)
+    post_hashes = np.array(batch.history_post_hashes)
+    actions = np.array(batch.history_actions)
+    history_post = np.array(embeddings.history_post_embeddings)
+    for b, end in enumerate(ends):
+        post_hashes[b, end : end + k] = rng.integers(1, 1000, size=(k, 2))
+        actions[b, end : end + k] = rng.integers(0, 2, size=(k, 19))
+        history_post[b, end : end + k] = rng.normal(size=(k, 2, 32))
+    embeddings.history_post_embeddings = history_post
+    return batch._replace(history_post_hashes=post_hashes, history_actions=actions)
+
+
+class TestPrefixCache(unittest.TestCase):
+    """Tests for RecsysInferenceRunner with a PrefixCache."""
+
+    def setUp(self):
+        self.history_len = 12
+        self.rng = np.random.default_rng(0)
+        config = PhoenixModelConfig(
+            emb_size=32,
+            num_actions=19,
+            history_seq_len=self.history_len,
+            candidate_seq_len=4,
+            hash_config=HashConfig(),
+            model=TransformerConfig(
+                emb_size=32,
+                widening_factor=2,
+                key_size=16,
+                num_q_heads=2,
+                num_kv_heads=1,
+                num_layers=2,
+            ),
+        )
+        self.uncached = RecsysInferenceRunner(ModelRunner(config, bs_per_device=0.125), "uncached")
+        self.uncached.initialize()
+        self.uncached.params = _randomize_params(self.uncached.params)
+
+        self.cache = PrefixCache(max_bytes=1 << 20, bucket_size=4)
+        self.cached = RecsysInferenceRunner(
+            ModelRunner(config, bs_per_device=0.125), "cached", prefix_cache=self.cache
+        )
+        self.cached.initialize()
+        self.cached.params = self.uncached.params
+
+        self.batch, self.embeddings = create_example_batch(
+            batch_size=3, emb_size=32, history_len=self.history_len, num_candidates=4, num_actions=19
+        )
+        self.batch = _with_history_len(self.rng, self.batch, 6)
+
+    def _assert_matches_uncached(self, batch, embeddings):
+        expected = self.uncached.rank_candidates(self.uncached.params, batch, embeddings).scores
+        expected = np.asarray(expected, dtype=np.float32)
+        actual = np.asarray(self.cached.rank(batch, embeddings).scores, dtype=np.float32)
+        np.testing.assert_allclose(actual, expected, atol=1e-6)
+
+    def test_miss_partial_hit_and_hit(self):
+        """Test that cached ranking matches uncached ranking as histories grow."""
+        self._assert_matches_uncached(self.batch, self.embeddings)
+        self.assertEqual(self.cache.stats.misses, 3)
+        self.assertEqual(len(self.cache), 3)
+
+        grown = _append(self.rng, self.batch, self.embeddings, 2)
+        self.cache.stats.reset()
+        self._assert_matches_uncached(grown, self.embeddings)
+        self.assertEqual(self.cache.stats.partial_hits, 3)
+        self.assertEqual(self.cache.stats.computed_positions, 6)
+
+        self.cache.stats.reset()
+        self._assert_matches_uncached(grown, self.embeddings)
+        self.assertEqual(self.cache.stats.hits, 3)
+        self.assertEqual(self.cache.stats.computed_positions, 0)
+
+    def test_history_lengths_in_one_bucket_share_compilation(self):
+        """Test that prefix widths and new positions are bucketed for the jitted extend."""
+        self.cached.rank(self.batch, self.embeddings)
+        grown = _append(self.rng, self.batch, self.embeddings, 1)
+        self._assert_matches_uncached(grown, self.embeddings)
+        compiled = self.cached.extend_fn._cache_size()
+
+        # Cached prefixes of 1 + 7 and 1 + 8 positions both pad to P = 8.
+        grown = _append(self.rng, grown, self.embeddings, 1)
+        self.cache.stats.reset()
+        self._assert_matches_uncached(grown, self.embeddings)
+
+        self.assertEqual(self.cache.stats.partial_hits, 3)
+        self.assertEqual(self.cached.extend_fn._cache_size(), compiled)
+
+    def test_changed_history_misses(self):
+        """Test that a history that no longer starts with the cached events is recomputed."""
+        self.cached.rank(self.batch, self.embeddings)
+        changed = np.array(self.batch.history_post_hashes)
+        changed[:, 0] += 1
+        changed_batch = self.batch._replace(history_post_hashes=changed)
+        self.cache.stats.reset()
+
+        self._assert_matches_uncached(changed_batch, self.embeddings)
+
+        self.assertEqual(self.cache.stats.misses, 3)
+
+    def test_byte_budget(self):
+        """Test that entries are evicted to respect the byte budget."""
+        self.cached.rank(self.batch, self.embeddings)
+        entry_bytes = self.cache.bytes_used // 3
+        small = PrefixCache(max_bytes=2 * entry_bytes + 1, bucket_size=4)
+        self.cached.prefix_cache = small
+
+        self.cached.rank(self.batch, self.embeddings)
+
+        self.assertEqual(len(small), 2)
+        self.assertEqual(small.stats.evictions, 1)
+        self.assertLessEqual(small.bytes_used, small.max_bytes)
+
+
+class TestIncrementalUserRepresentation(unittest.TestCase):
+    """Tests for RecsysRetrievalInferenceRunner with a PrefixCache."""
+
+    def setUp(self):
+        self.history_len = 12
+        self.rng = np.random.default_rng(0)
+        config = PhoenixRetrievalModelConfig(
+            emb_size=32,
+            history_seq_len=self.history_len,
+            candidate_seq_len=4,
+            hash_config=HashConfig(),
+            model=TransformerConfig(
+                emb_size=32,
+                widening_factor=2,
+                key_size=16,
+                num_q_heads=2,
+                num_kv_heads=1,
+                num_layers=2,
+            ),
+        )
+        self.full = RecsysRetrievalInferenceRunner(
+            RetrievalModelRunner(config, bs_per_device=0.125), "full"
+        )
+        self.full.initialize()
+        self.full.params = _randomize_params(self.full.params)
+
+        self.cache = PrefixCache(max_bytes=1 << 20, bucket_size=4)
+        self.incremental = RecsysRetrievalInferenceRunner(
+            RetrievalModelRunner(config, bs_per_device=0.125), "incremental", prefix_cache=self.cache
+        )
+        self.incremental.initialize()
+        self.incremental.params = self.full.params
+
+        self.batch, self.embeddings = create_example_batch(
+            batch_size=3, emb_size=32, history_len=self.history_len, num_candidates=4, num_actions=19
+        )
+        self.batch = _with_history_len(self.rng, self.batch, 6)
+
+    def _encode_full(self, batch, embeddings):
+        # Compiled like the incremental extend, as XLA rounds bfloat16 fusions
+        # differently from eager execution.
+        return jax.jit(self.full.encode_user_fn)(self.full.params, batch, embeddings)
+
+    def _assert_matches_full(self, batch, embeddings):
+        expected = np.asarray(self._encode_full(batch, embeddings), dtype=np.float32)
+        actual = np.asarray(self.incremental.encode_user(batch, embeddings), dtype=np.float32)
+        np.testing.assert_allclose(actual, expected, atol=1e-6)
+
+    def test_incremental_matches_full_encode(self):
+        """Test that running-sum user representations match a full re-encode."""
+        self._assert_matches_full(self.batch, self.embeddings)
+        self.assertEqual(self.cache.stats.misses, 3)
+
+        batch = self.batch
+        for k in (1, 3):
+            batch = _append(self.rng, batch, self.embeddings, k)
+            self.cache.stats.reset()
+            self._assert_matches_full(batch, self.embeddings)
+            self.assertEqual(self.cache.stats.partial_hits, 3)
+            self.assertEqual(self.cache.stats.computed_positions, 3 * k)
+
+        self.cache.stats.reset()
+        self._assert_matches_full(batch, self.embeddings)
+        self.assertEqual(self.cache.stats.hits, 3)
+        self.assertEqual(self.cache.stats.computed_positions, 0)
+
+    def test_history_lengths_in_one_bucket_share_compilation(self):
+        """Test that returning users with new history lengths reuse the compiled extend."""
+        self.incremental.encode_user(self.batch, self.embeddings)
+        grown = _append(self.rng, self.batch, self.embeddings, 1)
+        self._assert_matches_full(grown, self.embeddings)
+        compiled = self.incremental.extend_user_fn._cache_size()
+
+        # Cached prefixes of 1 + 7 and 1 + 8 positions both pad to P = 8.
+        grown = _append(self.rng, grown, self.embeddings, 1)
+        self.cache.stats.reset()
+        self._assert_matches_full(grown, self.embeddings)
+
+        self.assertEqual(self.cache.stats.partial_hits, 3)
+        self.assertEqual(self.incremental.extend_user_fn._cache_size(), compiled)
+
+    def test_output_sum_and_count(self):
+        """Test that entries track the valid user+history positions."""
+        self.incremental.encode_user(self.batch, self.embeddings)
+        entry = next(iter(self.cache._entries.values()))
+
+        self.assertEqual(entry.output_count, 1 + 6)
+        self.assertEqual(entry.output_sum.shape, (32,))
+        self.assertEqual(entry.output_sum.dtype, np.float32)
+
+    def test_retrieve_uses_incremental_representation(self):
+        """Test that retrieval with a cache ranks the corpus as without one."""
+        corpus = self.rng.normal(size=(50, 32)).astype(np.float32)
+        corpus /= np.linalg.norm(corpus, axis=-1, keepdims=True)
+
+        self.incremental.retrieve(self.batch, self.embeddings, top_k=5, corpus_embeddings=corpus)
+        grown = _append(self.rng, self.batch, self.embeddings, 2)
+        # The reference top-k is taken over the full encode that the
+        # incremental encode matches.
+        _, expected_scores = self.full.retrieve_for_users_fn(
+            self.full.params, self._encode_full(grown, self.embeddings), corpus, 5
+        )
+        actual = self.incremental.retrieve(grown, self.embeddings, top_k=5, corpus_embeddings=corpus)
+
+        np.testing.assert_allclose(
+            np.asarray(actual.top_k_scores, dtype=np.float32),
+            np.asarray(expected_scores, dtype=np.float32),
+            atol=1e-6,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
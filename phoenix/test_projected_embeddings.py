@@ -0,0 +1,149 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for precomputed projected post/author embeddings."""
+
+import tempfile
+import unittest
+
+import numpy as np
+
+from embedding_store import POST_TABLE, EmbeddingTableStore
+from id_hashing import IdHasher
+from projected_embeddings import (
+    ProjectedEmbeddingStore,
+    ProjectionWeights,
+    build_projected_tables,
+    project_embeddings,
+)
+from recsys_model import HashConfig, RecsysBatch
+
+
+class TestProjectedEmbeddingStore(unittest.TestCase):
+    """Tests for building and looking up projected entity tables."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.D = 8
+        self.num_rows = 500
+        self.hash_config = HashConfig()
+        self.hasher = IdHasher(self.hash_config, self.num_rows, self.num_rows, self.num_rows)
+        rng = np.random.default_rng(0)
+
+        self.store = EmbeddingTableStore.create(
+            f"{self.tmpdir.name}/tables", self.hash_config, self.D, *([self.num_rows] * 3)
+        )
+        for table in (self.store.user_table, self.store.post_table, self.store.author_table):
+            table.table[:] = rng.normal(size=table.table.shape)  # type: ignore
+
+        H = self.hash_config.num_item_hashes
+        self.weights = ProjectionWeights(
+            history_post=rng.normal(size=(H * self.D, self.D)).astype(np.float32),
+            history_author=rng.normal(size=(H * self.D, self.D)).astype(np.float32),
+            candidate_post=rng.normal(size=(H * self.D, self.D)).astype(np.float32),
+            candidate_author=rng.normal(size=(H * self.D, self.D)).astype(np.float32),
+        )
+
+        self.post_ids = np.arange(1000, 1100, dtype=np.int64)
+        self.author_ids = np.arange(1, 21, dtype=np.int64)
+        build_projected_tables(
+            f"{self.tmpdir.name}/projected",
+            self.store,
+            self.weights,
+            self.post_ids,
+            self.hasher.hash_post_ids(self.post_ids),
+            self.author_ids,
+            self.hasher.hash_author_ids(self.author_ids),
+            chunk_rows=32,
+        )
+        self.projected = ProjectedEmbeddingStore.open(
+            f"{self.tmpdir.name}/projected", self.store, self.weights
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _batch(self, history_post_ids, history_author_ids, candidate_post_ids, candidate_author_ids):
+        B, S = history_post_ids.shape
+        C = candidate_post_ids.shape[1]
+        batch = RecsysBatch(
+            user_hashes=np.zeros((B, 2), dtype=np.int32),
+            history_post_hashes=np.zeros((B, S, 2), dtype=np.int32),
+            history_author_hashes=np.zeros((B, S, 2), dtype=np.int32),
+            history_actions=np.zeros((B, S, 19), dtype=np.float32),
+            history_product_surface=np.zeros((B, S), dtype=np.int32),
+            candidate_post_hashes=np.zeros((B, C, 2), dtype=np.int32),
+            candidate_author_hashes=np.zeros((B, C, 2), dtype=np.int32),
+            candidate_product_surface=np.zeros((B, C), dtype=np.int32),
+        )
+        return self.hasher.fill_batch_hashes(
+            batch,
+            np.arange(1, B + 1),
+            history_post_ids,
+            history_author_ids,
+            candidate_post_ids,
+            candidate_author_ids,
+        )
+
+    def test_lookup_matches_direct_projection(self):
+        """Test that precomputed, on-the-fly and padding entities all match direct projection."""
+        history_post_ids = np.array([[1000, 1050, 5000, 0], [1099, 7000, 0, 0]])
+        history_author_ids = np.array([[1, 2, 300, 0], [20, 400, 0, 0]])
+        candidate_post_ids = np.array([[1001, 9000], [1002, 0]])
+        candidate_author_ids = np.array([[3, 500], [4, 0]])
+        batch = self._batch(
+            history_post_ids, history_author_ids, candidate_post_ids, candidate_author_ids
+        )
+
+        actual = self.projected.lookup(
+            batch, history_post_ids, history_author_ids, candidate_post_ids, candidate_author_ids
+        )
+
+        raw = self.store.lookup(batch)
+        np.testing.assert_allclose(
+            actual.history_post_embeddings,
+            project_embeddings(raw.history_post_embeddings, self.weights.history_post),
+            rtol=1e-5,
+            atol=1e-5,
+        )
+        np.testing.assert_allclose(
+            actual.candidate_author_embeddings,
+            project_embeddings(raw.candidate_author_embeddings, self.weights.candidate_author),  # type: ignore
+            rtol=1e-5,
+            atol=1e-5,
+        )
+        self.assertEqual(actual.history_post_embeddings.shape, (2, 4, self.D))
+        np.testing.assert_array_equal(actual.history_post_embeddings[history_post_ids == 0], 0)
+
+        stats = self.projected.lookup_stats[POST_TABLE]
+        self.assertEqual(stats.precomputed, 5)
+        self.assertEqual(stats.computed, 3)
+
+    def test_duplicate_ids_rejected(self):
+        """Test that the offline job rejects duplicate entity IDs."""
+        ids = np.array([5, 6, 5])
+        with self.assertRaises(ValueError):
+            build_projected_tables(
+                f"{self.tmpdir.name}/dup",
+                self.store,
+                self.weights,
+                ids,
+                self.hasher.hash_post_ids(ids),
+                self.author_ids,
+                self.hasher.hash_author_ids(self.author_ids),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
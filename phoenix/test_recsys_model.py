@@ -12,11 +12,48 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import haiku as hk
+import jax
 import jax.numpy as jnp
 import numpy as np
 import pytest
 
-from grok import make_recsys_attn_mask
+from grok import TransformerConfig, make_recsys_attn_mask
+from projected_embeddings import ProjectionWeights, project_embeddings
+from recsys_model import (
+    CompactRecsysBatch,
+    DeviceEmbeddingConfig,
+    HashConfig,
+    PhoenixModelConfig,
+    ProjectedRecsysEmbeddings,
+    check_hash_ranges,
+    compact_batch,
+    expand_batch,
+    pack_history_actions,
+    set_device_embedding_tables,
+    unpack_history_actions,
+)
+from recsys_retrieval_model import PhoenixRetrievalModelConfig
+from runners import ModelRunner, RecsysInferenceRunner, create_example_batch
+
+
+def _small_ranking_config(**kwargs) -> PhoenixModelConfig:
+    return PhoenixModelConfig(
+        emb_size=32,
+        num_actions=19,
+        history_seq_len=8,
+        candidate_seq_len=4,
+        hash_config=HashConfig(),
+        model=TransformerConfig(
+            emb_size=32,
+            widening_factor=2,
+            key_size=16,
+            num_q_heads=2,
+            num_kv_heads=2,
+            num_layers=1,
+        ),
+        **kwargs,
+    )
 
 
 class TestMakeRecsysAttnMask:
@@ -183,5 +220,287 @@ class TestMakeRecsysAttnMask:
         np.testing.assert_array_equal(np.array(mask_2d), expected)
 
 
+class TestCompactRecsysBatch:
+    """Tests for the bit-packed CompactRecsysBatch encoding."""
+
+    num_actions = 19
+
+    def _example(self):
+        return create_example_batch(
+            batch_size=2,
+            emb_size=32,
+            history_len=8,
+            num_candidates=4,
+            num_actions=self.num_actions,
+        )
+
+    def test_pack_unpack_round_trip(self):
+        """Test that packing and unpacking actions is lossless."""
+        rng = np.random.default_rng(0)
+        actions = (rng.random(size=(3, 5, self.num_actions)) > 0.5).astype(np.float32)
+
+        packed = pack_history_actions(actions)
+
+        assert packed.shape == (3, 5)
+        assert packed.dtype == np.uint32
+        np.testing.assert_array_equal(
+            np.array(unpack_history_actions(packed, self.num_actions)), actions
+        )
+
+    def test_pack_rejects_too_many_actions(self):
+        """Test that more than 32 actions cannot be packed."""
+        with pytest.raises(ValueError):
+            pack_history_actions(np.zeros((1, 1, 33), dtype=np.float32))
+
+    def test_batch_round_trip(self):
+        """Test that compact_batch followed by expand_batch reproduces the batch."""
+        batch, _ = self._example()
+
+        compact = compact_batch(batch)
+        assert compact.history_actions.dtype == np.uint32
+        assert compact.history_product_surface.dtype == np.uint8
+        assert compact.candidate_product_surface.dtype == np.uint8
+        assert compact.history_actions.nbytes * self.num_actions == batch.history_actions.nbytes
+
+        expanded = expand_batch(compact, self.num_actions)
+        for name in batch._fields:
+            np.testing.assert_array_equal(getattr(expanded, name), getattr(batch, name))
+            assert getattr(expanded, name).dtype == getattr(batch, name).dtype
+
+    def test_product_surface_dtype_from_vocab(self):
+        """Test that large product surface vocabularies get a wider dtype instead of wrapping."""
+        batch, _ = self._example()
+        surfaces = np.full_like(batch.history_product_surface, 300)
+        batch = batch._replace(history_product_surface=surfaces)
+
+        with pytest.raises(ValueError):
+            compact_batch(batch)
+        compact = compact_batch(batch, product_surface_vocab_size=1024)
+        assert compact.history_product_surface.dtype == np.uint16
+        np.testing.assert_array_equal(
+            expand_batch(compact, self.num_actions).history_product_surface,
+            batch.history_product_surface,
+        )
+
+    def test_model_logits_match_float_path(self):
+        """Test that the ranking model gives identical logits for compact and float batches."""
+        config = _small_ranking_config()
+
+        def forward(batch, embeddings):
+            return config.make()(batch, embeddings).logits
+
+        forward_fn = hk.without_apply_rng(hk.transform(forward))
+        batch, embeddings = self._example()
+        params = forward_fn.init(jax.random.PRNGKey(0), batch, embeddings)
+
+        compact = compact_batch(batch)
+        assert isinstance(compact, CompactRecsysBatch)
+        logits = forward_fn.apply(params, batch, embeddings)
+        compact_logits = forward_fn.apply(params, compact, embeddings)
+
+        np.testing.assert_array_equal(np.array(compact_logits), np.array(logits))
+
+
+class TestDeviceEmbeddings:
+    """Tests for device-resident embedding tables gathered inside the forward pass."""
+
+    num_rows = 50
+
+    def _example(self):
+        return create_example_batch(
+            batch_size=2,
+            emb_size=32,
+            history_len=8,
+            num_candidates=4,
+            num_actions=19,
+            num_user_embeddings=self.num_rows,
+            num_post_embeddings=self.num_rows,
+            num_author_embeddings=self.num_rows,
+        )
+
+    def _tables(self):
+        rng = np.random.default_rng(0)
+        return [rng.normal(size=(self.num_rows, 32)).astype(np.float32) for _ in range(3)]
+
+    def test_matches_host_gather(self):
+        """Test that in-graph lookup gives the same logits as host-gathered embeddings."""
+        device_config = _small_ranking_config(
+            device_embeddings=DeviceEmbeddingConfig(self.num_rows, self.num_rows, self.num_rows)
+        )
+        host_config = _small_ranking_config()
+
+        def device_forward(batch):
+            return device_config.make()(batch).logits
+
+        def host_forward(batch, embeddings):
+            return host_config.make()(batch, embeddings).logits
+
+        device_fn = hk.without_apply_rng(hk.transform(device_forward))
+        host_fn = hk.without_apply_rng(hk.transform(host_forward))
+        batch, embeddings = self._example()
+        rng = jax.random.PRNGKey(0)
+        device_params = device_fn.init(rng, batch)
+        table_names = {"user_embedding_table", "post_embedding_table", "author_embedding_table"}
+        assert table_names <= set(device_params["phoenix_model"])
+
+        user_table, post_table, author_table = self._tables()
+        device_params = set_device_embedding_tables(
+            device_params, user_table, post_table, author_table
+        )
+        host_params = {
+            module: {k: v for k, v in module_params.items() if k not in table_names}
+            for module, module_params in device_params.items()
+        }
+
+        def host_gather(table, hashes):
+            return table[hashes] * (hashes != 0)[..., None]
+
+        host_embeddings = type(embeddings)(
+            user_embeddings=host_gather(user_table, batch.user_hashes),
+            history_post_embeddings=host_gather(post_table, batch.history_post_hashes),
+            candidate_post_embeddings=host_gather(post_table, batch.candidate_post_hashes),
+            history_author_embeddings=host_gather(author_table, batch.history_author_hashes),
+            candidate_author_embeddings=host_gather(author_table, batch.candidate_author_hashes),
+        )
+
+        np.testing.assert_allclose(
+            np.array(device_fn.apply(device_params, batch), dtype=np.float32),
+            np.array(host_fn.apply(host_params, batch, host_embeddings), dtype=np.float32),
+            rtol=1e-5,
+            atol=1e-5,
+        )
+
+    def test_runner_with_bf16_tables(self):
+        """Test that the inference runner ranks from hashes alone with bf16 tables."""
+        config = _small_ranking_config(
+            device_embeddings=DeviceEmbeddingConfig(
+                self.num_rows, self.num_rows, self.num_rows, param_dtype=jnp.bfloat16
+            )
+        )
+        runner = RecsysInferenceRunner(ModelRunner(config, bs_per_device=0.125), name="test")
+        runner.initialize()
+        runner.set_device_embedding_tables(*self._tables())
+
+        assert runner.params["phoenix_model"]["post_embedding_table"].dtype == jnp.bfloat16
+
+        batch, _ = self._example()
+        output = runner.rank(batch)
+
+        assert output.scores.shape == (2, 4, 19)
+
+    def test_out_of_range_hash(self):
+        """Test that a hash past the device table fails loudly instead of producing NaNs."""
+        config = _small_ranking_config(
+            device_embeddings=DeviceEmbeddingConfig(self.num_rows, self.num_rows, self.num_rows)
+        )
+        runner = RecsysInferenceRunner(ModelRunner(config, bs_per_device=0.125), name="test")
+        runner.initialize()
+        batch, _ = self._example()
+        bad_hashes = np.array(batch.candidate_post_hashes)
+        bad_hashes[0, 0, 0] = self.num_rows
+        bad_batch = batch._replace(candidate_post_hashes=bad_hashes)
+
+        # Checked on the host before the batch reaches the compiled forward.
+        with pytest.raises(ValueError):
+            check_hash_ranges(bad_batch, config.device_embeddings)
+        with pytest.raises(ValueError):
+            runner.rank(bad_batch)
+        # Unchecked batches are clipped by the gather instead of filling with NaN.
+        output = runner.rank_candidates(runner.params, bad_batch, None)
+        assert np.all(np.isfinite(np.array(output.scores, dtype=np.float32)))
+
+    def test_missing_embeddings_raise(self):
+        """Test that omitting embeddings without device tables is an error."""
+        config = _small_ranking_config()
+        forward_fn = hk.transform(lambda batch: config.make()(batch).logits)
+        batch, _ = self._example()
+
+        with pytest.raises(ValueError):
+            forward_fn.init(jax.random.PRNGKey(0), batch)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
+
+
+class TestProjectedEmbeddings:
+    """Tests for the precomputed post/author projection input mode."""
+
+    def _project(self, params, embeddings):
+        weights = ProjectionWeights.from_params(params, HashConfig())
+        return ProjectedRecsysEmbeddings(
+            user_embeddings=embeddings.user_embeddings,
+            history_post_embeddings=project_embeddings(
+                embeddings.history_post_embeddings, weights.history_post
+            ),
+            candidate_post_embeddings=project_embeddings(
+                embeddings.candidate_post_embeddings, weights.candidate_post  # type: ignore
+            ),
+            history_author_embeddings=project_embeddings(
+                embeddings.history_author_embeddings, weights.history_author
+            ),
+            candidate_author_embeddings=project_embeddings(
+                embeddings.candidate_author_embeddings, weights.candidate_author  # type: ignore
+            ),
+        )
+
+    def test_inputs_match_unprojected(self):
+        """Test that projected inputs reproduce build_inputs of the raw embeddings."""
+        config = _small_ranking_config(fprop_dtype=jnp.float32)
+
+        def build_inputs(batch, embeddings):
+            return config.make().build_inputs(batch, embeddings)
+
+        fn = hk.without_apply_rng(hk.transform(build_inputs))
+        batch, embeddings = create_example_batch(
+            batch_size=2, emb_size=32, history_len=8, num_candidates=4, num_actions=19
+        )
+        params = fn.init(jax.random.PRNGKey(0), batch, embeddings)
+        projected = self._project(params, embeddings)
+
+        expected, expected_mask, offset = fn.apply(params, batch, embeddings)
+        actual, actual_mask, projected_offset = fn.apply(params, batch, projected)
+
+        assert projected_offset == offset
+        np.testing.assert_array_equal(actual_mask, expected_mask)
+        np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-5)
+
+    def test_retrieval_user_tower(self):
+        """Test that the retrieval user tower accepts projected history embeddings."""
+        config = PhoenixRetrievalModelConfig(
+            emb_size=32,
+            history_seq_len=8,
+            candidate_seq_len=4,
+            fprop_dtype=jnp.float32,
+            model=_small_ranking_config().model,
+        )
+
+        def encode_user(batch, embeddings):
+            return config.make().build_user_representation(batch, embeddings)[0]
+
+        fn = hk.without_apply_rng(hk.transform(encode_user))
+        batch, embeddings = create_example_batch(
+            batch_size=2, emb_size=32, history_len=8, num_candidates=4, num_actions=19
+        )
+        params = fn.init(jax.random.PRNGKey(0), batch, embeddings)
+        weights = ProjectionWeights.from_params(params, HashConfig())
+        assert weights.candidate_post is None
+
+        projected = ProjectedRecsysEmbeddings(
+            user_embeddings=embeddings.user_embeddings,
+            history_post_embeddings=project_embeddings(
+                embeddings.history_post_embeddings, weights.history_post
+            ),
+            candidate_post_embeddings=None,  # type: ignore
+            history_author_embeddings=project_embeddings(
+                embeddings.history_author_embeddings, weights.history_author
+            ),
+            candidate_author_embeddings=None,  # type: ignore
+        )
+
+        np.testing.assert_allclose(
+            fn.apply(params, batch, projected),
+            fn.apply(params, batch, embeddings),
+            rtol=1e-5,
+            atol=1e-5,
+        )
@@ -25,13 +25,17 @@ from grok import TransformerConfig
 from recsys_model import HashConfig
 from recsys_retrieval_model import (
     CandidateTower,
+    CorpusExclusions,
     PhoenixRetrievalModelConfig,
+    mmr_select,
+    tiled_top_k,
 )
 from runners import (
     RecsysRetrievalInferenceRunner,
     RetrievalModelRunner,
     create_example_batch,
     create_example_corpus,
+    pack_sorted_sets,
 )
 
 
@@ -247,6 +251,207 @@ class TestPhoenixRetrievalModel(unittest.TestCase):
             self.assertTrue(np.all(scores[:-1] >= scores[1:]))
 
 
+class TestTiledTopK(unittest.TestCase):
+    """Tests for the tiled streaming top-k."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.users = jnp.asarray(rng.normal(size=(3, 16)).astype(np.float32))
+        self.corpus = jnp.asarray(rng.normal(size=(1000, 16)).astype(np.float32))
+        self.mask = jnp.asarray(rng.random(1000) > 0.3)
+
+    def _exact(self, top_k, mask=None):
+        scores = jnp.matmul(self.users, self.corpus.T)
+        if mask is not None:
+            scores = jnp.where(mask[None, :], scores, -1e12)
+        scores, indices = jax.lax.top_k(scores, top_k)
+        return indices, scores
+
+    def test_matches_full_top_k(self):
+        """Test tiles that do not divide N, with and without a corpus mask."""
+        for tile_size in (64, 300, 1000, 4096):
+            for mask in (None, self.mask):
+                indices, scores = tiled_top_k(
+                    self.users, self.corpus, 20, mask, tile_size=tile_size
+                )
+                expected_indices, expected_scores = self._exact(20, mask)
+                np.testing.assert_array_equal(indices, expected_indices)
+                np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+
+    def test_top_k_larger_than_tile(self):
+        indices, _ = tiled_top_k(self.users, self.corpus, 50, tile_size=16)
+
+        np.testing.assert_array_equal(indices, self._exact(50)[0])
+
+    def test_approximate_selection(self):
+        """Test that approximate per-tile selection keeps most of the exact top-k."""
+        indices, _ = tiled_top_k(self.users, self.corpus, 20, tile_size=256, recall_target=0.9)
+
+        expected = np.asarray(self._exact(20)[0])
+        recall = np.mean([len(np.intersect1d(a, e)) / 20 for a, e in zip(indices, expected)])
+        self.assertGreaterEqual(recall, 0.8)
+
+    def test_bounded_score_memory(self):
+        """Test that compiled temporary memory does not grow with the [B, N] score matrix."""
+        users = jax.ShapeDtypeStruct((256, 64), jnp.float32)
+        corpus = jax.ShapeDtypeStruct((200000, 64), jnp.float32)
+
+        def temp_bytes(fn):
+            return jax.jit(fn).lower(users, corpus).compile().memory_analysis().temp_size_in_bytes
+
+        full = temp_bytes(lambda u, c: jax.lax.top_k(u @ c.T, 100))
+        tiled = temp_bytes(lambda u, c: tiled_top_k(u, c, 100, tile_size=4096))
+
+        self.assertGreaterEqual(full, 256 * 200000 * 4)
+        self.assertLess(tiled, 256 * (4096 + 4 * 100) * 4 * 2)
+
+    def test_model_uses_tiles(self):
+        """Test that corpus_tile_size routes PhoenixRetrievalModel._retrieve_top_k to tiles."""
+        config = PhoenixRetrievalModelConfig(
+            emb_size=16,
+            history_seq_len=4,
+            candidate_seq_len=2,
+            corpus_tile_size=128,
+            model=TransformerConfig(
+                emb_size=16,
+                widening_factor=2,
+                key_size=8,
+                num_q_heads=2,
+                num_kv_heads=1,
+                num_layers=1,
+            ),
+        )
+
+        def top_k(users, corpus):
+            return config.make()._retrieve_top_k(users, corpus, 20, self.mask)
+
+        indices, _ = hk.without_apply_rng(hk.transform(top_k)).apply({}, self.users, self.corpus)
+
+        np.testing.assert_array_equal(indices, self._exact(20, self.mask)[0])
+
+
+class TestCorpusExclusions(unittest.TestCase):
+    """Tests for per-user exclusions masked inside the top-k."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.users = jnp.asarray(rng.normal(size=(3, 16)).astype(np.float32))
+        self.corpus = jnp.asarray(rng.normal(size=(500, 16)).astype(np.float32))
+        self.authors = rng.integers(0, 50, size=500).astype(np.int32)
+        self.excluded_rows = [rng.choice(500, size=n, replace=False) for n in (0, 7, 40)]
+        self.excluded_authors = [np.array([3, 9]), np.array([], dtype=np.int32), np.array([1])]
+        self.exclusions = CorpusExclusions(
+            excluded_rows=jnp.asarray(pack_sorted_sets(self.excluded_rows)),
+            excluded_authors=jnp.asarray(pack_sorted_sets(self.excluded_authors)),
+            corpus_authors=jnp.asarray(self.authors),
+        )
+
+    def _post_filtered(self, top_k):
+        scores = np.array(self.users @ self.corpus.T)
+        for b in range(3):
+            scores[b, self.excluded_rows[b]] = -np.inf
+            scores[b, np.isin(self.authors, self.excluded_authors[b])] = -np.inf
+        return np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+
+    def test_pack_sorted_sets(self):
+        packed = pack_sorted_sets([np.array([5, 2, 5]), np.array([], dtype=np.int64)])
+
+        np.testing.assert_array_equal(packed, [[2, 5], [-1, -1]])
+        packed = pack_sorted_sets([np.array([7, 1, 4])])
+        np.testing.assert_array_equal(packed, [[-1, 1, 4, 7]])
+        self.assertEqual(pack_sorted_sets([[]] * 2).shape, (2, 0))
+
+    def test_matches_post_filtering(self):
+        """Test dense and tiled top-k against excluding entries after scoring."""
+        config = PhoenixRetrievalModelConfig(
+            emb_size=16,
+            model=TransformerConfig(
+                emb_size=16,
+                widening_factor=2,
+                key_size=8,
+                num_q_heads=2,
+                num_kv_heads=1,
+                num_layers=1,
+            ),
+        )
+
+        def top_k(users, corpus, exclusions):
+            return config.make()._retrieve_top_k(users, corpus, 20, exclusions=exclusions)
+
+        dense_indices, _ = hk.without_apply_rng(hk.transform(top_k)).apply(
+            {}, self.users, self.corpus, self.exclusions
+        )
+        tiled_indices, _ = jax.jit(
+            lambda u, c, e: tiled_top_k(u, c, 20, tile_size=96, exclusions=e)
+        )(self.users, self.corpus, self.exclusions)
+
+        expected = self._post_filtered(20)
+        np.testing.assert_array_equal(dense_indices, expected)
+        np.testing.assert_array_equal(tiled_indices, expected)
+
+
+def _reference_mmr(candidates, relevance, num_select, diversity_lambda):
+    """Per-user greedy MMR with a Python loop over picks and picked candidates."""
+    order = []
+    for b in range(relevance.shape[0]):
+        picked = []
+        for _ in range(num_select):
+            best, best_score = -1, -np.inf
+            for k in range(relevance.shape[1]):
+                if k in picked:
+                    continue
+                penalty = max((candidates[b, k] @ candidates[b, j] for j in picked), default=0.0)
+                score = diversity_lambda * relevance[b, k] - (1 - diversity_lambda) * penalty
+                if score > best_score:
+                    best, best_score = k, score
+            picked.append(best)
+        order.append(picked)
+    return np.array(order)
+
+
+class TestMMRSelect(unittest.TestCase):
+    """Tests for maximal marginal relevance selection."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        candidates = rng.normal(size=(3, 40, 16)).astype(np.float32)
+        self.candidates = candidates / np.linalg.norm(candidates, axis=-1, keepdims=True)
+        self.relevance = rng.uniform(size=(3, 40)).astype(np.float32)
+
+    def test_matches_reference(self):
+        for diversity_lambda in (0.0, 0.3, 0.7):
+            order = mmr_select(self.candidates, self.relevance, 10, diversity_lambda)
+
+            np.testing.assert_array_equal(
+                order, _reference_mmr(self.candidates, self.relevance, 10, diversity_lambda)
+            )
+
+    def test_lambda_one_is_relevance_order(self):
+        order = mmr_select(self.candidates, self.relevance, 10, 1.0)
+
+        np.testing.assert_array_equal(order, np.argsort(-self.relevance, axis=1)[:, :10])
+
+    def test_skips_near_duplicates(self):
+        """Test that copies of the most relevant candidate are passed over."""
+        candidates = self.candidates[:1].copy()
+        candidates[0, 1:4] = candidates[0, 0]
+        relevance = np.linspace(1.0, 0.5, 40, dtype=np.float32)[None]
+
+        order = np.asarray(mmr_select(candidates, relevance, 4, 0.5))
+
+        self.assertEqual(order[0, 0], 0)
+        self.assertFalse(np.isin(order[0, 1:], [1, 2, 3]).any())
+
+    def test_padding_picked_last(self):
+        relevance = self.relevance.copy()
+        relevance[:, 5:] = -1e12
+
+        order = np.asarray(mmr_select(self.candidates, relevance, 8, 0.2))
+
+        np.testing.assert_array_equal(np.sort(order[:, :5], axis=1), np.tile(np.arange(5), (3, 1)))
+        self.assertTrue(np.all(order[:, 5:] >= 5))
+
+
 class TestRetrievalInferenceRunner(unittest.TestCase):
     """Tests for the retrieval inference runner."""
 
@@ -354,6 +559,119 @@ class TestRetrievalInferenceRunner(unittest.TestCase):
         self.assertEqual(output.top_k_indices.shape, (self.batch_size, top_k))
         self.assertEqual(output.top_k_scores.shape, (self.batch_size, top_k))
 
+    def test_runner_retrieve_with_exclusions(self):
+        """Test that excluded posts and authors are filtered without oversampling."""
+        runner = RecsysRetrievalInferenceRunner(
+            runner=RetrievalModelRunner(model=self.config, bs_per_device=0.125),
+            name="test_retrieval",
+        )
+        runner.initialize()
+        batch, embeddings = create_example_batch(
+            batch_size=self.batch_size,
+            emb_size=self.emb_size,
+            history_len=self.history_seq_len,
+            num_candidates=self.candidate_seq_len,
+            num_actions=self.num_actions,
+            num_user_hashes=self.hash_config.num_user_hashes,
+            num_item_hashes=self.hash_config.num_item_hashes,
+            num_author_hashes=self.hash_config.num_author_hashes,
+        )
+        corpus_embeddings, _ = create_example_corpus(100, self.emb_size)
+        post_ids = np.arange(100, dtype=np.int64) * 3 + 10**12
+        author_ids = (np.arange(100, dtype=np.int64) % 20) + 5 * 10**11
+        runner.set_corpus(corpus_embeddings, post_ids, corpus_author_ids=author_ids)
+        unfiltered = runner.retrieve(batch, embeddings, top_k=50).top_k_post_ids
+
+        # User 0 has seen its top post; user 1 blocks the author of its top post.
+        excluded_post_ids = [unfiltered[0, :1], np.array([], dtype=np.int64)]
+        excluded_author_ids = [[], author_ids[post_ids == unfiltered[1, 0]]]
+        output = runner.retrieve(
+            batch,
+            embeddings,
+            top_k=10,
+            excluded_post_ids=excluded_post_ids,
+            excluded_author_ids=excluded_author_ids,
+        )
+
+        np.testing.assert_array_equal(output.top_k_post_ids[0], unfiltered[0, 1:11])
+        blocked = np.isin(unfiltered[1], post_ids[author_ids == excluded_author_ids[1][0]])
+        np.testing.assert_array_equal(output.top_k_post_ids[1], unfiltered[1][~blocked][:10])
+        with self.assertRaises(ValueError):
+            runner.set_corpus(corpus_embeddings, post_ids)
+            runner.retrieve(batch, embeddings, excluded_author_ids=excluded_author_ids)
+
+    def test_runner_retrieve_reuses_compilation_per_exclusion_width(self):
+        """Test that exclusion sets padded to the same width do not trigger recompiles."""
+        runner = RecsysRetrievalInferenceRunner(
+            runner=RetrievalModelRunner(model=self.config, bs_per_device=0.125),
+            name="test_retrieval",
+        )
+        runner.initialize()
+        batch, embeddings = create_example_batch(
+            batch_size=self.batch_size,
+            emb_size=self.emb_size,
+            history_len=self.history_seq_len,
+            num_candidates=self.candidate_seq_len,
+            num_actions=self.num_actions,
+            num_user_hashes=self.hash_config.num_user_hashes,
+            num_item_hashes=self.hash_config.num_item_hashes,
+            num_author_hashes=self.hash_config.num_author_hashes,
+        )
+        corpus_embeddings, _ = create_example_corpus(100, self.emb_size)
+        post_ids = np.arange(100, dtype=np.int64) + 10**12
+        runner.set_corpus(corpus_embeddings, post_ids)
+
+        def retrieve(num_excluded):
+            excluded = [post_ids[:num_excluded], post_ids[-num_excluded:]]
+            output = runner.retrieve(batch, embeddings, top_k=10, excluded_post_ids=excluded)
+            self.assertFalse(np.isin(output.top_k_post_ids[0], excluded[0]).any())
+            return runner.retrieve_fn._cache_size()
+
+        # 5 to 8 excluded posts all pad to W = 8; 9 pads to W = 16.
+        compiled = retrieve(5)
+        for num_excluded in (6, 7, 8):
+            self.assertEqual(retrieve(num_excluded), compiled)
+        self.assertEqual(retrieve(9), compiled + 1)
+
+    def test_runner_retrieve_with_mmr(self):
+        """Test that MMR re-selects top_k candidates from an oversampled pool."""
+        runner = RecsysRetrievalInferenceRunner(
+            runner=RetrievalModelRunner(model=self.config, bs_per_device=0.125),
+            name="test_retrieval",
+        )
+        runner.initialize()
+        batch, embeddings = create_example_batch(
+            batch_size=self.batch_size,
+            emb_size=self.emb_size,
+            history_len=self.history_seq_len,
+            num_candidates=self.candidate_seq_len,
+            num_actions=self.num_actions,
+            num_user_hashes=self.hash_config.num_user_hashes,
+            num_item_hashes=self.hash_config.num_item_hashes,
+            num_author_hashes=self.hash_config.num_author_hashes,
+        )
+        corpus_embeddings, post_ids = create_example_corpus(100, self.emb_size)
+        runner.set_corpus(corpus_embeddings, post_ids)
+        pool = runner.retrieve(batch, embeddings, top_k=40)
+
+        relevance_only = runner.retrieve(batch, embeddings, top_k=10, mmr_lambda=1.0)
+        diverse = runner.retrieve(batch, embeddings, top_k=10, mmr_lambda=0.3)
+
+        np.testing.assert_array_equal(
+            np.asarray(relevance_only.top_k_indices), np.asarray(pool.top_k_indices)[:, :10]
+        )
+        corpus = np.asarray(corpus_embeddings)
+        expected = _reference_mmr(
+            corpus[np.asarray(pool.top_k_indices)], np.asarray(pool.top_k_scores), 10, 0.3
+        )
+        np.testing.assert_array_equal(
+            np.asarray(diverse.top_k_indices),
+            np.take_along_axis(np.asarray(pool.top_k_indices), expected, axis=1),
+        )
+        np.testing.assert_array_equal(
+            diverse.top_k_post_ids, np.asarray(post_ids)[np.asarray(diverse.top_k_indices)]
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,190 @@
+# Copyright 2026 X.AI Corp.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the per-user seen-posts Bloom filter store."""
+
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from seen_posts_filter import SeenPostsFilter, expected_false_positive_rate, num_blocks_for
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSizing(unittest.TestCase):
+    """Tests for filter sizing."""
+
+    def test_num_blocks_meets_target(self):
+        for num_items, rate in [(100, 0.01), (1000, 0.001), (5000, 0.05)]:
+            num_blocks = num_blocks_for(num_items, rate)
+            self.assertLessEqual(expected_false_positive_rate(num_items, num_blocks), rate)
+            self.assertGreater(expected_false_positive_rate(num_items, num_blocks - 1), rate)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            num_blocks_for(100, 0.0)
+
+
+class TestSeenPostsFilter(unittest.TestCase):
+    """Tests for SeenPostsFilter."""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def _post_ids(self, *shape):
+        return self.rng.integers(1, 2**62, size=shape, dtype=np.int64)
+
+    def test_no_false_negatives(self):
+        seen_filter = SeenPostsFilter(expected_posts_per_user=200, initial_users=2)
+        user_ids = np.arange(10, dtype=np.int64) * 7 + 10**15
+        seen = self._post_ids(10, 200)
+        seen_filter.add(user_ids, seen)
+
+        self.assertTrue(seen_filter.contains(user_ids, seen).all())
+        self.assertEqual(seen_filter.num_users, 10)
+        self.assertGreaterEqual(seen_filter._arena.shape[1], 10)
+
+    def test_false_positive_rate(self):
+        rate = 0.01
+        seen_filter = SeenPostsFilter(expected_posts_per_user=1000, false_positive_rate=rate)
+        user_ids = np.arange(64, dtype=np.int64)
+        seen_filter.add(user_ids, self._post_ids(64, 1000))
+
+        unseen = seen_filter.contains(user_ids, self._post_ids(64, 2000))
+        self.assertLess(unseen.mean(), 1.5 * rate)
+
+    def test_matches_python_sets(self):
+        seen_filter = SeenPostsFilter(expected_posts_per_user=50, false_positive_rate=1e-4)
+        user_ids = np.array([3, 1, 2], dtype=np.int64)
+        seen = self._post_ids(3, 50)
+        seen_filter.add(user_ids, seen)
+
+        candidates = np.concatenate([seen[:, :20], self._post_ids(3, 20)], axis=1)
+        candidates = self.rng.permuted(candidates, axis=1)
+        expected = np.array(
+            [[post_id in set(row) for post_id in candidates[i]] for i, row in enumerate(seen)]
+        )
+        np.testing.assert_array_equal(seen_filter.contains(user_ids, candidates), expected)
+
+    def test_unknown_users_and_padding(self):
+        seen_filter = SeenPostsFilter(expected_posts_per_user=10)
+        seen_filter.add(np.array([1]), np.array([[5, 6, 0]]))
+
+        contained = seen_filter.contains(np.array([1, 2]), np.array([[5, 0], [5, 6]]))
+        np.testing.assert_array_equal(contained, [[True, False], [False, False]])
+        self.assertEqual(seen_filter.num_users, 1)
+
+    def test_flat_add(self):
+        seen_filter = SeenPostsFilter(expected_posts_per_user=10)
+        seen_filter.add(np.array([1, 1, 2]), np.array([10, 11, 12]))
+
+        contained = seen_filter.contains(np.array([1, 2]), np.array([[10, 11], [12, 10]]))
+        np.testing.assert_array_equal(contained, [[True, True], [True, False]])
+
+    def test_rotation(self):
+        clock = _FakeClock()
+        seen_filter = SeenPostsFilter(
+            expected_posts_per_user=100, rotation_seconds=60, clock=clock
+        )
+        users = np.array([1])
+        old, new = self._post_ids(1, 50), self._post_ids(1, 50)
+        seen_filter.add(users, old)
+
+        clock.now = 61
+        seen_filter.add(users, new)
+        self.assertTrue(seen_filter.contains(users, old).all())
+        self.assertTrue(seen_filter.contains(users, new).all())
+
+        clock.now = 122
+        self.assertLess(seen_filter.contains(users, old).mean(), 0.1)
+        self.assertTrue(seen_filter.contains(users, new).all())
+
+        clock.now = 183
+        self.assertLess(seen_filter.contains(users, new).mean(), 0.1)
+
+    def test_rotation_after_idle_gap(self):
+        clock = _FakeClock()
+        seen_filter = SeenPostsFilter(
+            expected_posts_per_user=100, rotation_seconds=60, clock=clock
+        )
+        users, seen = np.array([1, 2]), self._post_ids(2, 50)
+        seen_filter.add(users, seen)
+
+        # No requests for more than two periods: both generations have expired.
+        clock.now = 650
+        self.assertLess(seen_filter.contains(users, seen).mean(), 0.1)
+        self.assertEqual(seen_filter.num_users, 0)
+
+    def test_concurrent_rotation_rotates_once(self):
+        clock = _FakeClock()
+        seen_filter = SeenPostsFilter(
+            expected_posts_per_user=100, rotation_seconds=60, clock=clock
+        )
+        users, seen = np.array([1]), self._post_ids(1, 50)
+        seen_filter.add(users, seen)
+
+        clock.now = 61
+        threads = [threading.Thread(target=seen_filter.maybe_rotate) for _ in range(4)]
+        # All callers find the rotation due while another caller holds the lock.
+        with seen_filter._lock:
+            for thread in threads:
+                thread.start()
+            time.sleep(0.1)
+        for thread in threads:
+            thread.join()
+
+        # One rotation keeps the posts in the older generation.
+        self.assertTrue(seen_filter.contains(users, seen).all())
+
+    def test_rotation_frees_empty_users(self):
+        clock = _FakeClock()
+        seen_filter = SeenPostsFilter(
+            expected_posts_per_user=100, rotation_seconds=60, initial_users=2, clock=clock
+        )
+        first, second = self._post_ids(2, 20), self._post_ids(2, 20)
+        seen_filter.add(np.array([1, 2]), first)
+
+        clock.now = 61
+        seen_filter.add(np.array([2]), second[:1])
+        clock.now = 122
+        seen_filter.maybe_rotate()
+        # User 1 has no posts left in either generation.
+        self.assertEqual(seen_filter.num_users, 1)
+
+        seen_filter.add(np.array([3]), second[1:])
+        self.assertEqual(seen_filter._arena.shape[1], 2)
+        contained = seen_filter.contains(np.array([1, 2, 3]), second[[0, 0, 1]])
+        self.assertFalse(contained[0].any())
+        self.assertTrue(contained[1:].all())
+
+    def test_memory(self):
+        seen_filter = SeenPostsFilter(
+            expected_posts_per_user=1000, false_positive_rate=0.01, initial_users=100
+        )
+        # About 10 bits per post, far below a Python set of ints.
+        self.assertLess(seen_filter.bytes_per_user, 1000 * 12 / 8)
+        self.assertEqual(seen_filter.nbytes, 100 * seen_filter.bytes_per_user)
+
+
+if __name__ == "__main__":
+    unittest.main()